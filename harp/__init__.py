@@ -0,0 +1,5 @@
+"""
+Harmonized Ancillary Resource Provider
+"""
+
+from harp._backend.harp_batch import get_many
@@ -2,6 +2,8 @@ from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
 from time import sleep
+import socket
+import os
 
 from core import log
 
@@ -30,18 +32,45 @@ class ComputeLock:
     
     
     def is_locked(self):
-        # add lock staleness mgmt
+        self._manage_staleness()
         return self.filepath.is_file()
         
     
-    # def acquire(self):
-    #     # create lockfile
-    #     ...
+    def acquire(self):
+        """
+        Waits for the lock to be free and creates the lockfile (see locked for the context manager)
+        """
+        
+        while not self.try_acquire():
+            self.wait()
+    
+    
+    def try_acquire(self) -> bool:
+        """
+        Creates the lockfile if the lock is free, returns whether the lock was acquired
+        The creation is atomic: a single process acquires the lock
+        """
+        
+        self._manage_staleness()
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        
+        try:
+            fd = os.open(self.filepath, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        
+        # owner is used to detect locks left by killed processes
+        with os.fdopen(fd, 'w') as f:
+            f.write(f"{socket.gethostname()}:{os.getpid()}")
+        
+        return True
     
         
-    # def release(self):
-    #     # delete lockfile
-    #     ...
+    def release(self):
+        """
+        Removes the lockfile, may be called from another thread than the one which acquired the lock
+        """
+        self.filepath.unlink(missing_ok=True)
 
     
     def wait(self):
@@ -50,7 +79,7 @@ class ComputeLock:
         # wait for underlying lockfile to be cleared
         
         start = datetime.now()        
-        while self.filepath.exists():
+        while self.is_locked():
             
             delta = datetime.now() - start
             
@@ -66,14 +95,7 @@ class ComputeLock:
         @contextmanager
         def _lock_routine():
         
-            if self.is_locked():
-                self.wait()
-            
-            self.filepath.parent.mkdir(parents=True, exist_ok=True)
-            
-            # create the lock file
-            with open(self.filepath, 'w') as fd:
-                fd.write('')
+            self.acquire()
 
             try: # yield context manager
                 yield self.filepath
@@ -88,8 +110,36 @@ class ComputeLock:
         
         if self.is_free(): return
         
-        lockfile_age = datetime.now() - datetime.fromtimestamp(self.filepath.stat().st_ctime)
-        if lockfile_age > self.config.get("lock_lifetime"):
+        try:
+            lockfile_age = datetime.now() - datetime.fromtimestamp(self.filepath.stat().st_ctime)
+        except FileNotFoundError: # released in the meantime
+            return
+        
+        if lockfile_age > self.lifetime or self._owner_is_dead():
             log.debug(f"Removing lockfile {self.filepath}, considered stale. ")
-            self.filepath.unlink()
-    
\ No newline at end of file
+            self.filepath.unlink(missing_ok=True)
+    
+    
+    def _owner_is_dead(self) -> bool:
+        """
+        True if the lockfile has been created by a process of this host which no longer exists
+        (ex: worker killed while downloading), False if alive or undeterminable (other host, legacy lockfile)
+        """
+        
+        try:
+            host, pid = self.filepath.read_text().strip().rsplit(":", 1)
+            pid = int(pid)
+        except (FileNotFoundError, ValueError):
+            return False
+        
+        if host != socket.gethostname():
+            return False
+        
+        try:
+            os.kill(pid, 0) # signal 0: only checks the process existence
+        except ProcessLookupError:
+            return True
+        except PermissionError: # exists, owned by another user
+            return False
+        
+        return False
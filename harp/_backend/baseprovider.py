@@ -1,9 +1,12 @@
 import hashlib
 import copy
+import os
+import threading
 from datetime import date, datetime
 from pathlib import Path
 from typing import Callable
 
+import numpy as np
 import xarray as xr
 from core import log
 from core.config import Config
@@ -12,10 +15,12 @@ from core.static import abstract
             
 from harp._backend._utils import ComputeLock
 from harp._backend.harp_query import HarpAtomicStorageUnit, HarpQuery
+from harp._backend import harp_open, harp_std, write_behind
 
 from harp._backend.nomenclature import Nomenclature
 import harp.config
 from harp._backend.computable import Computable
+from harp._serve import client as serve_client
 
 
 @abstract
@@ -35,6 +40,7 @@ class BaseDatasetProvider:
         
         self._check_config()
         self.computables = {}    # map of computable variables
+        self._array_entries = {} # (var, time, area, levels) -> slice read by get_array
         
         # to be defined in subclass
         self.nomenclature = Nomenclature(stub=True, csv=0, context="", query_col="", harp_col="") 
@@ -52,30 +58,157 @@ class BaseDatasetProvider:
             time (datetime): single datetime of query
             levels (list[int], optional): list of pressure levels to query. Defaults to all available levels.
             area (list, optional): [N, W, S, E] bounding box of query. Defaults to None (global).
-            **kwargs: additional keyword arguments to pass to the provider (not used currently)
+            **kwargs: additional keyword arguments to pass to the provider:
+                offline (bool)
+                target_grid: regrid to a resolution in degrees, (lat, lon) resolutions, or an object with latitude and longitude
+                regrid_method (str): "bilinear" (default) or "conservative"
         """
         
+        write_behind.check() # errors of the previous background writes
+        
         koffline = kwargs.pop('offline', None)
         offline = koffline if koffline is not None else self.config.get("offline")
         
-        query    = [] # variables to query
-        operands = [] # operands for computable variables
-        computed = [] # variables to compute from operands
+        resolved = self._resolve_variables()
+        
+        hq = HarpQuery(
+            variables   = resolved["query"], 
+            time        = time, 
+            offline     = offline, 
+            area        = area, 
+            levels      = levels, 
+            ref_time    = kwargs.pop('ref_time', None),
+        )
+        
+        ds = self._get_resolved(hq, resolved)
+        
+        return self._regrid(ds, kwargs.pop('target_grid', None), kwargs.pop('regrid_method', "bilinear"))
+    
+    
+    def get_array(self, var: str, time: datetime, area: list = None, levels: list = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Fast path of get for hot loops: returns the values of a single variable at a timestep, with its latitudes and longitudes
+        The storage unit of each (var, time, area, levels) is resolved once, the values come from the slice cache if present
+        
+        Args:
+            var (str): provider variable (alias or raw variable, computables are not supported)
+            time (datetime): timestep of the dataset (use get to interpolate between timesteps)
+            area (list, optional): [N, W, S, E] bounding box. Defaults to None (global).
+            levels (list[int], optional): list of pressure levels. Defaults to None.
+        
+        Returns:
+            (values, latitude, longitude): values without the time dimension, read only (not copied)
+        """
+        
+        key = (var, time, None if area is None else tuple(area), None if levels is None else tuple(levels))
+        
+        entry = self._array_entries.get(key)
+        if entry is None:
+            entry = self._resolve_array(var, time, area, levels)
+            
+            if len(self._array_entries) >= 4096: # hot loops on moving times: keep the resolution cache bounded
+                self._array_entries.clear()
+            self._array_entries[key] = entry
+        
+        filepath, stored, window, shape, dtype, index, lat, lon = entry
+        values = harp_open.read_slice(filepath, stored, window, shape, dtype, copy=False)
+        
+        return values[index], lat, lon
+    
+    
+    def _resolve_array(self, var: str, time: datetime, area: list, levels: list) -> tuple:
+        """
+        Resolves (downloading it if required) the slice read by get_array
+        """
+        
+        raw = self.variables.get(var, var)
+        if isinstance(raw, Computable):
+            log.error(f"Computable variable {var} is not supported by get_array, use get", e=ValueError)
+        
+        query = self.nomenclature.translate_to_query_name(raw)
+        
+        hq = HarpQuery(variables=[query], time=time, offline=self.config.get("offline"), area=area, levels=levels)
+        
+        window_area = None
+        units = self._get_stored_global_units(hq)
+        if units is not None:
+            window_area = area
+        else:
+            units = self._download(hq)
+        
+        if len(units) != 1:
+            log.error(f"get_array requires a timestep of the dataset and an area which does not cross the antimeridian, got {time} and {area}", e=ValueError)
+        
+        unit = units[0]
+        filepath = self._get_target_file_path(unit)
+        
+        template = harp_open.get_template(filepath, unit.variable, area=unit.area, levels=unit.levels)
+        window = template.get_window(window_area)
+        shape  = tuple(len(range(n)[w]) for n, w in zip(template.shape, window))
+        index  = tuple(0 if d == harp_std.time_name else slice(None) for d in template.dims) # view without the time dim
+        
+        lat = template.coords[harp_std.lat_name].values[window[template.dims.index(harp_std.lat_name)]]
+        lon = template.coords[harp_std.lon_name].values[window[template.dims.index(harp_std.lon_name)]]
+        
+        return filepath, unit.variable, window, shape, template.dtype, index, lat, lon
+    
+    
+    def _regrid(self, ds: xr.Dataset, target_grid, method: str) -> xr.Dataset:
+        """
+        Regrids ds on target_grid (if any), the interpolation weights are cached under dir_storage/regrid
+        """
+        
+        if target_grid is None:
+            return ds
+        
+        from harp._backend import regrid
+        
+        return regrid.regrid(ds, target_grid, method=method, cache_dir=self.config.get("dir_storage") / "regrid")
+    
+    
+    def _get_resolved(self, hq: HarpQuery, resolved: dict) -> xr.Dataset:
+        """
+        Opens the query of the resolved variables (see _resolve_variables) and finalizes it
+        The persisted computables already stored for the query are read directly, their operands are not queried
+        """
+        
+        cached = self._get_cached_computables(hq)
+        
+        if cached:
+            resolved = self._resolve_variables(cached=cached)
+            hq.variables = resolved["query"]
+        
+        ds = self._open_query(hq) if hq.variables else xr.Dataset()
+        
+        return self._finalize_variables(ds, resolved, hq=hq)
+    
+    
+    def _resolve_variables(self, cached: dict = {}) -> dict:
+        """
+        Decompose the user variables (aliases and computables) into the list of query names to download
+        cached: persisted computables already stored (name -> storage units), which are not computed
+        Returns a dict with the keys: query, operands, computed, cached, nodes, direct_query, reversed_aliases
+        """
+        
+        query = [] # variables to query
         
         # dst_var is the user given name, bound to an exisiting query_name
-        # Computable variable decomposition in operands, which are then inserted
         # construct the query array (of query_names)
         for dst_var in self.variables:
-            src_var = self.variables[dst_var]
-            if isinstance(src_var, Computable):
-                computed += [dst_var]
-                log.info(f"Using computable bind: {dst_var} = {src_var.func.__name__} + {src_var.operands}")
-                operands += src_var.operands
-            else:
+            if not isinstance(self.variables[dst_var], Computable):
                 query.append(self.variables[dst_var]) # append raw var
         
+        # Computable variables decomposition in raw operands, which are then inserted
+        nodes, operands = self._get_computable_nodes(cached)
+        computed = [name for name in nodes if name not in cached] # in evaluation order
+        
+        for name, comp in nodes.items():
+            if name in cached:
+                log.info(f"Using stored computable: {name} = {comp.func.__name__} (version: {comp.version})")
+            else:
+                log.info(f"Using computable bind: {name} = {comp.func.__name__} + {[_get_operand_name(op) for op in comp.operands]}")
+        
         reversed_aliases = {v: k for k, v in self.variables.items() if type(v) is str} # convert aliases from std: raw to raw: std for renaming queried vars 
-        operands = list(set(operands))  # get unique list 
         
         # translate query aliases
         # translate operands aliases
@@ -89,46 +222,179 @@ class BaseDatasetProvider:
         for dst_var in query: # check that every raw variable exist in the dataset provider nomenclature 
             self.nomenclature.assert_has_query_param(dst_var)
         
-        hq = HarpQuery(
-            variables   = query, 
-            time        = time, 
-            offline     = offline, 
-            area        = area, 
-            levels      = levels, 
+        return dict(
+            query            = query,
+            operands         = operands,
+            computed         = computed,
+            cached           = cached,
+            nodes            = nodes,
+            direct_query     = direct_query,
+            reversed_aliases = reversed_aliases,
         )
+    
+    
+    def _get_computable_nodes(self, cached: dict = {}) -> tuple[dict, list]:
+        """
+        Resolves the computables as a DAG: an operand is either a raw variable, 
+        the name of another computable of self.variables, or a Computable (available to func as ds[func.__name__])
         
-        files = self.download(hq)
-        ds = xr.open_mfdataset(files, engine='netcdf4')
-                
-        ds = self._standardize(ds, area=area)
+        Returns the computables in evaluation order (name -> Computable, each one once, even if shared)
+        and the raw operands required to compute them (not the operands of the cached computables)
+        """
+        
+        nodes = {}      # name -> Computable, topological order
+        raw   = []      # raw operands
+        visiting = []   # current path, to detect cycles
+        
+        def visit(name: str, comp: Computable):
+            
+            if name in nodes:
+                if nodes[name] is not comp and self._get_storage_name(nodes[name]) != self._get_storage_name(comp):
+                    log.error(f"Two different computables are named {name}", e=ValueError)
+                return # common subexpression, computed once
+            
+            if name in visiting:
+                log.error(f"Circular computables dependency: {' -> '.join(visiting + [name])}", e=ValueError)
+            
+            visiting.append(name)
+            
+            if name not in cached or comp.keep_operands: # stored computables do not need their operands
+                for op in comp.operands:
+                    if isinstance(op, Computable):
+                        visit(op.func.__name__, op)
+                    elif isinstance(self.variables.get(op), Computable):
+                        visit(op, self.variables[op])
+                    else:
+                        raw.append(op)
+            
+            visiting.pop()
+            nodes[name] = comp
+        
+        for dst_var, src_var in self.variables.items():
+            if isinstance(src_var, Computable):
+                visit(dst_var, src_var)
+        
+        return nodes, list(dict.fromkeys(raw))
+    
+    
+    def _finalize_variables(self, ds: xr.Dataset, resolved: dict, hq: HarpQuery = None) -> xr.Dataset:
+        """
+        Computes the computable variables, drops the unwanted operands and renames to the user aliases
+        resolved is the output of self._resolve_variables
+        hq is the query of the dataset, required to store the persisted computables
+        
+        The computables are evaluated in dependency order on the (dask backed) dataset: 
+        nothing is computed until the returned variables are accessed, except the persisted computables which are stored
+        """
         
         # unstranslate from query request to user aliased names
-        operands = [self.nomenclature.untranslate_query_name(op) for op in operands]
-        query    = [self.nomenclature.untranslate_query_name(qu) for qu in query]
-        keep     = [self.nomenclature.untranslate_query_name(qu) for qu in direct_query]
+        operands = [self.nomenclature.untranslate_query_name(op) for op in resolved["operands"]]
+        keep     = [self.nomenclature.untranslate_query_name(qu) for qu in resolved["direct_query"]]
+        keep    += [name for name in resolved["nodes"] if name in self.variables] # requested computables
         
-        for dst_var in computed:
-            comp: Computable = self.variables[dst_var]
-            ds[dst_var] = comp.func(ds)
+        for name, comp in resolved["nodes"].items():
+            
+            if name in resolved["cached"]:
+                units = resolved["cached"][name]
+                files = [self._get_target_file_path(u) for u in units]
+                ds[name] = harp_open.open_atomic_slices(units, files)[units[0].variable]
+            
+            else:
+                ds[name] = comp.func(ds)
+                
+                if comp.persist and hq is not None:
+                    ds[name] = self._store_computable(ds[name], self._get_computable_units(hq, comp))
             
             if comp.keep_operands:
                 for op in comp.operands:
-                    log.debug(f"Keeping operand {op}")
-                    keep.append(op)
+                    log.debug(f"Keeping operand {_get_operand_name(op)}")
+                    keep.append(_get_operand_name(op))
         
         keep = list(set(keep))
-        drop = [op for op in operands if op not in keep]
+        drop = [op for op in operands + list(resolved["nodes"]) if op not in keep and op in ds]
                 
         if drop:
             log.info(f"Droping operangs: {drop}")
             ds = ds.drop_vars(drop)
         
-        if reversed_aliases:
-            ds = ds.rename_vars(reversed_aliases)
+        if resolved["reversed_aliases"]:
+            ds = ds.rename_vars(resolved["reversed_aliases"])
         
         return ds
     
     
+    def _get_computable_units(self, hq: HarpQuery, comp: Computable) -> list[HarpAtomicStorageUnit]:
+        """
+        Returns the storage units of a persisted computable for the query
+        (the units of its first raw operand, forecast runs included, stored under the computable storage name)
+        """
+        
+        op = comp.operands[0]
+        while not isinstance(op, str) or isinstance(self.variables.get(op), Computable): # computable operand
+            op = (op if isinstance(op, Computable) else self.variables[op]).operands[0]
+        
+        hqc = HarpQuery.from_dict(hq.to_dict())
+        hqc.variables = [self.nomenclature.translate_to_query_name(op)]
+        
+        name = self._get_storage_name(comp)
+        
+        return [
+            HarpAtomicStorageUnit(variable=name, time=u.time, area=u.area, levels=u.levels, ref_time=u.ref_time)
+            for u in self._get_query_units(hqc)
+        ]
+    
+    
+    def _get_storage_name(self, comp: Computable) -> str:
+        """
+        Storage name of a persisted computable, operands naming computables of self.variables included
+        """
+        
+        def _resolve(op: str) -> Computable:
+            named = self.variables.get(op)
+            return named if isinstance(named, Computable) else None
+        
+        return comp.get_storage_name(resolve=_resolve)
+    
+    
+    def _get_cached_computables(self, hq: HarpQuery) -> dict:
+        """
+        Returns the persisted computables entirely stored for the query (name -> storage units)
+        """
+        
+        nodes, _ = self._get_computable_nodes()
+        
+        cached = {}
+        for name, comp in nodes.items():
+            if not comp.persist: continue
+            
+            units = self._get_computable_units(hq, comp)
+            if all(self._exists_locally(u) for u in units):
+                cached[name] = units
+        
+        return cached
+    
+    
+    def _store_computable(self, da: xr.DataArray, units: list[HarpAtomicStorageUnit]) -> xr.DataArray:
+        """
+        Computes and stores a persisted computable, one atomic slice per timestep
+        Returns the computed variable
+        """
+        
+        da = da.load()
+        
+        for u in units:
+            atomic_slice = da.sel(time=[u.time]).to_dataset(name=u.variable)
+            atomic_slice.attrs["harp_storage_version"] = u.storage_version
+            
+            path = self._get_target_file_path(u)
+            path.parent.mkdir(exist_ok=True, parents=True)
+            
+            if not path.is_file():
+                self._write_slice(atomic_slice, path)
+        
+        return da
+    
+    
     def get_config(self):
         
         return self.config.config_dict
@@ -190,36 +456,113 @@ class BaseDatasetProvider:
             log.error(f"Storage path (Key \'dir_storage\') not provided in config for {context} object", e=RuntimeError)
     
     
-    def _split_and_store_atomic(self, ds, hq: HarpQuery):
+    def _split_and_store_atomic(self, ds, hq: HarpQuery, on_stored: Callable = None):
         """
         Split and store dataset per variable and per timestep
         assumes self._get_target_file_path is implemented in subclass
         
         HarpQuery only used to essentially hash the area and levels parameters
+        
+        The dataset is standardized once here (longitude centering, dims renaming), 
+        so that the stored slices are read as is
+        
+        With the write_behind config, the slices are registered as pending (in memory, readable at once)
+        and stored by a background writer. on_stored is called once the slices are stored (ex: to release the query lock)
         """
         
+        ds = self._standardize(ds, area=hq.area)
+        ds.attrs["harp_storage_version"] = HarpAtomicStorageUnit.storage_version
+        
+        slices = []
         for var in ds.data_vars:
             for i in range(ds[var].time.size):
                 
                 atomic_slice = ds[[var]].isel(time=[i], drop=False)
                 timestep = datetime.fromisoformat(str(atomic_slice.time.values[0]))
                 
-                hast = HarpAtomicStorageUnit(variable=var, time=timestep, area=hq.area, levels=hq.levels)
+                hast = HarpAtomicStorageUnit(variable=var, time=timestep, area=hq.area, levels=hq.levels, ref_time=hq.ref_time)
                 
-                atomic_slice_path: Path = self._get_target_file_path(hast) 
-                atomic_slice_path.parent.mkdir(exist_ok=True, parents=True)
-                
-                # store atomic slice
-                to_netcdf(ds = atomic_slice, 
-                            filename = atomic_slice_path,
-                            if_exists="skip"
-                )
-        return
+                slices.append((atomic_slice, self._get_target_file_path(hast)))
+        
+        if not self.config.get("write_behind"):
+            self._store_atomic_slices(slices, tiled=hq.area is None)
+            if on_stored is not None: on_stored()
+            return
+        
+        for atomic_slice, atomic_slice_path in slices:
+            atomic_slice = atomic_slice.load()
+            var = list(atomic_slice.data_vars)[0]
+            
+            harp_open.get_template(atomic_slice_path, var, area=hq.area, levels=hq.levels, ds=atomic_slice)
+            write_behind.add_pending(atomic_slice_path, atomic_slice[var].values)
+        
+        write_behind.submit(
+            lambda: self._store_atomic_slices(slices, tiled=hq.area is None), 
+            files = [f for _, f in slices], 
+            on_done = on_stored,
+        )
+    
+    
+    def _store_atomic_slices(self, slices: list[tuple[xr.Dataset, Path]], tiled: bool):
+        
+        for atomic_slice, atomic_slice_path in slices:
+            
+            atomic_slice_path.parent.mkdir(exist_ok=True, parents=True)
+            var = list(atomic_slice.data_vars)[0]
+            
+            if tiled and self.config.get("tile_size"): # tiled global slice
+                atomic_slice[var].encoding = dict(zlib=True, complevel=5, chunksizes=self._get_tile_chunks(atomic_slice[var]))
+                kwargs = dict(zlib=False) # compression and chunks from the variable encoding
+            else:
+                kwargs = dict()
+            
+            if atomic_slice_path.is_file(): # already stored
+                continue
+            
+            self._write_slice(atomic_slice, atomic_slice_path, **kwargs)
+    
+    
+    def _write_slice(self, atomic_slice: xr.Dataset, path: Path, **kwargs):
+        """
+        Writes an atomic slice next to its final path, then renames it in place (atomic):
+        a killed process never leaves a truncated slice which would be read as valid
+        A slice stored again drops the templates of its variables (their layout may have changed)
+        """
+        
+        restored = path.is_file()
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        to_netcdf(ds = atomic_slice, 
+                    filename = tmp_path,
+                    if_exists="overwrite",
+                    **kwargs
+        )
+        os.replace(tmp_path, path)
+        
+        if restored:
+            harp_open.drop_templates(path, list(atomic_slice.data_vars))
+    
+    
+    def _get_tile_chunks(self, da: xr.DataArray) -> tuple[int]:
+        """
+        Chunk sizes of a tiled slice: tile_size x tile_size degrees per latitude/longitude, whole along the other dims
+        """
+        
+        tile_size = float(self.config.get("tile_size"))
+        
+        chunks = []
+        for dim, size in zip(da.dims, da.shape):
+            if dim in [harp_std.lat_name, harp_std.lon_name] and size > 1:
+                step = abs(float(da[dim][1] - da[dim][0]))
+                chunks.append(min(size, max(1, round(tile_size / step))))
+            else:
+                chunks.append(size)
+        
+        return tuple(chunks)
     
     
     def _exists_locally(self, hast: HarpAtomicStorageUnit) -> bool:
         filepath = self._get_target_file_path(hast)
-        return filepath.is_file()
+        return filepath.is_file() or write_behind.is_pending(filepath)
     
     
     def _get_target_file_path(self, hast: HarpAtomicStorageUnit) -> Path:
@@ -230,12 +573,155 @@ class BaseDatasetProvider:
         return self.config.get("dir_storage") / self.collection / self.name
     
     
+    def download(self, hq: HarpQuery) -> list[Path]:
+        """
+        Download the missing atomic slices of the query, returns all the query files
+        If a harp daemon serves the cache directory (harp serve), downloads are delegated to it
+        """
+        
+        return [self._get_target_file_path(u) for u in self._download(hq)]
+    
+    
+    def _open_query(self, hq: HarpQuery) -> xr.Dataset:
+        """
+        Downloads the query and opens its atomic slices
+        Slices are stored standardized, with the same grid per variable: they are opened from a template
+        instead of comparing the coordinates of every file (see harp_open)
+        """
+        
+        parts = self._split_area(hq)
+        if len(parts) > 1: # crosses the seam of the stored longitudes: both sides are queried and stitched
+            return harp_std.stitch_longitudes(*[self._open_query(p) for p in parts], area=hq.area)
+        hq = parts[0]
+        
+        harp_open.slice_cache.resize(self.config.get("slice_cache_size"))
+        
+        units = self._get_memory_cached_units(hq)
+        if units is not None: # every slice was read recently: no cache scan, no file opened
+            return harp_open.open_atomic_slices(units, [self._get_target_file_path(u) for u in units])
+        
+        units = self._get_stored_global_units(hq)
+        if units is not None: # regional query read from the tiles of the stored global slices
+            return harp_open.open_atomic_slices(units, [self._get_target_file_path(u) for u in units], area=hq.area)
+        
+        units = self._download(hq)
+        
+        return harp_open.open_atomic_slices(units, [self._get_target_file_path(u) for u in units])
+    
+    
+    def _get_memory_cached_units(self, hq: HarpQuery) -> list[HarpAtomicStorageUnit]:
+        """
+        Returns the units of the query if all its slices are in the in-memory slice cache (see harp_open.SliceCache), else None
+        """
+        
+        if not harp_open.slice_cache.max_bytes:
+            return None
+        
+        units = self._get_query_units(hq)
+        files = [self._get_target_file_path(u) for u in units]
+        
+        if not units or not all(harp_open.slice_cache.has_slice(f) for f in files): # not read whole, or changed on disk since
+            return None
+        
+        return units
+    
+    
+    def _split_area(self, hq: HarpQuery) -> list[HarpQuery]:
+        """
+        Splits a query whose area crosses the antimeridian (W > E) in a query per side (see harp_std.split_area)
+        Each side is downloaded and cached as a regular regional query
+        """
+        
+        if hq.area is None:
+            return [hq]
+        
+        areas = harp_std.split_area(hq.area)
+        if len(areas) == 1 and areas[0] == hq.area:
+            return [hq]
+        
+        parts = []
+        for area in areas:
+            part = HarpQuery.from_dict(hq.to_dict())
+            part.area = area
+            parts.append(part)
+        
+        return parts
+    
+    
+    def _get_stored_global_units(self, hq: HarpQuery) -> list[HarpAtomicStorageUnit]:
+        """
+        Returns the global slices of a regional query if tiled storage is enabled and they are all stored, else None
+        """
+        
+        if hq.area is None or not self.config.get("tile_size"):
+            return None
+        
+        if hq.area[1] < -180 or hq.area[3] > 180: # stored longitudes are centered on 0
+            return None
+        
+        ghq = HarpQuery.from_dict(hq.to_dict())
+        ghq.area = None
+        
+        units = self._get_query_units(ghq)
+        
+        if not all(self._exists_locally(u) for u in units):
+            return None
+        
+        log.debug(f"Reading {hq.area} from the stored global slices")
+        
+        return units
+    
+    
+    def _download(self, hq: HarpQuery) -> list[HarpAtomicStorageUnit]:
+        
+        parts = self._split_area(hq)
+        if len(parts) > 1:
+            return [u for p in parts for u in self._download(p)]
+        hq = parts[0]
+        
+        offline = hq.offline or self.config.get("offline")
+        socket_path = serve_client.get_socket_path(self.config)
+        
+        if socket_path is not None and not offline:
+            try:
+                serve_client.submit(self, hq, socket_path)
+                units = self._get_query_units(hq)
+                
+                if all(self._exists_locally(u) for u in units):
+                    return units
+                log.warning(f"harp daemon on {socket_path} replied without storing all the slices, downloading locally")
+                
+            except ConnectionError as e:
+                log.debug(f"Could not reach harp daemon on {socket_path} ({e}), downloading locally")
+        
+        subqueries: list[HarpQuery] = self._decompose_into_subqueries(hq)
+        subqueries: list[HarpQuery] = self._filter_cached_variables_from_queries(subqueries)
+        
+        self._download_subqueries(subqueries)
+        
+        return self._get_query_units(hq)
+    
+    
     @abstract # to be defined by subclasses
-    def download() -> Path: # TODO add get params or smt
+    def _download_subqueries(self, subqueries: list[HarpQuery]):
+        """
+        Download and store the atomic slices of the provided (decomposed and filtered) subqueries
+        """
         raise RuntimeError('Should not be executed here, but through subclasses')
+    
+    
+    def _get_init_kwargs(self) -> dict:
+        """
+        Returns the constructor keyword arguments (except variables and config) 
+        required to re-instantiate an equivalent provider in another process
+        """
+        return {}
 
     @abstract # to be defined by subclasses
-    def _standardize(ds: xr.Dataset) -> xr.Dataset:
+    def _standardize(self, ds: xr.Dataset, area=None) -> xr.Dataset:
+        """
+        Standardizes a downloaded dataset before it is split and stored (see _split_and_store_atomic)
+        """
         raise RuntimeError('Should not be executed here, but through subclasses')
     
     
@@ -282,6 +768,13 @@ class BaseDatasetProvider:
         return folder
         
     
+    def _get_staging_folder(self) -> Path:
+        """
+        Returns HARP staging folder (downloaded payloads, kept until their slices are stored)
+        """
+        return self.config.get("dir_storage") / "staging"
+    
+    
     def _filter_cached_variables_from_queries(self, queries: list[HarpQuery]):
         """
         For each query removes the variables which are present locally (harp cache)
@@ -310,7 +803,7 @@ class BaseDatasetProvider:
         
             for t in hq.timesteps: # Check that all timesteps are present
                 
-                hast = HarpAtomicStorageUnit(variable=v, time=t, area=hq.area, levels=hq.levels)
+                hast = HarpAtomicStorageUnit(variable=v, time=t, area=hq.area, levels=hq.levels, ref_time=hq.ref_time)
                 if not self._exists_locally(hast): # already missing one, need to query anyway
                     all_timesteps_stored_locally = False
                     break
@@ -327,11 +820,19 @@ class BaseDatasetProvider:
         return hq
     
     
-    def _get_query_files(self, hq: HarpQuery):
+    def _get_query_files(self, hq: HarpQuery) -> list[Path]:
         """
         From the query object, returns all expected atomic slices paths
         """
         
+        return [self._get_target_file_path(u) for u in self._get_query_units(hq)]
+    
+    
+    def _get_query_units(self, hq: HarpQuery) -> list[HarpAtomicStorageUnit]:
+        """
+        From the query object, returns all expected atomic slices
+        """
+        
         assert type(hq.time) == datetime
         
         timesteps = self.timespecs.get_encompassing_timesteps(hq.time)
@@ -339,16 +840,26 @@ class BaseDatasetProvider:
         times_tmp = hq.timesteps
         hq.timesteps  = timesteps
         
-        files = []
-        units = hq.get_atomic_storage_units()
-        # for t in hq.times:
-            # for var in variables:
-        for u in units:
-            files.append(self._get_target_file_path(u))
+        units = self._get_storage_units(hq)
         
         hq.timesteps = times_tmp
         
-        return files
+        return units
+    
+    
+    def _get_storage_units(self, hq: HarpQuery) -> list[HarpAtomicStorageUnit]:
+        """
+        Return the decomposition of the query on atomic slice storage units
+        (query names translated to stored names)
+        """
+        
+        units = []
+        for v in hq.variables:
+            stored = self.nomenclature.untranslate_query_name(v)
+            for t in hq.timesteps:
+                units.append(HarpAtomicStorageUnit(variable=stored, time=t, area=hq.area, levels=hq.levels, ref_time=hq.ref_time))
+        
+        return units
         
     
     def _decompose_into_subqueries(self, hq: HarpQuery, **kwargs) -> list[HarpQuery]:
@@ -388,4 +899,11 @@ class BaseDatasetProvider:
             
             queries.append(hqs)
         
-        return queries
\ No newline at end of file
+        return queries
+
+
+def _get_operand_name(op) -> str:
+    """
+    Name of a computable operand in the dataset passed to its function
+    """
+    return op.func.__name__ if isinstance(op, Computable) else op
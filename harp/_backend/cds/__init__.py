@@ -1,3 +1,4 @@
 from . import auth
 from .cds_tables import cds_table
-from .cds_dataset_provider import CdsDatasetProvider
\ No newline at end of file
+from .cds_dataset_provider import CdsDatasetProvider
+from .cds_forecast_provider import CdsForecastDatasetProvider
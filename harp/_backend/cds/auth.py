@@ -2,12 +2,21 @@ import logging
 
 from pathlib import Path
 import os
+import threading
 
 from core import log
 
-import cdsapi
+
+_clients = {} # (url, key) -> client, shared by the providers and threads of the process
+_configs = {} # (rc path, modification time) -> parsed configuration
+_lock = threading.Lock()
+
 
 def get_client(url):
+    """
+    Returns the CDS client of url from the process pool: the credentials are parsed 
+    and the client (with its HTTP session, ie. its connections) is created once per url and key
+    """
     
     dotrc = Path(os.environ.get("CDSAPI_RC", os.path.expanduser("~/.cdsapirc")))
     if not dotrc.is_file():
@@ -15,14 +24,24 @@ def get_client(url):
         log.disp(log.rgb.orange, "(?) Instructions to set up Harp for Copernicus: \n -> www.github.com/hygeos/harp/todo") # TODO proper doc
         raise RuntimeError("Missing CDS credential file")
     
-    config = _read_config(dotrc) 
-
-    key = config['key']
-
-    client = cdsapi.Client(url=url, key=key, quiet=True)
-    # client.logger.setLevel(logging.WARNING)
-    
-    return client
+    with _lock:
+        config_key = (str(dotrc), dotrc.stat().st_mtime_ns) # parsed again if the file is modified
+        if config_key not in _configs:
+            _configs[config_key] = _read_config(dotrc)
+        
+        key = _configs[config_key]['key']
+        
+        if (url, key) not in _clients:
+            import cdsapi # imported on first query only, slow to import
+            import requests
+            
+            # own session per client: the legacy client sets its credentials on the session
+            client = cdsapi.Client(url=url, key=key, quiet=True, session=requests.Session())
+            # client.logger.setLevel(logging.WARNING)
+            
+            _clients[(url, key)] = client
+        
+        return _clients[(url, key)]
 
 def _read_config(path: Path):
     """
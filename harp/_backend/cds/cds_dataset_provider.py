@@ -1,15 +1,15 @@
 from datetime import date, datetime, timedelta
 from pathlib import Path
-from tempfile import TemporaryDirectory
-import uuid
+import hashlib
+import json
+import os
 
-import cdsapi
 from core import log
 from core.static import abstract, interface
 import xarray as xr
 
 from harp._backend.harp_query import HarpQuery
-from harp._backend.cds import cds_search_provider
+from harp._backend.cds import cds_search_provider, cds_planner
 from harp._backend.timespec import RegularTimespec
 from harp._backend.baseprovider import BaseDatasetProvider
 from harp._backend.nomenclature import Nomenclature
@@ -31,6 +31,8 @@ class CdsDatasetProvider(BaseDatasetProvider):
     
     timespecs = RegularTimespec(timedelta(seconds=0), 24) # default specs to hourly from 00:00 to 23:00
     
+    cost_model = cds_planner.CostModel() # CDS requests limit and costs, used to shape the requests (see cds_planner)
+    
     
     # @interface
     def __init__(self, *, csv_files: list[Path], variables: dict[str: str], config: dict={}):
@@ -45,50 +47,195 @@ class CdsDatasetProvider(BaseDatasetProvider):
         )
         
     
-    def download(self, hq: HarpQuery) -> list[Path]:
+    def _download_subqueries(self, subqueries: list[HarpQuery]):
+        
+        self._resume_staged_payloads()
         
-        subqueries: list[HarpQuery] = self._decompose_into_subqueries(hq)
-        subqueries: list[HarpQuery] = self._filter_cached_variables_from_queries(subqueries)
+        subqueries = cds_planner.plan(subqueries, self.cost_model) # requests shapes, under the CDS limits
         
         for hqs in subqueries:
             
-            lock: ComputeLock = self._get_hashed_query_lock(hqs)
+            hqs, locks = self._lock_missing(hqs)
+            if hqs == None: continue # all files present locally
             
-            if lock.is_locked(): # query is currently already being executed by someone in the same HARP CACHE DIR tree
-                lock.wait()
-                
-                hqs = self._filter_cached_variables_from_query(hqs) # Check to see if all necessary files are now present
-                if hqs == None: continue # all files present locally
-                
-            with lock.locked(): # lock query and make query download
-                if hq.offline or self.config.get("offline"):
-                    log.error(f"Offline mode is activated and data is missing locally [{', '.join(hqs.variables)}] for {hq.timesteps}",
+            payload = self._get_staged_payload_path(hqs)
+            tmpfile = payload.with_name(payload.name + ".part")
+            
+            try:
+                if hqs.offline or self.config.get("offline"):
+                    log.error(f"Offline mode is activated and data is missing locally [{', '.join(hqs.variables)}] for {hqs.timesteps}",
                         e=FileNotFoundError)
             
                 log.info(f"Querying {self.name} for variables {', '.join(hqs.variables)} on {hqs.timesteps}")
-                        
-                with TemporaryDirectory() as tmpdir:
-                    tmpfile = Path(tmpdir) / f"tmp_{uuid.uuid4().hex}_.nc"
-                    
-                    self._execute_cds_request(tmpfile, hqs)
-                    
-                    ds = xr.open_dataset(tmpfile, engine='netcdf4')
-                    
-                    # rename valid_time dimension to time
-                    # rename shortnames to query_names for consistency
-                    new_names = {"valid_time": "time"} 
-                    ds = ds.rename(new_names)
-                    ds = self._standardize_time(ds)
-                    
-                    # split and store per variable, per timestep
-                    self._split_and_store_atomic(ds, hqs)
-                    
-        
-        returned_params = [self.nomenclature.untranslate_query_name(p) for p in hq.variables]
-        hq.variables = returned_params
-        
-        files = self._get_query_files(hq)
-        return files
+                
+                payload.parent.mkdir(parents=True, exist_ok=True)
+                payload.with_suffix(".json").write_text(json.dumps(hqs.to_dict()))
+                
+                self._execute_cds_request(tmpfile, hqs)
+                os.replace(tmpfile, payload) # staged once complete, until its slices are stored
+                
+                self._ingest_payload(payload, self._open_payload(payload), hqs, locks)
+            
+            except BaseException:
+                if not payload.is_file(): # request failed, nothing staged
+                    tmpfile.unlink(missing_ok=True)
+                    payload.with_suffix(".json").unlink(missing_ok=True)
+                _release(locks)
+                raise
+    
+    
+    def _lock_missing(self, hq: HarpQuery) -> tuple[HarpQuery, list[ComputeLock]]:
+        """
+        Acquires the locks of the missing part of the query (waiting if it is being executed by someone 
+        in the same HARP CACHE DIR tree), returns the missing query and its locks (None, [] if all files are present)
+        
+        The locks of its days (see _get_day_locks) are acquired first, then the lock of the request itself
+        """
+        
+        while True:
+            hq = self._filter_cached_variables_from_query(hq)
+            if hq == None: 
+                return None, []
+            
+            locks = self._get_day_locks(hq) + [self._get_hashed_query_lock(hq)]
+            _acquire(locks)
+            
+            missing = self._filter_cached_variables_from_query(HarpQuery.from_dict(hq.to_dict()))
+            if missing is not None and missing.variables == hq.variables: # nothing stored in the meantime
+                return hq, locks
+            
+            _release(locks)
+    
+    
+    def _get_day_locks(self, hq: HarpQuery) -> list[ComputeLock]:
+        """
+        Returns the locks of the per day parts of a request (one per variable), in the same order for every process
+        
+        Requests are merged differently by the planner depending on the missing days (see cds_planner), and their 
+        own locks then differ: the locks of their per day parts make two requests sharing a day exclude each other
+        """
+        
+        days = self._get_request_days(hq)
+        extra = sorted((k, v) for k, v in hq.extra.items() if k not in ["day", "days"])
+        
+        keys = []
+        for d in days:
+            timesteps = hq.timesteps if len(days) == 1 else [t for t in hq.timesteps if t.date() == d]
+            keys += [
+                f"DAY{{day: {d}; variable: {v}; timesteps: {timesteps}; area: {hq.area}; levels: {hq.levels}; ref_time: {hq.ref_time}; extra: {extra}}}END"
+                for v in hq.variables
+            ]
+        
+        return [
+            ComputeLock(
+                filepath = self._get_query_hash_folder() / (f"{self.collection}_{self.name}__" + hashlib.blake2b(k.encode("utf-8"), digest_size=64).hexdigest() + ".lock"),
+                timeout  = self.config.get("lock_timeout"),
+                lifetime = self.config.get("lock_lifetime"),
+                interval = 1,
+            )
+            for k in sorted(keys)
+        ]
+    
+    
+    def _open_payload(self, payload: Path) -> xr.Dataset:
+        """
+        Opens a staged CDS response, with the harp time dimension
+        """
+        
+        ds = xr.open_dataset(payload, engine='netcdf4')
+        
+        # rename valid_time dimension to time
+        # rename shortnames to query_names for consistency
+        new_names = {"valid_time": "time"} 
+        ds = ds.rename(new_names)
+        ds = self._standardize_time(ds)
+        
+        return ds
+    
+    
+    def _ingest_payload(self, payload: Path, ds: xr.Dataset, hq: HarpQuery, locks: list[ComputeLock]):
+        """
+        Splits and stores the slices of a staged CDS response (write_behind: in the background), 
+        then removes the payload and releases the query locks
+        """
+        
+        def _stored():
+            ds.close()
+            if self._filter_cached_variables_from_query(HarpQuery.from_dict(hq.to_dict())) is None: # all the slices are stored
+                payload.unlink(missing_ok=True)
+                payload.with_suffix(".json").unlink(missing_ok=True)
+            # data is stored, the CDS job doesn't need to be resumed anymore
+            self._get_hashed_query_jobfile_path(hq).unlink(missing_ok=True)
+            _release(locks)
+        
+        # split and store per variable, per timestep
+        # (write_behind: in the background, the locks are released once stored)
+        self._split_and_store_atomic(ds, hq, on_stored=_stored)
+    
+    
+    def _resume_staged_payloads(self):
+        """
+        Ingests the payloads left in the staging folder by a previous call (ex: process killed while storing), 
+        instead of downloading them again. Payloads are only discarded if they cannot be read: 
+        errors while storing their slices are raised and the payloads are kept
+        Also removes the partial downloads left by killed processes
+        """
+        
+        folder = self._get_staging_folder()
+        if not folder.is_dir():
+            return
+        
+        for query_file in sorted(folder.glob(f"{self.collection}_{self.name}__*.json")):
+            payload = query_file.with_suffix(".nc")
+            
+            try:
+                hq = HarpQuery.from_dict(json.loads(query_file.read_text()))
+            except (OSError, ValueError, KeyError): # query unknown, the payload cannot be ingested
+                log.warning(f"Discarding staged payload {payload.name}: its query cannot be read")
+                payload.unlink(missing_ok=True)
+                query_file.unlink(missing_ok=True)
+                continue
+            
+            lock: ComputeLock = self._get_hashed_query_lock(hq)
+            if not lock.try_acquire(): # being downloaded or ingested by someone else
+                continue
+            
+            if not payload.is_file(): # download interrupted (the owner of the lock is dead)
+                payload.with_name(payload.name + ".part").unlink(missing_ok=True)
+                query_file.unlink(missing_ok=True)
+                lock.release()
+                continue
+            
+            try:
+                ds = self._open_payload(payload)
+            except (OSError, ValueError) as e: # unreadable payload, downloaded again if still required
+                log.warning(f"Discarding staged payload {payload.name}: {e}")
+                payload.unlink(missing_ok=True)
+                query_file.unlink(missing_ok=True)
+                lock.release()
+                continue
+            
+            try:
+                log.info(f"Ingesting staged {self.name} payload {payload.name} for variables {', '.join(hq.variables)} on {hq.timesteps}")
+                self._ingest_payload(payload, ds, hq, [lock])
+            
+            except BaseException: # payload kept, ingested by the next call
+                lock.release()
+                raise
+    
+    
+    def _get_staged_payload_path(self, hq: HarpQuery) -> Path:
+        """
+        Returns the path of the CDS response of a query in the staging folder (kept until its slices are stored)
+        """
+        return self._get_staging_folder() / self._get_hashed_query_lockfile_path(hq).with_suffix(".nc").name
+    
+    
+    def _get_request_days(self, hq: HarpQuery) -> list[date]:
+        """
+        Returns the days of a request (several if merged by the planner, see cds_planner)
+        """
+        return hq.extra.get("days", [hq.extra["day"]])
     
     
     @abstract
@@ -96,13 +243,95 @@ class CdsDatasetProvider(BaseDatasetProvider):
         return
     
     
+    def _retrieve(self, dataset: str, request: dict, target_filepath: Path, hq: HarpQuery):
+        """
+        Submit the request to the CDS and download the result to target_filepath
+        
+        The CDS request ID is persisted next to the query lockfile until the data is stored,
+        so that a process killed while the job is queued resumes the same job instead of resubmitting it
+        """
+        
+        client = cds.auth.get_client(self.url)
+        
+        if not hasattr(client, "client"): # legacy cdsapi client, no job handling
+            client.retrieve(dataset, request, str(target_filepath))
+            return
+        
+        jobfile = self._get_hashed_query_jobfile_path(hq)
+        remote  = self._resume_cds_job(client, jobfile, dataset, request)
+        
+        if remote is None:
+            remote = client.client.submit(collection_id=dataset, request=request)
+            
+            job = dict(
+                request_id  = remote.request_id,
+                url         = self.url,
+                dataset     = dataset,
+                request     = request,
+                submitted   = datetime.now().isoformat(),
+            )
+            
+            jobfile.parent.mkdir(parents=True, exist_ok=True)
+            jobfile.write_text(json.dumps(job, default=str))
+            
+        remote.download(str(target_filepath))
+        
+        return
+    
+    
+    def _resume_cds_job(self, client, jobfile: Path, dataset: str, request: dict):
+        """
+        Returns the remote CDS job previously submitted for the same query, 
+        None if there is none or if it cannot be resumed (failed, deleted, different request)
+        """
+        
+        if not jobfile.is_file():
+            return None
+        
+        try:
+            job = json.loads(jobfile.read_text())
+        except json.JSONDecodeError:
+            jobfile.unlink(missing_ok=True)
+            return None
+        
+        same_request = json.loads(json.dumps(request, default=str)) == job.get("request")
+        
+        if job.get("url") != self.url or job.get("dataset") != dataset or not same_request:
+            log.debug(f"Discarding CDS job {job.get('request_id')}: request changed")
+            jobfile.unlink(missing_ok=True)
+            return None
+        
+        try:
+            remote = client.client.get_remote(job["request_id"])
+            status = remote.status
+        except Exception as e: # expired or deleted on the CDS side
+            log.debug(f"Cannot resume CDS job {job['request_id']}: {e}")
+            jobfile.unlink(missing_ok=True)
+            return None
+        
+        if status in ["failed", "rejected", "dismissed", "deleted"]:
+            log.debug(f"Cannot resume CDS job {job['request_id']}: status is {status}")
+            jobfile.unlink(missing_ok=True)
+            return None
+        
+        log.info(f"Resuming CDS job {job['request_id']} ({status}) submitted on {job['submitted']}")
+        return remote
+    
+    
+    def _get_hashed_query_jobfile_path(self, hq: HarpQuery) -> Path:
+        """
+        Returns the path of the file storing the CDS request ID of a query, next to its lockfile
+        """
+        return self._get_hashed_query_lockfile_path(hq).with_suffix(".job")
+    
+    
     def _standardize_time(self, ds: xr.Dataset):
         """
         To be overriden by forecast providers
         """
         return ds
     
-    def _standardize(self, ds):
+    def _standardize(self, ds, area=None):
         
         # ds = ds.rename_dims({'latitude': harp_std.lat_name, 'longitude': harp_std.lon_name}) # rename merra2 names to ECMWF convention
         # ds = ds.rename_vars({'latitude': harp_std.lat_name, 'longitude': harp_std.lon_name})
@@ -116,3 +345,20 @@ class CdsDatasetProvider(BaseDatasetProvider):
     format_search_table = cds_search_provider.format_search_table
     
 
+
+def _acquire(locks: list[ComputeLock]):
+    """
+    Acquires the locks in order, releases the acquired ones if one of them cannot be acquired (ex: timeout)
+    """
+    
+    for i, lock in enumerate(locks):
+        try:
+            lock.acquire()
+        except BaseException:
+            _release(locks[:i])
+            raise
+
+
+def _release(locks: list[ComputeLock]):
+    for lock in locks:
+        lock.release()
@@ -0,0 +1,266 @@
+from datetime import date, datetime, timedelta
+from typing import Callable, Literal
+
+import xarray as xr
+
+from core import log
+from core.static import abstract
+
+from harp._backend._utils.HarpErrors import InvalidQueryError
+from harp._backend.harp_query import HarpQuery, HarpAtomicStorageUnit
+from harp._backend.forecast_index import ForecastIndex
+from harp._backend.timespec import RegularTimespec
+from harp._backend.cds.cds_dataset_provider import CdsDatasetProvider
+
+
+@abstract
+class CdsForecastDatasetProvider(CdsDatasetProvider):
+    """
+    Common base for the CDS forecast datasets (runs published every timespecs_ref, up to max_leadtime hours)
+    Atomic slices are stored per reference time (forecast run)
+    
+    Forecast run selection policy (prefer) when get is called without ref_time:
+        - "latest":  latest run available for the requested time (default)
+        - "cached":  newest cached run covering the requested time, latest run if none
+        - "max_age": newest cached run at most max_age older than the latest published run, latest run if none
+    """
+
+    timespecs_ref = RegularTimespec(timedelta(seconds=0), 2)
+    latency_ref   = timedelta(hours=7) # latency for time_ref publishing (00:00 is published around 06:00)
+    max_leadtime  = 120 # maximum leadtime
+
+    allow_extended_forecast = False
+    prefer  = "latest"
+    max_age = None
+    
+    index_name = "forecast_index.jsonl"
+
+
+    def _set_forecast_policy(self, prefer: Literal["latest", "cached", "max_age"], max_age: timedelta):
+
+        if prefer not in ["latest", "cached", "max_age"]:
+            log.error(f"Invalid forecast policy prefer={prefer}, expected one of: latest, cached, max_age", e=ValueError)
+
+        if prefer == "max_age" and max_age is None:
+            log.error("Forecast policy prefer=\"max_age\" requires the max_age parameter", e=ValueError)
+
+        self.prefer  = prefer
+        self.max_age = max_age
+
+
+    def get_forecast(self,
+            ref_time: datetime,
+            leadtimes: list[int] = None,
+            area: list = None, # [N, W, S, E]
+            levels: list = None,
+            *,
+            block_size: int = None,
+            **kwargs,
+            ) -> xr.Dataset:
+        """
+        Get a whole forecast run (or part of it) in as few requests as possible
+        The atomic slices are stored under their reference time, subsequent get calls with the same ref_time are served from the cache
+
+        Args:
+            ref_time (datetime): reference time of the forecast run (ex: 2025-01-01 00:00)
+            leadtimes (list[int], optional): leadtimes in hours. Defaults to all the leadtimes of the run.
+            area (list, optional): [N, W, S, E] bounding box of query. Defaults to None (global).
+            levels (list, optional): levels to query (volumetric datasets only). Defaults to None.
+            block_size (int, optional): maximum number of leadtimes per request. Defaults to None (one request).
+            **kwargs: offline (bool), target_grid and regrid_method (see get)
+        """
+
+        if leadtimes is None:
+            step = round(self.timespecs.dt.total_seconds() / 3600)
+            leadtimes = range(0, self.max_leadtime + 1, step)
+
+        koffline = kwargs.pop('offline', None)
+        offline = koffline if koffline is not None else self.config.get("offline")
+
+        resolved = self._resolve_variables()
+
+        hq = HarpQuery(
+            variables   = resolved["query"],
+            timesteps   = [ref_time + timedelta(hours=int(lt)) for lt in leadtimes],
+            offline     = offline,
+            area        = area,
+            levels      = levels,
+            ref_time    = ref_time,
+        )
+        hq.extra["block_size"] = block_size
+
+        ds = self._get_resolved(hq, resolved)
+
+        return self._regrid(ds, kwargs.pop('target_grid', None), kwargs.pop('regrid_method', "bilinear"))
+
+
+    def _get_latest_published_ref(self) -> datetime:
+        return self.timespecs_ref.get_encompassing_timesteps(datetime.now() - self.latency_ref)[0]
+
+
+    def _decompose_into_subqueries(self, hq: HarpQuery) -> list[HarpQuery]:
+        """
+        Decompose the query as a (series of) CDS query for the missing data,
+        Split the times by their ref times (00:00 or 12:00 per days)
+        Rationnale:
+            We need to make one query per reference timestamp, instead of per day
+
+        If the query has a ref_time, all its timesteps are taken from that forecast run
+        (split in blocks of hq.extra["block_size"] timesteps if set)
+        """
+
+        if hq.ref_time is not None:
+            return self._decompose_ref_time_query(hq)
+
+        timesteps = self.timespecs.get_encompassing_timesteps(hq.time)
+        latest_pub_ref = self._get_latest_published_ref()
+        ref_times = {}
+
+        for timestep in timesteps:
+            res = self.timespecs_ref.get_encompassing_timesteps(timestep)
+            lower_ref = res[0]
+
+            ref = self._get_cached_ref_time(hq, timestep, latest_pub_ref)
+
+            if ref is not None: # served by a cached run, according to the policy
+                pass
+
+            elif lower_ref <= latest_pub_ref: # No NRT forecast (in between actualizations)
+                ref = lower_ref
+
+            elif not self.allow_extended_forecast:
+                raise InvalidQueryError("Querying outside of restricted forecast (>11h leadtime) without setting allow_extended_forecast param. \nTry setting allow_extended_forecast=True in the provider constructor")
+
+            else:
+                ref = latest_pub_ref
+
+            req_lead = timestep - ref
+            max_lead = timedelta(hours=self.max_leadtime)
+
+            if req_lead > max_lead: # means ref == latest
+                raise InvalidQueryError("Querying outside of Forecast range "
+                    + f"\n\tavailable: {latest_pub_ref} + {self.max_leadtime}h max"
+                    + f"\n\trequested: {latest_pub_ref} + {int(req_lead.total_seconds() / 3600)}h"
+            )
+
+            if not ref in ref_times: ref_times[ref] = []
+            ref_times[ref] += [timestep]
+
+        return [self._make_ref_time_subquery(hq, rt, timesteps) for rt, timesteps in ref_times.items()]
+
+
+    def _get_cached_ref_time(self, hq: HarpQuery, timestep: datetime, latest_pub_ref: datetime) -> datetime|None:
+        """
+        Returns the newest cached run providing all the query variables at timestep, allowed by the policy
+        None if the policy is "latest", if the query has no variables or if there is no such run
+        """
+
+        if self.prefer == "latest" or not hq.variables:
+            return None
+
+        index = self._get_forecast_index()
+        variables = [self.nomenclature.untranslate_query_name(v) for v in hq.variables]
+
+        refs = set(index.get_ref_times(variables[0], timestep, area=hq.area, levels=hq.levels))
+        for v in variables[1:]:
+            refs &= set(index.get_ref_times(v, timestep, area=hq.area, levels=hq.levels))
+
+        for ref in sorted(refs, reverse=True):
+
+            if self.prefer == "max_age" and latest_pub_ref - ref > self.max_age:
+                break # older runs are even older
+
+            units = [HarpAtomicStorageUnit(variable=v, time=timestep, area=hq.area, levels=hq.levels, ref_time=ref) for v in variables]
+            if all(self._exists_locally(u) for u in units):
+                return ref
+
+        return None
+
+
+    def _get_forecast_index(self) -> ForecastIndex:
+
+        if not hasattr(self, "_forecast_index"):
+            self._forecast_index = ForecastIndex(self._get_dataset_folder() / self.index_name)
+
+        return self._forecast_index
+
+
+    def _split_and_store_atomic(self, ds: xr.Dataset, hq: HarpQuery, on_stored: Callable = None):
+
+        def _stored():
+            self._get_forecast_index().add(self._get_storage_units(hq))
+            if on_stored is not None: on_stored()
+
+        super()._split_and_store_atomic(ds, hq, on_stored=_stored)
+
+
+    def _decompose_ref_time_query(self, hq: HarpQuery) -> list[HarpQuery]:
+
+        ref = hq.ref_time
+
+        if list(self.timespecs_ref.get_encompassing_timesteps(ref)) != [ref]:
+            raise InvalidQueryError(f"{ref} is not a reference time of {self.name} (runs at {self.timespecs_ref.intraday_timesteps})")
+
+        latest_pub_ref = self._get_latest_published_ref()
+        if ref > latest_pub_ref:
+            raise InvalidQueryError(f"Forecast run {ref} is not published yet (latest: {latest_pub_ref})")
+
+        timesteps = hq.timesteps if hq.time is None else list(self.timespecs.get_encompassing_timesteps(hq.time))
+
+        for t in timesteps:
+            req_lead = t - ref
+
+            if not timedelta(0) <= req_lead <= timedelta(hours=self.max_leadtime):
+                raise InvalidQueryError("Querying outside of Forecast range "
+                    + f"\n\tavailable: {ref} + {self.max_leadtime}h max"
+                    + f"\n\trequested: {ref} + {req_lead.total_seconds() / 3600}h"
+                )
+
+            if list(self.timespecs.get_encompassing_timesteps(t)) != [t]:
+                raise InvalidQueryError(f"Leadtime {req_lead} does not match the {self.name} timesteps")
+
+        timesteps = sorted(set(timesteps))
+
+        block_size = hq.extra.get("block_size") or len(timesteps)
+        blocks = [timesteps[i:i+block_size] for i in range(0, len(timesteps), block_size)]
+
+        return [self._make_ref_time_subquery(hq, ref, block) for block in blocks]
+
+
+    def _make_ref_time_subquery(self, hq: HarpQuery, ref_time: datetime, timesteps: list[datetime]) -> HarpQuery:
+
+        hqs = HarpQuery(
+            variables   = hq.variables,
+            timesteps   = list(timesteps),
+            area        = hq.area,
+            levels      = hq.levels,
+            offline     = hq.offline,
+            ref_time    = ref_time,
+        )
+        hqs.extra["day"] = date(ref_time.year, ref_time.month, ref_time.day)
+
+        return hqs
+
+
+    def _get_query_units(self, hq: HarpQuery) -> list[HarpAtomicStorageUnit]:
+        """
+        From the query object, returns all expected atomic slices (stored per ref time)
+        """
+
+        units = []
+        for hqs in self._decompose_into_subqueries(hq):
+            units += self._get_storage_units(hqs)
+
+        return units
+
+
+    def _standardize_time(self, ds: xr.Dataset):
+        """
+        from time dims = (forecast_reference_time, forecast_perdiod) to (time)
+        """
+        ds = ds.isel(forecast_reference_time=0)  # Remove the singleton dimension
+        ds = ds.assign_coords(forecast_period=ds.time.values)
+        ds = ds.drop_vars(["time"])
+        ds = ds.rename({'forecast_period': 'time'})
+
+        return ds
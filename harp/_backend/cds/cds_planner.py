@@ -0,0 +1,146 @@
+"""
+Planning of the CDS requests of the missing atomic slices
+
+The CDS queues each request, then extracts its fields: a request costs a fixed queue overhead plus a cost per field,
+and is rejected above a maximum number of fields. The planner reshapes the (per day) subqueries to minimize the total cost:
+    - oversized requests are split (per variable, then per timesteps) under the fields limit
+    - small requests of the same month are merged (days and variables), as long as the merge is cheaper,
+      a merged request being the product of its days, times of day and variables (as the CDS requests)
+"""
+
+from datetime import datetime
+
+from harp._backend.harp_query import HarpQuery
+
+
+class CostModel:
+    """
+    Cost of a CDS request shape (ex: in seconds of queue and processing time)
+    """
+
+    def __init__(self, max_fields: int = 120_000, request_cost: float = 60, field_cost: float = 0.05):
+        """
+        max_fields: maximum number of fields (variables x timesteps x levels) of a request, above which the CDS rejects it
+        request_cost: queue overhead of a request
+        field_cost: cost of each field of a request
+        """
+        self.max_fields = max_fields
+        self.request_cost = request_cost
+        self.field_cost = field_cost
+
+    def get_fields(self, hq: HarpQuery) -> int:
+        return len(hq.variables) * len(hq.timesteps) * (len(hq.levels) if hq.levels else 1)
+
+    def __call__(self, hq: HarpQuery) -> float:
+        return self.request_cost + self.field_cost * self.get_fields(hq)
+
+
+def plan(subqueries: list[HarpQuery], cost: CostModel) -> list[HarpQuery]:
+    """
+    Returns the requests to execute for the subqueries (see module docstring)
+    The requests merged across days hold their days in extra["days"] (extra["day"] is the first one)
+    """
+
+    groups = {}
+    for hq in subqueries:
+        groups.setdefault(_get_group_key(hq), []).append(hq)
+
+    requests = []
+    for key, hqs in groups.items():
+        if key is not None:
+            hqs = _merge(hqs, cost)
+        for hq in hqs:
+            requests += _split(hq, cost)
+
+    return requests
+
+
+def _get_group_key(hq: HarpQuery):
+    """
+    Subqueries which can be merged share the same key (None: not mergeable, ex: forecasts of a reference time)
+    """
+
+    if hq.ref_time is not None or "day" not in hq.extra:
+        return None
+
+    extra = {k: v for k, v in hq.extra.items() if k not in ["day", "days"]}
+    day = hq.extra["day"]
+
+    return (str(hq.area), str(hq.levels), str(sorted(extra.items())), day.year, day.month) # CDS archives are per month
+
+
+def _merge(hqs: list[HarpQuery], cost: CostModel) -> list[HarpQuery]:
+    """
+    Merges the requests of consecutive days greedily (in a single pass over the sorted days):
+    each request is merged into the current one while the merge saves something and stays under the fields limit
+    """
+
+    hqs = sorted(hqs, key=lambda hq: hq.extra["day"])
+    res = [hqs[0]]
+
+    for hq in hqs[1:]:
+        merged = _merge_pair(res[-1], hq)
+
+        if cost.get_fields(merged) <= cost.max_fields and cost(res[-1]) + cost(hq) - cost(merged) > 0:
+            res[-1] = merged
+        else:
+            res.append(hq)
+
+    return res
+
+
+def _merge_pair(a: HarpQuery, b: HarpQuery) -> HarpQuery:
+    """
+    Request of the product of the days, times of day and variables of a and b
+    """
+
+    days  = sorted(set(a.extra.get("days", [a.extra["day"]])) | set(b.extra.get("days", [b.extra["day"]])))
+    times = sorted({t.time() for t in a.timesteps + b.timesteps})
+
+    merged = HarpQuery.from_dict(a.to_dict())
+    merged.variables = a.variables + [v for v in b.variables if v not in a.variables]
+    merged.timesteps = [datetime.combine(d, t) for d in days for t in times]
+    merged.offline   = a.offline or b.offline
+    merged.extra["day"]  = days[0]
+    merged.extra["days"] = days
+
+    return merged
+
+
+def _split(hq: HarpQuery, cost: CostModel) -> list[HarpQuery]:
+    """
+    Splits a request above the fields limit per variable, then in halves of its days (or timesteps)
+    """
+
+    if cost.get_fields(hq) <= cost.max_fields:
+        return [hq]
+
+    if len(hq.variables) > 1:
+        half = len(hq.variables) // 2
+        parts = [hq.variables[:half], hq.variables[half:]]
+        return [r for variables in parts for r in _split(_copy(hq, variables=variables), cost)]
+
+    days = hq.extra.get("days")
+    if days is not None and len(days) > 1:
+        half = len(days) // 2
+        res = []
+        for part in [days[:half], days[half:]]:
+            sub = _copy(hq, timesteps=[t for t in hq.timesteps if t.date() in part])
+            sub.extra["day"], sub.extra["days"] = part[0], part
+            res += _split(sub, cost)
+        return res
+
+    if len(hq.timesteps) > 1:
+        half = len(hq.timesteps) // 2
+        return [r for timesteps in [hq.timesteps[:half], hq.timesteps[half:]] for r in _split(_copy(hq, timesteps=timesteps), cost)]
+
+    return [hq] # a single field per level: cannot be split further
+
+
+def _copy(hq: HarpQuery, variables: list[str] = None, timesteps: list[datetime] = None) -> HarpQuery:
+
+    res = HarpQuery.from_dict(hq.to_dict())
+    if variables is not None: res.variables = variables
+    if timesteps is not None: res.timesteps = timesteps
+
+    return res
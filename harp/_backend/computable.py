@@ -1,16 +1,50 @@
 from typing import Callable
+import hashlib
+
+from core import log
 
 
 class Computable:
     """
     Computable Variables Utility
-    
+
     Defines a class for representing computable variables that can be derived from
     existing datasets using provided functions and operands (variables).
-    """    
-    
+    Operands can be raw variables, other computables of the provider variables (by name) or Computable objects
+    (available to func as ds[operand.func.__name__]), shared computables are evaluated once.
+
+    If persist is True, the computed variable is stored in the cache as its own atomic slices,
+    keyed by the function identity (module, name) and version: later calls read it directly, without the operands.
+    The version has to be changed when the function is modified.
+    """
+
     # @interface
-    def __init__(self, func: Callable, operands: list[str], keep_operands=False):
+    def __init__(self, func: Callable, operands: list[str], keep_operands=False, persist=False, version: str = None):
         self.func = func
         self.operands = operands
-        self.keep_operands = keep_operands
\ No newline at end of file
+        self.keep_operands = keep_operands
+        self.persist = persist
+        self.version = version
+
+        if persist and func.__name__ == "<lambda>":
+            log.error("Persisted computables require a named function (lambdas cannot be identified between sessions)", e=ValueError)
+
+
+    def get_storage_name(self, resolve: Callable = None) -> str:
+        """
+        Returns the variable name under which the computed variable is stored
+        resolve: returns the Computable named by an operand (None for a raw variable), the computables
+        operands contribute their own storage name (a change of their function version changes this name)
+        """
+
+        def _name(op):
+            if not isinstance(op, Computable) and resolve is not None:
+                op = resolve(op) or op
+            return op.get_storage_name(resolve) if isinstance(op, Computable) else op
+
+        operands = sorted(_name(op) for op in self.operands)
+        identity = f"{self.func.__module__}.{self.func.__qualname__}:{self.version}:{operands}"
+
+        h = hashlib.blake2b(identity.encode("utf-8"), digest_size=6).hexdigest()
+
+        return f"computed-{self.func.__name__}-{h}"
@@ -0,0 +1,69 @@
+from datetime import datetime
+from pathlib import Path
+import json
+
+from harp._backend.harp_query import HarpAtomicStorageUnit
+
+
+class ForecastIndex:
+    """
+    Index of the cached forecast atomic slices: reference times available per (variable, area, levels) and valid time
+
+    Stored as an append only JSON lines file, shared by all the processes using the same cache directory.
+    Records appended by other processes are loaded incrementally on lookup.
+    The index may reference slices which have been removed since, callers must check their existence.
+    """
+
+    def __init__(self, filepath: Path):
+        self.filepath = Path(filepath)
+
+        self._refs   = {} # key -> valid time -> set of ref times
+        self._offset = 0  # bytes of the index file already loaded
+
+
+    def add(self, units: list[HarpAtomicStorageUnit]):
+
+        lines = [json.dumps(dict(
+                key      = self._key(u.variable, u.area, u.levels),
+                time     = u.time.isoformat(),
+                ref_time = u.ref_time.isoformat(),
+            )) + "\n" for u in units if u.ref_time is not None]
+
+        if not lines: return
+
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.filepath, "a") as f: # single write, appends from concurrent processes are not interleaved
+            f.write("".join(lines))
+
+
+    def get_ref_times(self, variable: str, time: datetime, area: list = None, levels: list = None) -> list[datetime]:
+        """
+        Returns the sorted reference times of the cached slices of variable at valid time
+        """
+
+        self._load()
+
+        refs = self._refs.get(self._key(variable, area, levels), {})
+
+        return sorted(refs.get(time, set()))
+
+
+    def _load(self):
+
+        if not self.filepath.is_file(): return
+
+        with open(self.filepath, "rb") as f:
+            f.seek(self._offset)
+
+            for line in f:
+                if not line.endswith(b"\n"): break # being written
+                self._offset += len(line)
+
+                r = json.loads(line)
+                refs = self._refs.setdefault(r["key"], {})
+                refs.setdefault(datetime.fromisoformat(r["time"]), set()).add(datetime.fromisoformat(r["ref_time"]))
+
+
+    def _key(self, variable: str, area: list, levels: list) -> str:
+        levels = None if levels is None else sorted(levels)
+        return json.dumps([variable, area, levels])
@@ -0,0 +1,121 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+
+from core import log
+
+
+def get_many(
+        requests: list|dict,
+        time: datetime,
+        area: list = None,
+        *,
+        config: dict = {},
+        **kwargs,
+    ) -> dict:
+    """
+    Get datasets from several providers at once, for the same time and area
+    Remote requests of providers hosted on different servers are executed concurrently,
+    requests to the same host are kept sequential (they share the same server queue)
+
+    Args:
+        requests (list | dict): list of (provider, variables) or (provider, variables, get_kwargs) tuples
+            provider can either be a dataset provider class or an already instantiated provider (variables=None)
+            if a dict is provided, its keys are used as keys of the returned dict
+        time (datetime): single datetime of query
+        area (list, optional): [N, W, S, E] bounding box of query. Defaults to None (global).
+        config (dict, optional): config passed to the providers instantiated by get_many
+        **kwargs: additional keyword arguments passed to every provider get call (ex: offline=True)
+
+    Returns:
+        dict of xr.Dataset, keyed by "collection.DatasetName" (or by the provided keys)
+
+    Example:
+        dss = harp.get_many([
+            (ERA5.GlobalReanalysis,   ["u10", "v10"]),
+            (CAMS.GlobalReanalysis,   {"aod": "aod550"}),
+            (MERRA2.M2T1NXAER,        ["TOTEXTTAU"]),
+        ], time=datetime(2020, 1, 1, 12), area=[60, -10, 35, 30])
+    """
+
+    entries = _plan(requests, config)
+
+    # group by host: one sequential queue per remote server
+    queues = {}
+    for key, entry in entries.items():
+        host = _get_host(entry["provider"])
+        if host not in queues: queues[host] = []
+        queues[host].append(key)
+
+    def _run_queue(keys):
+        res = {}
+        for key in keys:
+            provider   = entries[key]["provider"]
+            get_kwargs = kwargs | entries[key]["kwargs"]
+
+            log.debug(f"get_many: querying {key}")
+            res[key] = provider.get(time=time, area=area, **get_kwargs)
+        return res
+
+    log.info(f"Querying {len(entries)} dataset(s) from {len(queues)} host(s)")
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(queues) or 1) as pool:
+        futures = [pool.submit(_run_queue, keys) for keys in queues.values()]
+        for f in futures:
+            results.update(f.result()) # re-raise exceptions from the worker threads
+
+    return {key: results[key] for key in entries} # keep requests order
+
+
+def _plan(requests: list|dict, config: dict) -> dict:
+    """
+    Instantiate every provider (and check their variables) before any download starts
+    Returns a dict: key -> {"provider": provider_instance, "kwargs": get_kwargs}
+    """
+
+    if isinstance(requests, dict):
+        items = list(requests.items())
+    else:
+        items = [(None, r) for r in requests]
+
+    entries = {}
+    for key, request in items:
+
+        if not isinstance(request, (list, tuple)) or len(request) not in [2, 3]:
+            log.error(f"get_many: invalid request {request}, expected (provider, variables) or (provider, variables, kwargs)", e=ValueError)
+
+        provider, variables = request[0], request[1]
+        get_kwargs = request[2] if len(request) == 3 else {}
+
+        if isinstance(provider, type): # provider class -> instantiate
+            provider = provider(variables=variables, config=config)
+        elif variables is not None:
+            log.error(f"get_many: variables must be None when passing an instantiated provider ({provider.__class__.__name__})", e=ValueError)
+
+        if key is None:
+            key = f"{provider.collection}.{provider.__class__.__name__}"
+
+        if key in entries:
+            log.error(f"get_many: duplicate request key '{key}', use a dict of requests to name them explicitly", e=KeyError)
+
+        # check that every raw variable exist in the dataset provider nomenclature
+        for v in provider.variables.values():
+            if isinstance(v, str):
+                provider.nomenclature.translate_to_query_name(v)
+
+        entries[key] = dict(provider=provider, kwargs=get_kwargs)
+
+    return entries
+
+
+def _get_host(provider) -> str:
+    """
+    Returns the remote server of the provider, used to group requests sharing a queue
+    """
+
+    url = getattr(provider, "url", None)
+    if url:
+        return urlparse(url).netloc
+
+    return getattr(provider, "host", None) or provider.__class__.__name__
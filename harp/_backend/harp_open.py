@@ -0,0 +1,320 @@
+from collections import Counter, OrderedDict
+from contextlib import nullcontext
+from pathlib import Path
+import threading
+
+import netCDF4
+import numpy as np
+import xarray as xr
+from xarray.backends.locks import HDF5_LOCK
+import dask
+import dask.array as da
+
+from core import log
+
+from harp._backend import harp_std, write_behind
+from harp._backend.harp_query import HarpAtomicStorageUnit
+
+
+class SliceTemplate:
+    """
+    Layout of the atomic slices of a variable (stored by HARP with the same grid, for a given area and levels):
+    dims, shape and dtype of the variable, its attributes and its coordinates except time
+    """
+
+    def __init__(self, filepath: Path, variable: str, ds: xr.Dataset = None):
+        """
+        ds: the slice in memory (ex: not written yet), read from filepath if None
+        """
+
+        # xarray takes the process wide HDF5 lock (shared with read_slice and the writes) around each file access
+        with (xr.open_dataset(filepath, engine="netcdf4", lock=HDF5_LOCK) if ds is None else nullcontext(ds)) as ds:
+            da_ = ds[variable]
+
+            self.dims   = da_.dims
+            self.shape  = da_.shape
+            self.dtype  = da_.dtype
+            self.attrs  = dict(da_.attrs)
+            self.ds_attrs = dict(ds.attrs)
+
+            # minimal coords: coordinates along time (if any) are not kept, they would require reading each file
+            self.coords = {k: c.variable.load() for k, c in da_.coords.items() if harp_std.time_name not in c.dims}
+
+        if harp_std.time_name not in self.dims or self.shape[self.dims.index(harp_std.time_name)] != 1:
+            log.error(f"{filepath} is not an atomic slice (single {harp_std.time_name} step expected)", e=ValueError)
+
+    def get_window(self, area: list = None) -> tuple[slice]:
+        """
+        Returns the index slices (one per dim) of the grid points inside area [N, W, S, E], bounds included
+        """
+
+        window = [slice(None)] * len(self.dims)
+        if area is None:
+            return tuple(window)
+
+        north, west, south, east = area
+        bounds = {harp_std.lat_name: (south, north), harp_std.lon_name: (west, east)}
+
+        for name, (lo, hi) in bounds.items():
+            values = self.coords[name].values
+            inside = np.flatnonzero((values >= lo - 1e-6) & (values <= hi + 1e-6)) # grids are regular and sorted: contiguous
+
+            if len(inside) == 0:
+                log.error(f"Area {area} does not intersect the stored {name} range [{values.min()}, {values.max()}]", e=ValueError)
+
+            window[self.dims.index(name)] = slice(inside[0], inside[-1] + 1)
+
+        return tuple(window)
+
+
+_templates = OrderedDict() # (dataset folder, variable, area, levels, storage version) -> (SliceTemplate, source file, identity)
+_templates_lock = threading.Lock()
+max_templates = 256 # least recently used templates are dropped above
+
+
+def get_template(filepath: Path, variable: str, area: list = None, levels: list = None, ds: xr.Dataset = None) -> SliceTemplate:
+    """
+    Returns the template of the slices of variable, read once from filepath (or ds) then shared by the next calls
+    A template read from a file which changed since (ex: stored again by another process) is read again
+    """
+
+    key = _template_key(filepath, variable, area, levels)
+
+    with _templates_lock:
+        entry = _templates.get(key)
+        if entry is not None:
+            _templates.move_to_end(key)
+
+    if entry is not None:
+        template, source, identity = entry
+        if identity is None or _file_identity(source) == identity or (ds is None and not filepath.is_file()):
+            return template
+
+    template = SliceTemplate(filepath, variable, ds=ds)
+    identity = None if ds is not None else _file_identity(filepath) # read from memory: kept until dropped (drop_templates)
+
+    with _templates_lock:
+        _templates[key] = (template, filepath, identity)
+        _templates.move_to_end(key)
+        while len(_templates) > max_templates:
+            _templates.popitem(last=False)
+
+    return template
+
+
+def drop_templates(filepath: Path, variables: list[str]):
+    """
+    Drops the templates of the variables of the dataset of filepath (ex: one of its slices is stored again)
+    """
+
+    folder = _template_key(filepath, None)[0]
+
+    with _templates_lock:
+        for key in [k for k in _templates if k[0] == folder and k[1] in variables]:
+            del _templates[key]
+
+
+def _template_key(filepath: Path, variable: str, area: list = None, levels: list = None) -> tuple:
+    return (
+        str(filepath.parent.parent.parent.parent), # dataset folder (slices are stored under <dataset>/%Y/%m/%d)
+        variable,
+        None if area is None else tuple(area),
+        None if levels is None else tuple(levels),
+        HarpAtomicStorageUnit.storage_version,
+    )
+
+
+def open_atomic_slices(units: list[HarpAtomicStorageUnit], files: list[Path], area: list = None) -> xr.Dataset:
+    """
+    Opens atomic slices written by HARP as a single dataset (ex: as xr.open_mfdataset, but without opening each file)
+
+    The layout of each variable is read once from one of its slices (SliceTemplate), times come from the storage units,
+    the data of each file is read lazily (dask), when the dataset is computed
+
+    area: [N, W, S, E] window to read from global slices (only the chunks of the files intersecting it are read)
+    """
+
+    per_variable = {}
+    for unit, filepath in zip(units, files):
+        per_variable.setdefault(unit.variable, {})[unit.time] = filepath # a timestep is stored once per variable
+
+    data_vars = {}
+    ds_attrs = {}
+    for variable, slices in per_variable.items():
+
+        times = sorted(slices)
+        template = get_template(slices[times[0]], variable, area=units[0].area, levels=units[0].levels)
+
+        window = template.get_window(area)
+        shape  = tuple(len(range(n)[w]) for n, w in zip(template.shape, window))
+
+        axis = template.dims.index(harp_std.time_name)
+        arrays = [
+            da.from_delayed(_read(slices[t], variable, window, shape, template.dtype), shape=shape, dtype=template.dtype)
+            for t in times
+        ]
+
+        data = da.concatenate(arrays, axis=axis) if len(arrays) > 1 else arrays[0]
+        coords = {k: c.isel({d: window[template.dims.index(d)] for d in c.dims if d in template.dims}) for k, c in template.coords.items()}
+        coords[harp_std.time_name] = np.array(times, dtype="datetime64[ns]")
+
+        data_vars[variable] = xr.DataArray(data, dims=template.dims, coords=coords, attrs=template.attrs)
+        ds_attrs = ds_attrs or template.ds_attrs
+
+    ds = xr.Dataset(data_vars)
+    ds.attrs = ds_attrs
+
+    return ds
+
+
+class SliceCache:
+    """
+    In-process LRU cache of the decoded atomic slices, bounded by bytes (process wide, shared by the providers)
+    Consecutive queries of neighboring times share their bracketing slices, which are then read from memory
+    The entries are keyed by the identity of the file on disk (mtime, size): a slice stored again is read again
+    """
+
+    def __init__(self, max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict() # (filepath, identity, window) -> values, least recently used first
+        self._whole = Counter()       # (filepath, identity) -> number of entries of the whole slice (0 or 1)
+        self._lock = threading.Lock()
+
+    def resize(self, max_bytes: int):
+        with self._lock:
+            self.max_bytes = int(max_bytes or 0)
+            self._evict()
+
+    def get(self, filepath: Path, window: tuple[slice], copy: bool = True) -> np.ndarray:
+        """
+        Returns the cached values (None if missing, or if the file changed since they were read)
+        copy: return a copy which may be modified in place, else the read only cached array
+        """
+
+        identity = _file_identity(filepath)
+        if identity is None:
+            return None
+
+        key = (str(filepath), identity, _window_key(window))
+
+        with self._lock:
+            values = self._entries.get(key)
+            if values is None:
+                return None
+            self._entries.move_to_end(key)
+
+        return values.copy() if copy else values
+
+    def put(self, filepath: Path, window: tuple[slice], values: np.ndarray, identity: tuple = None) -> np.ndarray:
+        """
+        Caches a read only copy of values, returns it (None if larger than the cache)
+        identity: of the file the values were read from (see _file_identity), current one if None
+        """
+
+        if values.nbytes > self.max_bytes:
+            return None
+
+        identity = identity or _file_identity(filepath)
+        if identity is None:
+            return None
+
+        key = (str(filepath), identity, _window_key(window))
+
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key]
+
+            values = values.copy()
+            values.flags.writeable = False
+
+            self._entries[key] = values
+            if _is_whole(key[2]):
+                self._whole[key[:2]] += 1
+            self.nbytes += values.nbytes
+            self._evict()
+
+        return values
+
+    def has_slice(self, filepath: Path) -> bool:
+        """
+        Whether the whole slice of filepath (the window read without area) is cached, for the file currently on disk
+        """
+
+        identity = _file_identity(filepath)
+
+        return identity is not None and self._whole[(str(filepath), identity)] > 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._whole.clear()
+            self.nbytes = 0
+
+    def _evict(self):
+        while self._entries and self.nbytes > self.max_bytes:
+            key, values = self._entries.popitem(last=False)
+            self.nbytes -= values.nbytes
+            if _is_whole(key[2]):
+                self._whole[key[:2]] -= 1
+                if self._whole[key[:2]] == 0:
+                    del self._whole[key[:2]]
+
+
+slice_cache = SliceCache() # sized by the providers config (slice_cache_size)
+
+
+def _window_key(window: tuple[slice]) -> tuple:
+    return tuple((w.start, w.stop) for w in window) # slices are not hashable before python 3.12
+
+
+def _is_whole(window_key: tuple) -> bool:
+    return all(w == (None, None) for w in window_key)
+
+
+def _file_identity(filepath: Path) -> tuple:
+    """
+    Returns (mtime, size) of filepath, which change when the slice is stored again (None if the file does not exist)
+    """
+    try:
+        st = Path(filepath).stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+_lock = HDF5_LOCK # the netCDF4/HDF5 libraries are not thread safe: same lock as the xarray reads and writes
+
+def read_slice(filepath: Path, variable: str, window: tuple[slice], shape: tuple, dtype: np.dtype, copy: bool = True) -> np.ndarray:
+    """
+    Reads the window of the variable of a slice with netCDF4 (masking and scaling as the CF decoding of xarray)
+    The values are read from the slice cache if present
+    copy: if False, cached values are returned as read only arrays (no copy)
+    """
+
+    values = write_behind.get_pending(filepath) # downloaded, not written yet
+    if values is not None:
+        return values[window].copy() if copy else values[window]
+
+    values = slice_cache.get(filepath, window, copy=copy)
+    if values is not None:
+        return values
+
+    identity = _file_identity(filepath) # before the read: a slice replaced meanwhile is not cached as the new one
+    with _lock, netCDF4.Dataset(filepath, "r") as nc:
+        values = nc.variables[variable][window]
+
+    if np.ma.isMaskedArray(values):
+        values = values.astype(dtype).filled(np.nan) if np.issubdtype(dtype, np.floating) else values.data
+
+    values = np.asarray(values, dtype=dtype)
+
+    if values.shape != shape: # not written with the template grid
+        raise ValueError(f"Unexpected shape {values.shape} in {filepath}, expected {shape}")
+
+    cached = slice_cache.put(filepath, window, values, identity=identity) if identity is not None else None
+
+    return values if copy or cached is None else cached
+
+
+_read = dask.delayed(read_slice, pure=True)
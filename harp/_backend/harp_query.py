@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from pathlib import Path
 from core import log
 import hashlib
@@ -6,7 +6,7 @@ import hashlib
 
 class HarpAtomicStorageUnit:
     
-    storage_version = "v03"
+    storage_version = "v04" # v04: slices are stored standardized (centered longitudes, harp dims names)
     
     def __init__(self, *,
         variable: str, 
@@ -79,7 +79,7 @@ class HarpQuery:
             time (datetime): single datetime of query
             timesteps (list[datetime] | datetime): list of the timesteps to encompassing the query
             offline (bool, optional): if True, do not attempt to download missing data. Defaults to False.
-            area (list, optional): [N, W, S, E] bounding box of query. Defaults to None (global).
+            area (list, optional): [N, W, S, E] bounding box of query, W > E if it crosses the antimeridian. Defaults to None (global).
             levels (list[int], optional): list of pressure levels to query. Defaults to None.
             ref_time (datetime, optional): reference time for forecast datasets.
         """
@@ -94,7 +94,7 @@ class HarpQuery:
         
         if area is not None:
             assert len(area) == 4, "Invalid area definition, expected [N, W, S, E]"
-            assert area[0] > area[2] and area[1] < area[3], "Invalid area definition, expected [N, W, S, E]"
+            assert area[0] > area[2] and area[1] != area[3], "Invalid area definition, expected [N, W, S, E]" # W > E: crosses the antimeridian
         
         # assert type(self.time) == datetime
         if self.time is not None:
@@ -119,6 +119,41 @@ class HarpQuery:
             ref_time    = self.ref_time,
         )
     
+    def to_dict(self) -> dict:
+        """
+        Returns a JSON serializable representation of the query (used to send queries between processes)
+        """
+        
+        return dict(
+            variables   = self.variables,
+            time        = _encode(self.time),
+            timesteps   = _encode(self.timesteps),
+            offline     = self.offline,
+            area        = self.area,
+            levels      = self.levels,
+            ref_time    = _encode(self.ref_time),
+            extra       = _encode(self.extra),
+        )
+    
+    @classmethod
+    def from_dict(cls, d: dict) -> "HarpQuery":
+        """
+        Inverse of HarpQuery.to_dict
+        """
+        
+        hq = cls(
+            variables   = d["variables"],
+            time        = _decode(d["time"]),
+            timesteps   = _decode(d["timesteps"]),
+            offline     = d["offline"],
+            area        = d["area"],
+            levels      = d["levels"],
+            ref_time    = _decode(d["ref_time"]),
+        )
+        hq.extra = _decode(d["extra"])
+        
+        return hq
+    
     def get_atomic_storage_units(self) -> list[HarpAtomicStorageUnit]:
         """
         Return the decomposition of the query on atomic slice storage units
@@ -142,4 +177,30 @@ class HarpQuery:
         s += "ref_time: " +  str(self.ref_time) + "; "
         s += "}END"
         
-        return s
\ No newline at end of file
+        return s
+
+
+def _encode(value):
+    """
+    Recursively converts datetimes, dates and timedeltas to tagged JSON compatible dicts
+    """
+    if isinstance(value, datetime):  return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):      return {"__date__": value.isoformat()}
+    if isinstance(value, timedelta): return {"__timedelta__": value.total_seconds()}
+    if isinstance(value, dict):      return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)): return [_encode(v) for v in value]
+    if hasattr(value, "tolist"):     return _encode(value.tolist()) # numpy arrays and scalars
+    return value
+
+
+def _decode(value):
+    """
+    Inverse of _encode
+    """
+    if isinstance(value, dict):
+        if "__datetime__" in value:  return datetime.fromisoformat(value["__datetime__"])
+        if "__date__" in value:      return date.fromisoformat(value["__date__"])
+        if "__timedelta__" in value: return timedelta(seconds=value["__timedelta__"])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):      return [_decode(v) for v in value]
+    return value
@@ -3,8 +3,11 @@
 
 # third party imports
 from typing import Literal
+import numpy as np
 import xarray as xr
 
+from core import log
+
 # sub package imports
 
 time_name = "time"
@@ -32,3 +35,51 @@ def center_longitude(ds: xr.Dataset, center:Literal[0, 180]=0):
     ds = ds.sortby(lon_name)
     
     return ds
+
+
+def split_area(area: list) -> list[list]:
+    """
+    Splits an area [N, W, S, E] crossing the seam of the stored longitudes (longitude_center +- 180)
+    in two areas on each side of it, the areas which do not cross it are returned as is
+    W > E areas cross the seam (ex: [65, 160, 50, -150] in the Pacific)
+    """
+    
+    north, west, south, east = area
+    lo, hi = longitude_center - 180, longitude_center + 180
+    
+    if west <= east and lo <= west and east <= hi:
+        return [area]
+    
+    if east < west:
+        east += 360
+    
+    if east - west >= 360:
+        return [[north, lo, south, hi]]
+    
+    wrap = lambda x: (x - lo) % 360 + lo
+    west, east = wrap(west), (wrap(east) if east != hi else hi)
+    
+    if west <= east:
+        return [[north, west, south, east]] # only outside of the stored range (ex: 0 -> 360 longitudes)
+    
+    return [[north, west, south, hi], [north, lo, south, east]]
+
+
+def stitch_longitudes(west: xr.Dataset, east: xr.Dataset, area: list) -> xr.Dataset:
+    """
+    Stitches the 2 parts of an area split by split_area into a continuous (increasing) longitude axis:
+    the longitudes of the east part are shifted by 360 (ex: 170 -> 179.75, then 180 -> 190)
+    """
+    
+    west_bound = split_area(area)[0][1]
+    
+    west = west.isel({lon_name: west[lon_name].values >= west_bound - 1e-6}) # the seam is part of the east side
+    east = east.assign_coords({lon_name: east[lon_name].values + 360})
+    
+    ds = xr.concat([west, east], dim=lon_name, data_vars="minimal", coords="minimal", compat="override", join="override")
+    
+    if not np.all(np.diff(ds[lon_name].values) > 0):
+        log.error(f"Could not stitch a continuous longitude axis for {area}", e=ValueError)
+    
+    return ds
+
@@ -4,7 +4,6 @@ import warnings
 from datetime import date, datetime, timedelta
 from pathlib import Path
 
-from pydap.cas.urs import setup_session
 from core import auth, log
 import xarray as xr
 import requests
@@ -51,15 +50,11 @@ class Merra2HourlyDatasetProvider(BaseDatasetProvider):
         
 
     # @interface
-    def download(self, hq: HarpQuery) -> list[Path]:
+    def _download_subqueries(self, subqueries: list[HarpQuery]):
         """
         variables are expected to be raw
         """
         
-            
-        subqueries: list[HarpQuery] = self._decompose_into_subqueries(hq)
-        subqueries: list[HarpQuery] = self._filter_cached_variables_from_queries(subqueries)
-        
         for hqs in subqueries:
 
             lock: ComputeLock = self._get_hashed_query_lock(hqs)
@@ -71,9 +66,9 @@ class Merra2HourlyDatasetProvider(BaseDatasetProvider):
                 if hqs == None: continue # all files present locally
             
             with lock.locked(): # lock query and make query download
-                if hq.offline or self.config.get("offline"):
+                if hqs.offline or self.config.get("offline"):
                     log.error(f"Offline mode is activated and data is missing locally [\
-                        {', '.join(hqs.variables)}] for {hq.timesteps}",
+                        {', '.join(hqs.variables)}] for {hqs.timesteps}",
                         e=FileNotFoundError)
                 
                 self.auth = auth.get_auth(self.host)  # credentials from netrc file
@@ -91,9 +86,6 @@ class Merra2HourlyDatasetProvider(BaseDatasetProvider):
                 
                 # split and store per variable, per timestep
                 self._split_and_store_atomic(ds, hqs)
-            
-        files = self._get_query_files(hq)
-        return files
     
     
     
@@ -115,6 +107,8 @@ class Merra2HourlyDatasetProvider(BaseDatasetProvider):
             if r2.status_code == 200:
                 url = url_bis
         
+        from pydap.cas.urs import setup_session # slow to import, only needed to download
+
         # Download file
         session = requests.Session()
         session = setup_session(self.auth['user'], self.auth['password'], check_url=url)
@@ -3,7 +3,6 @@ from pathlib import Path
 import json
 import warnings
 
-from pydap.cas.urs import setup_session
 import xarray as xr
 from core import log
 from core.static import interface
@@ -31,7 +30,6 @@ class Merra2MeanDatasetProvider(BaseDatasetProvider):
     institution = "NASA"
     
     host = 'urs.earthdata.nasa.gov' # server to download from
-    auth = auth.get_auth(host)  # credentials from netrc file
     
     
     def __init__(self, collection: str, name: str, **kwargs):
@@ -74,6 +72,7 @@ class Merra2MeanDatasetProvider(BaseDatasetProvider):
             if offline:
                 log.error(f"Offline mode is activated and data is missing locally [{', '.join(query)}] for {time.strftime('%Y-%m-%d')}",
                     e=FileNotFoundError)
+            self.auth = auth.get_auth(self.host)  # credentials from netrc file
             log.info(f"Querying {self.name} for variables {', '.join(query)} on {time}")
             ds = self._retrieve_day(query, time, area)
             retrieved = self._post_process_download(ds, query, time)
@@ -114,6 +113,8 @@ class Merra2MeanDatasetProvider(BaseDatasetProvider):
             if r2.status_code == 200:
                 url = url_bis
         
+        from pydap.cas.urs import setup_session # slow to import, only needed to download
+
         # Download file
         session = requests.Session()
         session = setup_session(self.auth['user'], self.auth['password'], check_url=url)
@@ -0,0 +1 @@
+from .opendata_dataset_provider import OpenDataDatasetProvider
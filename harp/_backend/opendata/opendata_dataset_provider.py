@@ -0,0 +1,323 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import json
+
+from core import log
+from core.static import abstract
+import xarray as xr
+import requests
+
+from harp._backend._utils.HarpErrors import InvalidQueryError
+from harp._backend._utils import ComputeLock
+from harp._backend.harp_query import HarpQuery, HarpAtomicStorageUnit
+from harp._backend.timespec import RegularTimespec
+from harp._backend.baseprovider import BaseDatasetProvider
+from harp._backend.nomenclature import Nomenclature
+from harp._backend import harp_std
+from harp.datasets.IFS import opendata_availability
+
+
+@abstract
+class OpenDataDatasetProvider(BaseDatasetProvider):
+    """
+    ECMWF open data forecasts (data.ecmwf.int/forecasts)
+
+    Each GRIB2 file (one per run and leadtime) comes with an .index sidecar listing the byte range of every message,
+    only the messages of the requested variables (and levels) are downloaded, with HTTP range requests
+    """
+
+    url = "https://data.ecmwf.int/forecasts/"
+    keywords = ["ECMWF", "open data"]
+    institution = "ECMWF"
+    collection = "Undefined"
+
+    name = "dataset-query-name"
+
+    model       = "aifs-single" # open data directories: <run>/<model>/<resolution>/<stream>/
+    resolution  = "0p25"
+    stream      = "oper"
+    type        = "fc"
+    levtype     = "sfc" # "pl" for pressure levels datasets, every non pressure level message otherwise
+
+    timespecs     = RegularTimespec(timedelta(seconds=0), 4) # 6 hourly leadtimes
+    timespecs_ref = RegularTimespec(timedelta(seconds=0), 4) # 00z, 06z, 12z, 18z runs
+    max_leadtime  = 360
+
+    max_workers = 4 # leadtimes downloaded concurrently
+
+
+    def __init__(self, *, csv_files: list[Path], variables: dict[str: str], config: dict={}):
+
+        super().__init__(variables=variables, config=config)
+        self.nomenclature = Nomenclature(
+            csv_files,
+            context=self.name,
+            query_col="query_name", # index param name
+            harp_col="short_name",  # variable name once decoded
+        )
+
+
+    def _decompose_into_subqueries(self, hq: HarpQuery) -> list[HarpQuery]:
+        """
+        Decompose the query in one query per run,
+        each timestep is taken from the latest published run (or from hq.ref_time if set)
+        """
+
+        ref_times = {}
+        for timestep, ref in self._resolve_ref_times(hq):
+            if not ref in ref_times: ref_times[ref] = []
+            ref_times[ref] += [timestep]
+
+        queries = []
+        for rt, timesteps in ref_times.items(): # format one query per ref time
+
+            hqs = HarpQuery(
+                variables   = hq.variables,
+                timesteps   = timesteps,
+                area        = hq.area,
+                levels      = hq.levels,
+                offline     = hq.offline,
+                ref_time    = rt,
+            )
+            hqs.extra["day"] = date(rt.year, rt.month, rt.day)
+
+            queries.append(hqs)
+
+        return queries
+
+
+    def _resolve_ref_times(self, hq: HarpQuery) -> list[tuple[datetime, datetime]]:
+        """
+        Returns the (timestep, ref time) pairs of the query: each timestep is taken from the latest published run
+        (or from hq.ref_time if set). The resolution is kept in hq.extra, so that the units opened after the download
+        are the downloaded ones, even if a new run is published in the meantime
+        """
+
+        if "ref_times" in hq.extra:
+            return [tuple(pair) for pair in hq.extra["ref_times"]]
+
+        timesteps = hq.timesteps if hq.time is None else list(self.timespecs.get_encompassing_timesteps(hq.time))
+        runs = opendata_availability.get_catalog(self.config.get("dir_storage"), url=self.url).get_available_times()
+
+        if hq.ref_time is not None and hq.ref_time not in runs:
+            raise InvalidQueryError(f"Forecast run {hq.ref_time} is not available on {self.url}")
+
+        pairs = []
+        for timestep in timesteps:
+
+            if hq.ref_time is not None:
+                ref = hq.ref_time
+            else:
+                previous = [r for r in runs if r <= timestep]
+                if not previous:
+                    raise InvalidQueryError(f"No {self.name} forecast run available on {self.url} for {timestep}")
+                ref = max(previous)
+
+            req_lead = timestep - ref
+
+            if not timedelta(0) <= req_lead <= timedelta(hours=self.max_leadtime):
+                raise InvalidQueryError("Querying outside of Forecast range "
+                    + f"\n\tavailable: {ref} + {self.max_leadtime}h max"
+                    + f"\n\trequested: {ref} + {req_lead.total_seconds() / 3600}h"
+                )
+
+            pairs.append((timestep, ref))
+
+        hq.extra["ref_times"] = [list(pair) for pair in pairs]
+
+        return pairs
+
+
+    def _get_query_units(self, hq: HarpQuery) -> list[HarpAtomicStorageUnit]:
+        """
+        From the query object, returns all expected atomic slices (stored per ref time, resolved once per query)
+        """
+
+        units = []
+        for hqs in self._decompose_into_subqueries(hq):
+            units += self._get_storage_units(hqs)
+
+        return units
+
+
+    def _download_subqueries(self, subqueries: list[HarpQuery]):
+
+        for hqs in subqueries:
+
+            lock: ComputeLock = self._get_hashed_query_lock(hqs)
+
+            if lock.is_locked(): # query is currently already being executed by someone in the same HARP CACHE DIR tree
+                lock.wait()
+
+                hqs = self._filter_cached_variables_from_query(hqs) # Check to see if all necessary files are now present
+                if hqs == None: continue # all files present locally
+
+            lock.acquire() # lock query and make query download
+
+            try:
+                if hqs.offline or self.config.get("offline"):
+                    log.error(f"Offline mode is activated and data is missing locally [{', '.join(hqs.variables)}] for {hqs.timesteps}",
+                        e=FileNotFoundError)
+
+                log.info(f"Querying {self.name} for variables {', '.join(hqs.variables)} on {hqs.timesteps}")
+
+                leadtimes = [round((t - hqs.ref_time).total_seconds() / 3600) for t in hqs.timesteps]
+
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(leadtimes))) as pool:
+                    dss = list(pool.map(lambda leadtime: self._fetch_leadtime(hqs, leadtime), leadtimes))
+
+                ds = xr.concat(dss, dim="time")
+
+                # area (list, optional): [N, W, S, E] bounding box of query. Defaults to None (global).
+                area = hqs.area
+                if area is not None:
+                    N, W, S, E = area
+                    lon = (ds.longitude + 180) % 360 - 180 # open data longitudes are in [0, 360[, areas in [-180, 180]
+                    ds = ds.where((ds.latitude <= N) & (ds.latitude >= S) & (lon >= W) & (lon <= E), drop=True)
+
+                # split and store per variable, per timestep
+                # (write_behind: in the background, the lock is released once stored)
+                self._split_and_store_atomic(ds, hqs, on_stored=lock.release)
+
+            except BaseException:
+                lock.release()
+                raise
+
+
+    def _fetch_leadtime(self, hq: HarpQuery, leadtime: int) -> xr.Dataset:
+        """
+        Downloads and decodes the messages of the query variables for one leadtime of the run hq.ref_time
+        """
+
+        url = self._get_url(hq.ref_time, leadtime)
+
+        with requests.Session() as session:
+            entries = self._select_entries(self._get_index(session, url), hq, url)
+            ranges  = merge_ranges([(e["_offset"], e["_offset"] + e["_length"]) for e in entries])
+
+            log.debug(f"Downloading {len(entries)} messages in {len(ranges)} range request(s) from {url}")
+            data = self._fetch_ranges(session, url, ranges)
+
+        return self._decode(data, time=hq.ref_time + timedelta(hours=leadtime))
+
+
+    def _get_url(self, ref_time: datetime, leadtime: int) -> str:
+
+        folder   = ref_time.strftime("%Y%m%d/%Hz/") + f"{self.model}/{self.resolution}/{self.stream}/"
+        filename = ref_time.strftime("%Y%m%d%H0000") + f"-{leadtime}h-{self.stream}-{self.type}.grib2"
+
+        return self.url + folder + filename
+
+
+    def _get_index(self, session: requests.Session, url: str) -> list[dict]:
+        """
+        Returns the entries of the .index sidecar file (one JSON object per GRIB message)
+        """
+
+        index_url = url.removesuffix(".grib2") + ".index"
+
+        r = session.get(index_url, timeout=60)
+        if r.status_code == 404:
+            raise InvalidQueryError(f"{index_url} is not available (yet)")
+        r.raise_for_status()
+
+        return [json.loads(line) for line in r.text.splitlines() if line.strip()]
+
+
+    def _select_entries(self, index: list[dict], hq: HarpQuery, url: str) -> list[dict]:
+
+        levels = None if hq.levels is None else [str(l) for l in hq.levels]
+
+        entries = []
+        for e in index:
+            if e.get("param") not in hq.variables: continue
+
+            if self.levtype == "pl":
+                if e.get("levtype") != "pl": continue
+                if levels is not None and e.get("levelist") not in levels: continue
+
+            elif e.get("levtype") == "pl": continue
+
+            entries.append(e)
+
+        for v in hq.variables:
+            found = [e for e in entries if e["param"] == v]
+
+            if not found or (levels is not None and len(found) < len(levels)):
+                raise InvalidQueryError(f"Could not find {v} (levels: {levels}) in {url}")
+
+        return entries
+
+
+    def _fetch_ranges(self, session: requests.Session, url: str, ranges: list[tuple[int, int]]) -> bytes:
+        """
+        Downloads the [start, end) byte ranges of url, concatenated
+        If the server ignores the Range header, the whole file is downloaded once and sliced for all the ranges
+        """
+
+        chunks = []
+        for start, end in ranges:
+            r = session.get(url, headers={"Range": f"bytes={start}-{end-1}"}, timeout=300)
+            r.raise_for_status()
+
+            if r.status_code != 206: # whole file
+                return b"".join(r.content[s:e] for s, e in ranges)
+
+            chunks.append(r.content)
+
+        return b"".join(chunks)
+
+
+    def _decode(self, data: bytes, time: datetime) -> xr.Dataset:
+        """
+        Decodes GRIB2 messages to a dataset with a single time (valid time)
+        """
+
+        import cfgrib # optional dependency, only required for open data providers
+
+        with TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "messages.grib2"
+            path.write_bytes(data)
+
+            dss = cfgrib.open_datasets(str(path), backend_kwargs=dict(indexpath=""))
+            dss = [self._standardize_messages(ds, time).load() for ds in dss]
+
+        return xr.merge(dss, compat="override")
+
+
+    def _standardize_messages(self, ds: xr.Dataset, time: datetime) -> xr.Dataset:
+
+        # drop the GRIB coordinates which are not dimensions (step, valid_time, surface, heightAboveGround..)
+        level_name = "isobaricInhPa"
+        ds = ds.drop_vars([c for c in ds.coords if c not in ds.dims and c != level_name])
+
+        if level_name in ds.coords:
+            if level_name not in ds.dims:
+                ds = ds.expand_dims(level_name)
+            ds = ds.rename({level_name: "pressure_level"})
+
+        return ds.expand_dims(time=[time])
+
+
+    def _standardize(self, ds, area=None):
+
+        ds = harp_std.center_longitude(ds, center=harp_std.longitude_center)
+
+        return ds
+
+
+def merge_ranges(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """
+    Merges adjacent (or overlapping) [start, end) byte ranges, to minimize the number of range requests
+    """
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return [(start, end) for start, end in merged]
@@ -0,0 +1,283 @@
+"""
+Regridding of HARP datasets on rectilinear latitude/longitude grids
+
+The weights are separable (one sparse matrix per axis), computed once per (source grid, target grid, method),
+kept in memory and cached on disk, then applied as sparse matrix products
+"""
+
+from pathlib import Path
+from typing import Literal
+import hashlib
+import os
+
+import numpy as np
+import xarray as xr
+
+from core import log
+
+from harp._backend import harp_std
+
+
+methods = ["bilinear", "conservative"]
+
+_weights = {} # key -> (lat weights, lon weights)
+
+
+class Grid:
+    """
+    Rectilinear latitude/longitude grid (cell centers, in degrees)
+    """
+
+    def __init__(self, latitude, longitude):
+        self.latitude  = np.asarray(latitude, dtype="float64")
+        self.longitude = np.asarray(longitude, dtype="float64")
+
+        if self.latitude.ndim != 1 or self.longitude.ndim != 1:
+            log.error("Only rectilinear grids (1D latitude and longitude) are supported", e=ValueError)
+
+    @classmethod
+    def from_spec(cls, spec, source: "Grid" = None) -> "Grid":
+        """
+        Builds the target grid of a get(..., target_grid=spec) call:
+            - a resolution in degrees, or a (lat, lon) resolutions tuple: regular grid over the source extent
+            - an xarray object, or a dict, with latitude and longitude coordinates
+        """
+
+        if isinstance(spec, Grid):
+            return spec
+
+        if isinstance(spec, (xr.Dataset, xr.DataArray, dict)):
+            return cls(spec[harp_std.lat_name], spec[harp_std.lon_name])
+
+        if isinstance(spec, (int, float, tuple, list)):
+            dlat, dlon = (spec, spec) if isinstance(spec, (int, float)) else spec
+
+            lat_min, lat_max = np.min(source.latitude),  np.max(source.latitude)
+            lon_min, lon_max = np.min(source.longitude), np.max(source.longitude)
+
+            lat = np.arange(np.ceil(lat_min / dlat) * dlat, lat_max + dlat / 2, dlat)
+            lon = np.arange(np.ceil(lon_min / dlon) * dlon, lon_max + dlon / 2, dlon)
+
+            if _is_global(source.longitude): # do not duplicate the first longitude (ex: -180 and 180)
+                lon = lon[lon < lon[0] + 360 - dlon / 2]
+
+            if source.latitude[0] > source.latitude[-1]: # keep the source orientation (ex: ERA5 90 -> -90)
+                lat = lat[::-1]
+
+            return cls(np.round(lat, 6), np.round(lon, 6))
+
+        log.error(f"Invalid target grid {spec!r}, expected a resolution or an object with latitude and longitude", e=TypeError)
+
+    def hash(self) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self.latitude.tobytes())
+        h.update(self.longitude.tobytes())
+        return h.hexdigest()
+
+
+def regrid(
+        ds: xr.Dataset,
+        target_grid,
+        method: Literal["bilinear", "conservative"] = "bilinear",
+        cache_dir: Path = None,
+    ) -> xr.Dataset:
+    """
+    Regrids the variables of ds which have latitude and longitude dimensions
+
+    Args:
+        ds (xr.Dataset): dataset on a rectilinear grid (harp standard dims)
+        target_grid: target resolution in degrees, (lat, lon) resolutions, or object with latitude/longitude coordinates
+        method (str): "bilinear" or "conservative" (area weighted)
+        cache_dir (Path, optional): folder where the weights are cached. Defaults to None (memory only).
+
+    Missing values (NaN) are not propagated: each target value is normalized by the weights of the valid source values
+    """
+
+    if method not in methods:
+        log.error(f"Invalid regridding method {method}, expected one of: {', '.join(methods)}", e=ValueError)
+
+    lat, lon = harp_std.lat_name, harp_std.lon_name
+
+    source = Grid(ds[lat], ds[lon])
+    target = Grid.from_spec(target_grid, source=source)
+
+    wlat, wlon = get_weights(source, target, method, cache_dir=cache_dir)
+
+    out = {}
+    for name, var in ds.data_vars.items():
+        if lat not in var.dims or lon not in var.dims:
+            out[name] = var
+            continue
+
+        out[name] = xr.apply_ufunc(
+            _apply_weights, var,
+            kwargs = dict(wlat=wlat, wlon=wlon),
+            input_core_dims  = [[lat, lon]],
+            output_core_dims = [[lat, lon]],
+            exclude_dims = {lat, lon},
+            dask = "parallelized",
+            output_dtypes = [np.result_type(var.dtype, np.float32)],
+            dask_gufunc_kwargs = dict(output_sizes={lat: len(target.latitude), lon: len(target.longitude)}),
+            keep_attrs = True,
+        )
+
+    res = xr.Dataset(out, attrs=ds.attrs)
+    res = res.assign_coords({lat: target.latitude, lon: target.longitude})
+    res[lat].attrs = ds[lat].attrs
+    res[lon].attrs = ds[lon].attrs
+
+    return res
+
+
+def get_weights(source: Grid, target: Grid, method: str, cache_dir: Path = None):
+    """
+    Returns the (latitude, longitude) sparse weights matrices of shape (target size, source size)
+    """
+
+    import scipy.sparse # optional dependency, only required to regrid
+
+    key = f"{method}_{source.hash()}_{target.hash()}"
+
+    if key in _weights:
+        return _weights[key]
+
+    path = None if cache_dir is None else Path(cache_dir) / f"{key}.npz"
+
+    if path is not None and path.is_file():
+        with np.load(path) as f:
+            wlat = scipy.sparse.csr_matrix((f["lat_data"], f["lat_indices"], f["lat_indptr"]), shape=f["lat_shape"])
+            wlon = scipy.sparse.csr_matrix((f["lon_data"], f["lon_indices"], f["lon_indptr"]), shape=f["lon_shape"])
+
+    else:
+        log.debug(f"Computing {method} regridding weights {len(source.latitude)}x{len(source.longitude)} -> {len(target.latitude)}x{len(target.longitude)}")
+
+        periodic = _is_global(source.longitude)
+
+        if method == "bilinear":
+            wlat = _linear_weights(source.latitude, target.latitude)
+            wlon = _linear_weights(source.longitude, target.longitude, period=360 if periodic else None)
+        else:
+            # cells areas on the sphere are proportional to d(sin(lat)) x d(lon)
+            wlat = _overlap_weights(source.latitude, target.latitude, transform=lambda x: np.sin(np.deg2rad(np.clip(x, -90, 90))))
+            wlon = _overlap_weights(source.longitude, target.longitude, period=360 if periodic else None)
+
+        wlat, wlon = scipy.sparse.csr_matrix(wlat), scipy.sparse.csr_matrix(wlon)
+
+        if path is not None:
+            _save(path, wlat, wlon)
+
+    _weights[key] = (wlat, wlon)
+
+    return wlat, wlon
+
+
+def _apply_weights(data: np.ndarray, wlat, wlon) -> np.ndarray:
+    """
+    Applies the separable weights on the 2 last axes of data (latitude, longitude)
+    """
+
+    *shape, nlat, nlon = data.shape
+
+    valid  = np.isfinite(data)
+    values = np.where(valid, data, 0).astype("float64")
+
+    def _product(x):
+        x = x.reshape(-1, nlat, nlon)
+        n = x.shape[0]
+
+        x = (wlon @ x.reshape(n * nlat, nlon).T).T.reshape(n, nlat, -1)                     # n, lat, target lon
+        x = (wlat @ x.transpose(1, 0, 2).reshape(nlat, -1)).reshape(-1, n, x.shape[2])    # target lat, n, target lon
+
+        return x.transpose(1, 0, 2)
+
+    num = _product(values)
+    den = _product(valid.astype("float64"))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        res = np.where(den > 1e-12, num / den, np.nan)
+
+    return res.reshape(*shape, *res.shape[1:]).astype(np.result_type(data.dtype, np.float32))
+
+
+def _is_global(lon: np.ndarray) -> bool:
+    if len(lon) < 2: return False
+    step = np.median(np.abs(np.diff(lon)))
+    return np.ptp(lon) + step >= 360 - 1e-6
+
+
+def _linear_weights(src: np.ndarray, tgt: np.ndarray, period: float = None) -> np.ndarray:
+    """
+    1D linear interpolation weights (target size x source size), rows of targets outside of the source are empty
+    """
+
+    order = np.argsort(src)
+    x = src[order]
+    idx = np.arange(len(src))[order]
+
+    t = tgt.copy()
+    if period is not None: # wrap the targets in the source range, extend the source by one period
+        t = (t - x[0]) % period + x[0]
+        x   = np.append(x, x[0] + period)
+        idx = np.append(idx, idx[0])
+
+    w = np.zeros((len(tgt), len(src)))
+
+    i = np.clip(np.searchsorted(x, t, side="right") - 1, 0, len(x) - 2)
+    x0, x1 = x[i], x[i + 1]
+
+    inside = (t >= x[0] - 1e-9) & (t <= x[-1] + 1e-9)
+    frac = np.clip((t - x0) / np.where(x1 > x0, x1 - x0, 1), 0, 1)
+
+    rows = np.flatnonzero(inside)
+    np.add.at(w, (rows, idx[i[rows]]),     1 - frac[rows])
+    np.add.at(w, (rows, idx[i[rows] + 1]), frac[rows])
+
+    return w
+
+
+def _edges(centers: np.ndarray) -> np.ndarray:
+    """
+    Cells edges of sorted cell centers (midpoints, extrapolated at the ends)
+    """
+
+    if len(centers) == 1:
+        return np.array([centers[0] - 0.5, centers[0] + 0.5])
+
+    mid = (centers[1:] + centers[:-1]) / 2
+
+    return np.concatenate([[2 * centers[0] - mid[0]], mid, [2 * centers[-1] - mid[-1]]])
+
+
+def _overlap_weights(src: np.ndarray, tgt: np.ndarray, period: float = None, transform=None) -> np.ndarray:
+    """
+    1D conservative weights: overlap of each target cell with each source cell (target size x source size)
+    transform maps the coordinates to the measure of the cells (ex: sin(latitude))
+    """
+
+    transform = transform or (lambda x: x)
+
+    src_order, tgt_order = np.argsort(src), np.argsort(tgt)
+    se, te = _edges(src[src_order]), _edges(tgt[tgt_order])
+
+    w = np.zeros((len(tgt), len(src)))
+
+    shifts = [0] if period is None else [-period, 0, period]
+    for shift in shifts:
+        lo = np.maximum(te[:-1, None], se[None, :-1] + shift)
+        hi = np.minimum(te[1:, None],  se[None, 1:] + shift)
+        overlap = np.where(hi > lo, transform(hi) - transform(lo), 0)
+        w[np.ix_(tgt_order, src_order)] += overlap
+
+    return w
+
+
+def _save(path: Path, wlat, wlon):
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+    np.savez(tmp,
+        lat_data=wlat.data, lat_indices=wlat.indices, lat_indptr=wlat.indptr, lat_shape=wlat.shape,
+        lon_data=wlon.data, lon_indices=wlon.indices, lon_indptr=wlon.indptr, lon_shape=wlon.shape,
+    )
+    os.replace(tmp, path) # atomic, concurrent readers never see a partial file
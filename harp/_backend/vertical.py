@@ -0,0 +1,240 @@
+"""
+Vertical interpolation of volumetric HARP datasets (pressure levels, altitudes, model levels)
+
+The interpolation is vectorized over all the columns at once: the vertical coordinate can vary per column
+(ex: model levels pressure, geopotential height), the bracketing levels of each target are found
+with a single comparison per column, then the variables are interpolated with a weighted sum of the 2 levels.
+Pressure coordinates are interpolated linearly in log-pressure.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from core import log
+
+
+level_name       = "pressure_level"
+model_level_name = "model_level"
+altitude_name    = "altitude"
+
+g = 9.80665 # m s-2, standard gravity (geopotential to geopotential height)
+
+
+def get_query_levels(levels: list, available: list) -> list:
+    """
+    Returns the available levels to query to interpolate on levels (the bracketing available levels of each one)
+    """
+
+    available = sorted(float(lv) for lv in available)
+    query = set()
+
+    for lv in levels:
+        lv = float(lv)
+
+        if lv < available[0] or lv > available[-1]:
+            log.error(f"Level {lv} is outside of the available levels [{available[0]}, {available[-1]}]", e=ValueError)
+
+        i = np.searchsorted(available, lv)
+        query.add(available[i])
+        if available[i] != lv:
+            query.add(available[i - 1])
+
+    return [int(lv) if lv.is_integer() else lv for lv in sorted(query)]
+
+
+def select_pressure_levels(ds: xr.Dataset, levels: list) -> xr.Dataset:
+    """
+    Returns ds on levels, interpolated from the queried levels (see get_query_levels) when some are not available
+    """
+
+    if level_name not in ds.dims:
+        return ds
+
+    levels = [float(lv) for lv in levels]
+
+    if set(levels) == set(ds[level_name].values.astype("float64")):
+        return ds
+
+    return to_pressure_levels(ds, levels)
+
+
+def interpolate(
+        da: xr.DataArray,
+        coord: xr.DataArray,
+        targets: list[float],
+        dim: str,
+        new_dim: str = None,
+        log_scale: bool = False,
+    ) -> xr.DataArray:
+    """
+    Interpolates da along dim on targets values of coord (lazy if da is a dask array)
+
+    Args:
+        da (xr.DataArray): variable to interpolate
+        coord (xr.DataArray): vertical coordinate along dim, 1D or per column (broadcastable with da)
+        targets (list[float]): target values of coord
+        dim (str): vertical dimension of da
+        new_dim (str, optional): dimension of the result (indexed by targets). Defaults to dim.
+        log_scale (bool): interpolate linearly in log(coord) (pressure). Defaults to False.
+
+    Targets outside of the coord range of a column are NaN
+    """
+
+    if da.sizes[dim] < 2:
+        log.error(f"At least 2 levels along {dim} are required to interpolate", e=ValueError)
+
+    new_dim = new_dim or dim
+    targets = np.asarray(targets, dtype="float64")
+
+    if log_scale:
+        coord, targets = np.log(coord), np.log(targets)
+
+    res = xr.apply_ufunc(
+        _interp_columns, da, coord,
+        kwargs = dict(targets=targets),
+        input_core_dims  = [[dim], [dim]],
+        output_core_dims = [[new_dim]],
+        exclude_dims = {dim},
+        dask = "parallelized",
+        output_dtypes = [np.result_type(da.dtype, np.float32)],
+        dask_gufunc_kwargs = dict(output_sizes={new_dim: len(targets)}),
+        keep_attrs = True,
+    )
+
+    res = res.assign_coords({new_dim: np.exp(targets) if log_scale else targets})
+
+    return res.transpose(*[new_dim if d == dim else d for d in da.dims])
+
+
+def to_pressure_levels(ds: xr.Dataset, levels: list[float], pressure: xr.DataArray = None) -> xr.Dataset:
+    """
+    Interpolates the variables of ds on pressure levels (hPa), linearly in log-pressure
+
+    Args:
+        ds (xr.Dataset): dataset on pressure levels or model levels
+        levels (list[float]): target pressure levels in hPa
+        pressure (xr.DataArray, optional): pressure (hPa) of the source levels, per column for model levels
+            (see hybrid_pressure). Defaults to None (the pressure_level coordinate).
+    """
+
+    dim = _get_vertical_dim(ds)
+
+    if pressure is None:
+        if dim != level_name:
+            log.error(f"The pressure of the {dim} levels is required (see hybrid_pressure)", e=ValueError)
+        pressure = ds[level_name].astype("float64")
+
+    if dim == level_name and pressure.dims == (level_name,) and np.isin(levels, pressure).all():
+        return ds.sel({level_name: levels}) # no interpolation required
+
+    return _interpolate_dataset(ds, pressure, levels, dim, new_dim=level_name, log_scale=True)
+
+
+def to_altitudes(ds: xr.Dataset, altitudes: list[float], geopotential: xr.DataArray) -> xr.Dataset:
+    """
+    Interpolates the variables of ds on geopotential heights (m)
+
+    Args:
+        ds (xr.Dataset): dataset on pressure levels or model levels
+        altitudes (list[float]): target geopotential heights in m
+        geopotential (xr.DataArray): geopotential (m2 s-2) of the source levels (ex: ERA5 "z")
+
+    Within a layer, the hydrostatic log-pressure profile is linear in height, the weights are linear in altitude
+    """
+
+    dim = _get_vertical_dim(ds)
+
+    return _interpolate_dataset(ds, geopotential / g, altitudes, dim, new_dim=altitude_name)
+
+
+def hybrid_pressure(a: list[float], b: list[float], surface_pressure: xr.DataArray, dim: str = model_level_name) -> xr.DataArray:
+    """
+    Pressure (hPa) of hybrid model levels p = a + b * sp, per column
+
+    Args:
+        a (list[float]): a coefficients of the model levels (Pa), at full levels
+        b (list[float]): b coefficients of the model levels, at full levels
+        surface_pressure (xr.DataArray): surface pressure (Pa)
+        dim (str): dimension of the model levels. Defaults to model_level.
+
+    The coefficients are applied as given, the caller must pass full level coefficients: the ECMWF model levels
+    definitions give them at half levels (n + 1 values), full levels are then the mean of the 2 surrounding half
+    levels, ex: (a[1:] + a[:-1]) / 2 with numpy arrays
+    """
+
+    if len(a) != len(b):
+        log.error(f"Inconsistent hybrid coefficients: {len(a)} a and {len(b)} b", e=ValueError)
+
+    a = xr.DataArray(np.asarray(a, dtype="float64"), dims=[dim])
+    b = xr.DataArray(np.asarray(b, dtype="float64"), dims=[dim])
+
+    return (a + b * surface_pressure) / 100
+
+
+def read_hybrid_coefficients(filepath: Path) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reads a model levels definition table (csv n, a, b of the n + 1 half levels, from the top of the atmosphere),
+    returns the a (Pa) and b coefficients of the full levels, as expected by hybrid_pressure
+    """
+
+    _, a, b = np.loadtxt(filepath, delimiter=",", skiprows=1, ndmin=2).T
+
+    return (a[1:] + a[:-1]) / 2, (b[1:] + b[:-1]) / 2
+
+
+def _interpolate_dataset(ds: xr.Dataset, coord: xr.DataArray, targets: list[float], dim: str, new_dim: str, log_scale=False) -> xr.Dataset:
+
+    out = {}
+    for name, var in ds.data_vars.items():
+        if dim not in var.dims:
+            out[name] = var
+            continue
+
+        out[name] = interpolate(var, coord, targets, dim, new_dim=new_dim, log_scale=log_scale)
+
+    res = xr.Dataset(out, attrs=ds.attrs)
+
+    return res if new_dim == dim else res.drop_vars(dim, errors="ignore")
+
+
+def _get_vertical_dim(ds: xr.Dataset) -> str:
+
+    dims = [d for d in [level_name, model_level_name] if d in ds.dims]
+
+    if len(dims) != 1:
+        log.error(f"Expected a single vertical dimension ({level_name} or {model_level_name}), found {dims}", e=ValueError)
+
+    return dims[0]
+
+
+def _interp_columns(values: np.ndarray, coord: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """
+    Linear interpolation along the last axis of each column, on the same targets
+    values, coord: (..., n), targets: (m,) -> (..., m)
+    """
+
+    n = values.shape[-1]
+    coord = np.broadcast_to(coord, values.shape) # 1D coordinate (ex: pressure levels)
+
+    # the vertical coordinate may be increasing or decreasing, per column
+    order  = np.argsort(coord, axis=-1)
+    coord  = np.take_along_axis(coord, order, axis=-1)
+    values = np.take_along_axis(values, order, axis=-1)
+
+    # index of the level below each target: number of levels <= target (..., m)
+    i = (coord[..., None, :] <= targets[:, None]).sum(axis=-1) - 1
+    i = np.clip(i, 0, n - 2)
+
+    c0, c1 = np.take_along_axis(coord, i, axis=-1),  np.take_along_axis(coord, i + 1, axis=-1)
+    v0, v1 = np.take_along_axis(values, i, axis=-1), np.take_along_axis(values, i + 1, axis=-1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = np.where(c1 > c0, (targets - c0) / (c1 - c0), 0)
+
+    res = v0 + w * (v1 - v0)
+
+    inside = (targets >= coord[..., :1]) & (targets <= coord[..., -1:])
+
+    return np.where(inside, res, np.nan).astype(np.result_type(values.dtype, np.float32))
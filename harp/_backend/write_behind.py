@@ -0,0 +1,96 @@
+"""
+Background persistence of the downloaded slices (write_behind config)
+
+The slices of a freshly downloaded dataset are registered as pending (in memory) and returned to the caller,
+while a background writer stores them. Readers use the pending values until the files are written.
+The errors of the background writes are raised by the next flush() or check() (called by the providers get)
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+import threading
+
+import numpy as np
+
+from core import log
+
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="harp-writer") # not daemon: writes are completed at exit
+_futures: set[Future] = set()
+
+_pending = {} # str(filepath) -> values of the slice, until its file is written
+_errors: list[Exception] = [] # failed writes, raised by the next check()
+_lock = threading.Lock()
+
+
+def add_pending(filepath: Path, values: np.ndarray):
+    values.flags.writeable = False # shared with the readers
+    with _lock:
+        _pending[str(filepath)] = values
+
+
+def get_pending(filepath: Path) -> np.ndarray:
+    """
+    Returns the values of a slice which is not written yet (None if not pending)
+    """
+    return _pending.get(str(filepath))
+
+
+def is_pending(filepath: Path) -> bool:
+    return str(filepath) in _pending
+
+
+def submit(write: Callable, files: list[Path], on_done: Callable = None) -> Future:
+    """
+    Runs write() in the background writer, then removes files from the pending slices and calls on_done()
+    (ex: releases the query lock), whether the write succeeded or not
+    """
+
+    def _task():
+        try:
+            write()
+        except Exception as e:
+            log.warning(f"Could not store {len(files)} slices in the background ({e})")
+            with _lock:
+                _errors.append(e)
+            raise
+        finally:
+            with _lock:
+                for f in files:
+                    _pending.pop(str(f), None)
+            if on_done is not None:
+                on_done()
+
+    future = _executor.submit(_task)
+
+    with _lock:
+        _futures.add(future)
+    future.add_done_callback(lambda f: _futures.discard(f))
+
+    return future
+
+
+def flush():
+    """
+    Waits for the completion of the pending writes, then raises their errors (see check)
+    """
+
+    for future in list(_futures):
+        future.exception() # waits, errors are recorded by the task
+
+    check()
+
+
+def check():
+    """
+    Raises the errors of the background writes which failed since the last call:
+    the datasets returned before them refer to slices which were not stored
+    """
+
+    with _lock:
+        errors = _errors.copy()
+        _errors.clear()
+
+    if errors:
+        raise RuntimeError(f"{len(errors)} background write(s) failed, their slices are not stored: {errors[0]}") from errors[0]
@@ -0,0 +1,155 @@
+"""
+Facet filters of the search (collection, institution, steps, dims, resolution, time)
+Applied on the merged search table before the fuzzy scoring, only the selected rows are scored
+"""
+
+from datetime import datetime, timedelta
+import re
+
+import numpy as np
+import pandas as pd
+
+from core import log
+
+
+steps_names = {24: "hourly", 8: "tri-hourly", 1: "daily"} # timesteps per day -> name
+
+
+def get_steps_name(timeres) -> str:
+    return steps_names.get(int(timeres), str(timeres))
+
+
+def select(table: pd.DataFrame, attrs: list[dict], facets: dict) -> np.ndarray:
+    """
+    Returns the positions of the table rows matching all the facets (every row if facets is empty)
+
+    Args:
+        table: merged search table (column "table": position of the source table in attrs)
+        attrs: attrs of each source table
+        facets: filters, each one is a list of accepted values (None to ignore):
+            sources      substrings of "<collection>.<dataset>" (all must match)
+            collection   collection names (ex: ERA5)
+            institution  institution names (ex: ECMWF)
+            steps        hourly, tri-hourly, daily
+            dims         2D, 3D or raw dims (ex: xyt)
+            res          spatial resolutions in degrees (ex: 0.25)
+            time         dates the dataset must cover (ex: 2010, 2010-06, 2010-06-01)
+    """
+
+    facets = {k: v for k, v in facets.items() if v}
+
+    unknown = set(facets) - {"sources", "collection", "institution", "steps", "dims", "res", "time"}
+    if unknown:
+        log.error(f"Unknown search facet(s): {', '.join(unknown)}", e=ValueError)
+
+    # dataset level facets, resolved on the attrs then broadcast with the table column
+    tables = [i for i, a in enumerate(attrs) if _match_dataset(a, facets)]
+    mask = np.isin(table["table"].values, tables)
+
+    # variable level facets
+    if "dims" in facets:
+        mask &= _match_dims(table["dims"], facets["dims"])
+
+    if "res" in facets:
+        mask &= _match_resolution(table["spatial"], facets["res"])
+
+    return np.flatnonzero(mask)
+
+
+def _match_dataset(attrs: dict, facets: dict) -> bool:
+
+    source = f"{attrs['collection']}.{attrs['dataset']}".lower()
+
+    if "sources" in facets and not all(s.lower() in source for s in facets["sources"]):
+        return False
+
+    if "collection" in facets and attrs["collection"].lower() not in [c.lower() for c in facets["collection"]]:
+        return False
+
+    if "institution" in facets and attrs["institution"].lower() not in [i.lower() for i in facets["institution"]]:
+        return False
+
+    if "steps" in facets and get_steps_name(attrs["timeres"]) not in [s.lower() for s in facets["steps"]]:
+        return False
+
+    if "time" in facets:
+        start, end = parse_timerange(attrs["timerange"])
+        for t in facets["time"]:
+            t0, t1 = parse_time(t)
+            if t1 < start or t0 > end: return False
+
+    return True
+
+
+def _match_dims(dims: pd.Series, accepted: list[str]) -> np.ndarray:
+
+    dims = dims.astype(str).str.strip()
+    vertical = dims.str.contains("z", regex=False).values
+    dims = dims.values
+
+    mask = np.zeros(len(dims), dtype=bool)
+    for d in accepted:
+        d = d.strip()
+        if   d.upper() == "2D": mask |= ~vertical
+        elif d.upper() == "3D": mask |= vertical
+        else:                   mask |= dims == d.lower()
+
+    return mask
+
+
+def _match_resolution(spatial: pd.Series, accepted: list[float]) -> np.ndarray:
+    """
+    Rows with either grid spacing (lat or lon) equal to one of the accepted resolutions
+    """
+
+    res = spatial.astype(str).str.split("x", expand=True).apply(pd.to_numeric, errors="coerce").values
+
+    mask = np.zeros(len(spatial), dtype=bool)
+    for r in accepted:
+        mask |= np.isclose(res, float(r)).any(axis=1)
+
+    return mask
+
+
+def parse_time(s: str) -> tuple[datetime, datetime]:
+    """
+    Returns the [start, end] interval of a date given as YYYY, YYYY-MM or YYYY-MM-DD
+    """
+
+    s = str(s).strip()
+
+    for fmt, step in [("%Y-%m-%d", "day"), ("%Y-%m", "month"), ("%Y", "year")]:
+        try:
+            t0 = datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+
+        if step == "day":   t1 = t0 + timedelta(days=1)
+        if step == "month": t1 = (t0 + timedelta(days=32)).replace(day=1)
+        if step == "year":  t1 = t0.replace(year=t0.year + 1)
+
+        return t0, t1 - timedelta(microseconds=1)
+
+    log.error(f"Invalid time facet \"{s}\", expected YYYY, YYYY-MM or YYYY-MM-DD", e=ValueError)
+
+
+def parse_timerange(timerange: str, now: datetime = None) -> tuple[datetime, datetime]:
+    """
+    Parses the timerange displayed by the search (ex: "1940 ‥ T-5days", "T-4days ‥ T+15days")
+    Relative bounds are evaluated at search time, the cached tables do not go stale
+    """
+
+    now = now or datetime.now()
+    start, end = [b.strip() for b in timerange.split("‥")]
+
+    def _parse(bound: str, is_end: bool) -> datetime:
+
+        m = re.fullmatch(r"T([+-]\d+)(days|years)", bound)
+        if m:
+            n, unit = int(m.group(1)), m.group(2)
+            return now + timedelta(days=n * (365 if unit == "years" else 1))
+
+        t0, t1 = parse_time(bound)
+        return t1 if is_end else t0
+
+    return _parse(start, False), _parse(end, True)
@@ -1,19 +1,32 @@
 from core.monitor import Chrono
 from core import log
 
-def search(keywords, sources):
+def search(keywords, sources, facets: dict = None):
+    """
+    facets: filters applied before scoring, see harp._search.facets.select (ex: dict(steps=["hourly"], dims=["3D"]))
+    """
 
     with Chrono("Execution time", unit="s"):
         log.info("Searching Metadatabase..", flush=True)
         
-        from harp._search import metadatastore, search_cfg, search_engine
+        from harp._search import search_cache, search_cfg, search_engine
+        from harp._search import facets as search_facets
         from harp._search.ascii_table import ascii_table
         
+        table, attrs, index = search_cache.load(source_column="search")
+        
+        # only the rows matching the facets are scored
+        rows = search_facets.select(table, attrs, dict(facets or {}, sources=sources))
+        table = table.iloc[rows]
+        table = search_engine.search(keywords, table, source_column="search", index=index, rows=rows)
+        
         res = []
-        for df in metadatastore.get_tables():
-            res.append(search_engine.filter_best(search_engine.search(keywords, df, source_column="search")))
+        for i in table["table"].unique(): # split back per dataset
+            df = table[table["table"] == i].drop(columns="table")
+            df.attrs = attrs[i]
+            res.append(search_engine.filter_best(df))
 
-        res = search_engine.compile(res, sources)
+        res = search_engine.compile(res)
         if len(res) ==0:
             log.disp("> No match found.")
             exit()
@@ -0,0 +1,119 @@
+"""
+On-disk cache of the merged search table and its index
+Built once from the providers tables, rebuilt when the package tables change
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import os
+import re
+import shutil
+
+import pandas as pd
+
+from core import log
+
+from harp._search.search_engine import SearchIndex
+
+
+cache_version = "1" # to be incremented when the cache layout or the table formatting changes
+
+_package_dir = Path(__file__).parent.parent
+_sources = ["datasets", "_backend", "_search/metadatastore.py"] # files defining the search tables
+
+
+def get_cache_dir() -> Path:
+    """
+    Returns the search cache folder (HARP_SEARCH_CACHE, defaults to $XDG_CACHE_HOME/harp/search)
+    """
+
+    path = os.environ.get("HARP_SEARCH_CACHE")
+
+    if path is None:
+        path = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "harp" / "search"
+
+    return Path(path)
+
+
+def load(source_column: str = "search") -> tuple[pd.DataFrame, list[dict], SearchIndex]:
+    """
+    Returns the merged search table (column "table": position of the source table),
+    the attrs of each source table and the index of the source column
+    """
+
+    folder = get_cache_dir() / _get_fingerprint()
+
+    if not (folder / "attrs.json").is_file(): # written last
+        try:
+            _build(folder, source_column)
+        except OSError as e: # read-only home, etc..
+            log.debug(f"Could not write the search cache in {folder} ({e}), indexing in memory")
+            table, attrs = _merge_tables()
+            return table, attrs, SearchIndex(table[source_column])
+
+    table = pd.read_pickle(folder / "table.pkl")
+    attrs = json.loads((folder / "attrs.json").read_text())
+    index = SearchIndex.load(folder, table[source_column])
+
+    return table, attrs, index
+
+
+def _build(folder: Path, source_column: str):
+
+    log.debug(f"Building search cache in {folder}")
+
+    table, attrs = _merge_tables()
+    index = SearchIndex(table[source_column])
+
+    # written in a temporary folder then renamed, concurrent searches never read a partial cache
+    tmp = folder.with_name(f"{folder.name}.{os.getpid()}.tmp")
+    tmp.mkdir(parents=True, exist_ok=True)
+
+    table.to_pickle(tmp / "table.pkl")
+    index.save(tmp)
+    (tmp / "attrs.json").write_text(json.dumps(attrs, default=str))
+
+    try:
+        os.rename(tmp, folder)
+    except OSError: # built by another process in the meantime
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # remove the caches of previous package versions
+    for old in folder.parent.iterdir():
+        if old.name != folder.name and re.fullmatch("[0-9a-f]{32}", old.name):
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def _merge_tables() -> tuple[pd.DataFrame, list[dict]]:
+
+    from harp._search import metadatastore # instantiates every provider
+
+    tables = metadatastore.get_tables()
+    attrs  = [dict(t.attrs) for t in tables]
+
+    table = pd.concat([t.assign(table=i) for i, t in enumerate(tables)], ignore_index=True)
+    table.attrs = {}
+
+    return table, attrs
+
+
+def _get_fingerprint() -> str:
+    """
+    Hash of the files which define the search tables (path, size and modification time)
+    """
+
+    h = hashlib.blake2b(digest_size=16)
+    h.update(cache_version.encode("utf-8"))
+
+    for source in _sources:
+        source = _package_dir / source
+        files = [source] if source.is_file() else source.rglob("*")
+
+        for f in sorted(files):
+            if f.suffix not in [".py", ".csv", ".json"]: continue
+
+            stat = f.stat()
+            h.update(f"{f.relative_to(_package_dir)}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+
+    return h.hexdigest()
@@ -1,4 +1,8 @@
+from collections import OrderedDict
 import difflib
+import functools
+import hashlib
+import json
 from pathlib import Path
 import string
 
@@ -7,7 +11,7 @@ import pandas as pd
 
 from core import log
 
-from harp._search import search_cfg
+from harp._search import search_cfg, facets
 
 def _split_string(s: str):
     # s = s.replace("_", " ")
@@ -27,6 +31,9 @@ def _fuzzy_score(search_terms: list, string: str):
     
     Returns:
         A float representing the fuzzy score, adjusted for unmatched terms.
+        
+    Note:
+        Reference implementation for a single string, search uses the equivalent vectorized SearchIndex
     """
     
     word_threshold = search_cfg.word_threshold
@@ -46,7 +53,7 @@ def _fuzzy_score(search_terms: list, string: str):
                 continue
         
         for word in splitted_string: # for each word in the line
-            res = difflib.SequenceMatcher(None, term.strip(), word.strip()).ratio() # check match
+            res = _similarity(term.strip(), word.strip()) # check match
             if res >= word_threshold: 
                 score += res # weight by word match -> allow to discriminate perfect matches with low accuracy matches
                 iscore += 1
@@ -61,6 +68,169 @@ def _fuzzy_score(search_terms: list, string: str):
     
     
     return score - unmatched_term_penalty
+
+
+@functools.lru_cache(maxsize=4096)
+def _similarity(term: str, word: str) -> float:
+    """
+    Memoized similarity ratio between a search term and a word (bounded: long lived processes, ex: harp serve)
+    """
+    return difflib.SequenceMatcher(None, term, word).ratio()
+
+
+max_terms = 256 # per SearchIndex, ratios of the most recent search terms
+
+
+class SearchIndex:
+    """
+    Inverted index over the words of a column of strings
+    
+    Each row is stored as the sequence of its word ids in the vocabulary,
+    a term is compared once to each word of the vocabulary, then all the rows are scored in a vectorized pass
+    """
+    
+    def __init__(self, strings: list[str]):
+        
+        self.strings = pd.Series([s.lower().strip() for s in strings], dtype=object)
+        
+        rows = [_split_string(s) for s in self.strings]
+        
+        self.vocabulary = {} # word -> word id
+        for words in rows:
+            for w in words:
+                self.vocabulary.setdefault(w.strip(), len(self.vocabulary))
+        
+        self.words = np.array(list(self.vocabulary.keys()), dtype=object)
+        
+        # row words ids, in order, padded with -1
+        self.nwords = np.array([len(words) for words in rows])
+        self.ids = np.full((len(rows), max(self.nwords, default=0)), -1)
+        for i, words in enumerate(rows):
+            self.ids[i, :len(words)] = [self.vocabulary[w.strip()] for w in words]
+        
+        self._ratios = OrderedDict() # (term, threshold) -> ratios over the vocabulary, least recently used first
+    
+    
+    def save(self, folder: Path):
+        
+        np.save(folder / "index_ids.npy", self.ids)
+        np.save(folder / "index_nwords.npy", self.nwords)
+        (folder / "index_words.json").write_text(json.dumps(list(self.words)))
+    
+    
+    @classmethod
+    def load(cls, folder: Path, strings: list[str]) -> "SearchIndex":
+        """
+        Loads an index saved with SearchIndex.save, built on the same strings (arrays are memory-mapped)
+        """
+        
+        index = cls.__new__(cls)
+        
+        index.strings = pd.Series([s.lower().strip() for s in strings], dtype=object)
+        index.words   = np.array(json.loads((folder / "index_words.json").read_text()), dtype=object)
+        index.ids     = np.load(folder / "index_ids.npy", mmap_mode="r")
+        index.nwords  = np.load(folder / "index_nwords.npy", mmap_mode="r")
+        index._ratios = OrderedDict()
+        
+        return index
+    
+    
+    def score(self, search_terms: list[str], rows: np.ndarray = None) -> np.ndarray:
+        """
+        Vectorized equivalent of _fuzzy_score(search_terms, s) for every string s of the index
+        rows: positions of the strings to score (ex: selected by the search facets), all if None
+        """
+        
+        word_threshold = search_cfg.word_threshold
+        
+        strings, ids, nwords = self.strings, self.ids, self.nwords
+        if rows is not None:
+            strings, ids, nwords = strings.iloc[rows], ids[rows], nwords[rows]
+        
+        nrows = len(strings)
+        score  = np.zeros(nrows)
+        iscore = np.zeros(nrows)
+        irows = np.arange(nrows)
+        
+        for term in search_terms:
+            
+            quoted = np.zeros(nrows, dtype=bool)
+            if " " in term: # trigger quote matching
+                quoted = strings.str.contains(term, regex=False).values
+                score[quoted]  += 1
+                iscore[quoted] += 1
+            
+            # first word of each row matching the term (same as the sequential search)
+            ratios = self._get_term_ratios(term.strip(), word_threshold)
+            r = np.where(ids >= 0, ratios[ids], 0)
+            matched = r >= word_threshold
+            
+            first = np.argmax(matched, axis=1)
+            found = matched.any(axis=1) & ~quoted
+            
+            score[found]  += r[irows, first][found]
+            iscore[found] += 1
+        
+        # penalize string that have terms which have not been matched
+        unmatched_term_penalty = (1-word_threshold) * (1 - (iscore / nwords))
+        
+        if search_cfg.match_exact: unmatched_term_penalty  *= 0.25
+        if search_cfg.match_strict: unmatched_term_penalty *= 0.5
+        
+        return score - unmatched_term_penalty
+    
+    
+    def _get_term_ratios(self, term: str, word_threshold: float) -> np.ndarray:
+        """
+        Similarity of the term to each word of the vocabulary, 0 for the words which cannot reach word_threshold
+        """
+        
+        key = (term, word_threshold)
+        if key in self._ratios:
+            self._ratios.move_to_end(key)
+            return self._ratios[key]
+        
+        ratios = np.zeros(len(self.words) + 1) # last element is for the padding (id -1)
+        
+        for i, word in enumerate(self.words):
+            sm = difflib.SequenceMatcher(None, term, word)
+            if sm.real_quick_ratio() < word_threshold: continue # upper bound, skips most of the vocabulary
+            ratios[i] = sm.ratio()
+        
+        self._ratios[key] = ratios
+        if len(self._ratios) > max_terms:
+            self._ratios.popitem(last=False)
+        
+        return ratios
+
+
+_indexes = OrderedDict() # fingerprint of the strings -> SearchIndex, the tables are searched with several keywords per session
+max_indexes = 8
+
+def _get_index(strings: pd.Series) -> SearchIndex:
+    
+    key = _get_fingerprint(strings)
+    
+    if key in _indexes:
+        _indexes.move_to_end(key)
+        return _indexes[key]
+    
+    _indexes[key] = SearchIndex(list(strings))
+    if len(_indexes) > max_indexes:
+        _indexes.popitem(last=False)
+    
+    return _indexes[key]
+
+
+def _get_fingerprint(strings: pd.Series) -> str:
+    """
+    Hash of the content of the strings (the indexes are not keyed by the strings themselves)
+    """
+    
+    h = hashlib.blake2b(digest_size=16)
+    h.update(pd.util.hash_pandas_object(pd.Series(strings, dtype=object), index=False).values.tobytes())
+    
+    return h.hexdigest()
     
 
 def search(
@@ -69,7 +239,9 @@ def search(
     source_column: str,
     sort_results: bool = False, 
     nmax: int = None,
-    result_column: str = 'score'
+    result_column: str = 'score',
+    index: SearchIndex = None,
+    rows: np.ndarray = None,
 ) -> pd.DataFrame:
     """
     Args:
@@ -79,6 +251,8 @@ def search(
         sort_results: If True, results are sorted by score in descending order.
         nmax: Maximum number of results to return.
         result_column: Name of the column to store the results.
+        index: SearchIndex of the source column (ex: loaded from the search cache), built if None.
+        rows: positions in the index of the df rows, when df is a subset of the indexed table (ex: facets selection).
     
     Returns:
         A pandas DataFrame with the search results added as a new column.
@@ -92,10 +266,10 @@ def search(
     keywords = [k.lower().strip() for k in keywords]
     nterms = len(keywords) # used to normalize to a ratio
     
-    # Calculate scores for each row
-    df[result_column] = df[source_column].apply(
-        lambda x:  np.clip(_fuzzy_score(keywords, x.lower().strip()) / nterms, 0, None)
-    )
+    # Calculate scores for all the rows
+    if index is None:
+        index = _get_index(df[source_column])
+    df[result_column] = np.clip(index.score(keywords, rows=rows) / nterms, 0, None)
     
     # Sort if requested
     if sort_results:
@@ -155,8 +329,11 @@ def filter_best(
 
 def compile(
     results: list[pd.DataFrame],
-    sources: str
 ):
+    """
+    Formats and concatenates the per dataset results
+    (datasets are filtered beforehand by the search facets, ex: --from)
+    """
 
     filtered = []
     
@@ -165,8 +342,7 @@ def compile(
         timerange = t.attrs["timerange"]
         timerange = timerange.replace("days", "d").replace("years", "y")
         
-        timeres = str(t.attrs["timeres"]).strip()
-        timeres = timeres.replace("24", "hourly").replace("8", "tri-hourly").replace("1", "daily")
+        timeres = facets.get_steps_name(t.attrs["timeres"])
         
         dataset_source = t.attrs["collection"] + "." + t.attrs["dataset"] # + " " # removed: t.attrs["institution"] + "." + 
         t["dataset"] = dataset_source
@@ -177,20 +353,7 @@ def compile(
         t["score"] = t["score"].apply(lambda x: min(round(x + 0.0499, 1), 1.0))
         t["match"] = t["score"].apply(lambda x: f"{x:.0%}".rjust(5))
 
-        # Filtering from the sources provided by flag --from
-        if sources is not None:
-            matched_all = True
-            for src in sources:
-                # print(src.strip().lower(), " in ",  dataset_source, " is ", src.lower() in dataset_source)
-                
-                if not src.lower() in dataset_source.lower():
-                    matched_all = False
-                    break
-                
-            if matched_all: 
-                filtered.append(t)
-        else:
-            filtered.append(t)
+        filtered.append(t)
     
     if len(filtered) == 0:
         return []
@@ -0,0 +1,6 @@
+"""
+HARP daemon (harp serve)
+
+Optional local daemon owning the downloads of a cache directory, 
+shared by all the workers using the same HARP_CACHE_DIR
+"""
@@ -0,0 +1,74 @@
+import json
+import socket
+from pathlib import Path
+
+from core import log
+
+from harp._backend._utils.HarpErrors import InvalidQueryError
+from harp._backend.harp_query import _encode
+
+
+socket_name = "harp.sock" # default socket name, inside the cache directory
+
+# exceptions which are re-raised as is on the client side
+_known_errors = {e.__name__: e for e in [
+    InvalidQueryError, FileNotFoundError, KeyError, ValueError, TimeoutError,
+]}
+
+
+def get_socket_path(config) -> Path|None:
+    """
+    Returns the path of the daemon socket serving the cache directory, None if no daemon is running
+    """
+
+    path = config.get("serve_socket")
+
+    if path is None:
+        storage = config.get("dir_storage")
+        if storage is None: return None
+        path = Path(storage) / socket_name
+
+    path = Path(path)
+
+    return path if path.is_socket() else None
+
+
+def submit(provider, hq, socket_path: Path):
+    """
+    Sends the query to the daemon and blocks until all of its atomic slices are stored
+    Raises ConnectionError if the daemon cannot be reached
+    """
+
+    cls = provider.__class__
+    message = dict(
+        provider = f"{cls.__module__}.{cls.__qualname__}",
+        init     = _encode(provider._get_init_kwargs()),
+        query    = hq.to_dict(),
+    )
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        send_message(sock, message)
+        reply = recv_message(sock)
+
+    if reply is None:
+        raise ConnectionError("harp daemon closed the connection")
+
+    if reply["status"] != "ok":
+        e = _known_errors.get(reply["error_type"], RuntimeError)
+        log.error(f"harp daemon: {reply['error']}", e=e)
+
+
+def send_message(sock: socket.socket, message: dict):
+    sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+
+def recv_message(sock: socket.socket) -> dict|None:
+    """
+    Reads one newline delimited JSON message, None if the connection has been closed
+    """
+
+    with sock.makefile("r", encoding="utf-8") as f:
+        line = f.readline()
+
+    return json.loads(line) if line else None
@@ -0,0 +1,271 @@
+import importlib
+import json
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from core import log
+
+from harp._backend.baseprovider import BaseDatasetProvider
+from harp._backend.harp_query import HarpQuery, _decode
+from harp._serve.client import send_message, recv_message
+
+
+class _Batch:
+    """
+    Subqueries received during one batching window, downloaded together
+    """
+    def __init__(self):
+        self.items  = []                # list of (provider_key, HarpQuery, atomic slices paths)
+        self.errors = {}                # atomic slice path -> exception of the failed request
+        self.done   = threading.Event() # set once every slice of the batch is stored (or failed)
+
+
+class HarpDaemon:
+    """
+    Local daemon owning the downloads of a cache directory (harp serve)
+
+    Clients submit their queries through a unix socket, the daemon:
+        - merges the subqueries received within a batching window into the fewest provider requests
+        - deduplicates the atomic slices which are already being downloaded
+        - replies to each client once all of its atomic slices are stored
+
+    The providers are instantiated with the daemon config: the storage settings of the clients (tile_size, locks)
+    are the ones of the daemon, and the slices are always stored before the reply (write_behind is disabled)
+    """
+
+    def __init__(self, socket_path: Path, config: dict, window: float = 2.0):
+        """
+        Args:
+            socket_path (Path): unix socket path, clients look for it in the cache directory by default
+            config (dict): config used to instantiate the providers (dir_storage, tile_size..)
+            window (float): batching window in seconds
+        """
+
+        self.socket_path = Path(socket_path)
+        self.config      = dict(config, write_behind=False) # clients read the slices once replied
+        self.window      = window
+
+        self._lock      = threading.Lock()
+        self._stop      = threading.Event()
+        self._providers = {}        # provider_key -> provider instance
+        self._inflight  = {}        # atomic slice path -> batch downloading it
+        self._batch     = _Batch()  # batch currently accumulating subqueries
+
+
+    def serve_forever(self):
+
+        self._prepare_socket()
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(str(self.socket_path))
+            server.listen()
+            server.settimeout(0.5) # allows to check the stop event
+
+            log.info(f"harp daemon listening on {self.socket_path} (batching window: {self.window}s)")
+
+            try:
+                while not self._stop.is_set():
+                    try:
+                        conn, _ = server.accept()
+                    except socket.timeout:
+                        continue
+                    conn.settimeout(None)
+                    threading.Thread(target=self._handle_client, args=(conn,), daemon=True).start()
+            finally:
+                self.socket_path.unlink(missing_ok=True)
+
+
+    def shutdown(self):
+        self._stop.set()
+
+
+    def _prepare_socket(self):
+        """
+        Remove the socket file left by a daemon which has not been shut down properly
+        """
+
+        if not self.socket_path.exists():
+            self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+            return
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(str(self.socket_path))
+            except ConnectionError:
+                log.debug(f"Removing stale socket {self.socket_path}")
+                self.socket_path.unlink()
+                return
+
+        log.error(f"A harp daemon is already serving {self.socket_path}", e=RuntimeError)
+
+
+    def _handle_client(self, conn: socket.socket):
+
+        with conn:
+            message = recv_message(conn)
+            if message is None: return
+
+            try:
+                for batch, paths in self._submit(message).items():
+                    batch.done.wait()
+                    for p in paths: # failed in the request of any client sharing the slice
+                        if p in batch.errors:
+                            raise batch.errors[p]
+                reply = dict(status="ok")
+
+            except Exception as e:
+                reply = dict(status="error", error_type=e.__class__.__name__, error=str(e))
+
+            send_message(conn, reply)
+
+
+    def _submit(self, message: dict) -> dict[_Batch, set[str]]:
+        """
+        Adds the missing atomic slices of the query to the current batch
+        Returns the atomic slices paths to wait for, per batch downloading them: 
+        the slices already being downloaded for another client are waited for in their own batch, not queued again
+        """
+
+        key, provider = self._get_provider(message["provider"], message["init"])
+        hq = HarpQuery.from_dict(message["query"])
+
+        subqueries: list[HarpQuery] = provider._decompose_into_subqueries(hq)
+        subqueries: list[HarpQuery] = provider._filter_cached_variables_from_queries(subqueries)
+
+        waits = {}
+        with self._lock:
+            for hqs in subqueries:
+
+                missing = {} # missing timesteps -> (variables, paths)
+                for v in hqs.variables:
+                    times, paths = set(), []
+                    for t, p in self._get_variable_paths(provider, hqs, v):
+                        if p in self._inflight: # already being downloaded for another client
+                            waits.setdefault(self._inflight[p], set()).add(p)
+                        else:
+                            times.add(t)
+                            paths.append(p)
+
+                    if times:
+                        variables, missing_paths = missing.setdefault(tuple(sorted(times)), ([], []))
+                        variables.append(v)
+                        missing_paths += paths
+
+                for times, (variables, paths) in missing.items():
+                    sub = HarpQuery.from_dict(hqs.to_dict())
+                    sub.variables = variables
+                    sub.timesteps = list(times)
+                    self._batch.items.append((key, sub, paths))
+                    waits.setdefault(self._batch, set()).update(paths)
+                    for p in paths:
+                        self._inflight[p] = self._batch
+
+        return waits
+
+
+    def _batch_loop(self):
+
+        while not self._stop.wait(self.window):
+
+            with self._lock:
+                batch, self._batch = self._batch, _Batch()
+
+            if not batch.items:
+                batch.done.set()
+                continue
+
+            # execute in its own thread, to keep batching the incoming queries in the meantime
+            threading.Thread(target=self._execute, args=(batch,), daemon=True).start()
+
+
+    def _execute(self, batch: _Batch):
+
+        merged = self._merge([(key, hqs) for key, hqs, _ in batch.items])
+
+        nqueries = sum(len(queries) for queries in merged.values())
+        log.info(f"Executing batch: {len(batch.items)} subqueries merged into {nqueries} request(s)")
+
+        # one thread per provider, requests of a provider stay sequential
+        with ThreadPoolExecutor(max_workers=len(merged)) as pool:
+            futures = {key: pool.submit(self._providers[key]._download_subqueries, queries) for key, queries in merged.items()}
+
+            for key, f in futures.items():
+                try:
+                    f.result()
+                except Exception as e:
+                    log.warning(f"harp daemon: batch failed for {key}: {e}")
+                    for item_key, _, paths in batch.items:
+                        if item_key == key:
+                            batch.errors.update(dict.fromkeys(paths, e))
+
+        with self._lock:
+            self._inflight = {p: b for p, b in self._inflight.items() if b is not batch}
+
+        batch.done.set()
+
+
+    def _merge(self, items: list) -> dict[str, list[HarpQuery]]:
+        """
+        Merges the subqueries of the same provider which only differ by their variables or timesteps
+        (same day or ref time, same area and levels)
+        """
+
+        groups = {}
+        for key, hqs in items:
+            d = hqs.to_dict()
+            gkey = (key, json.dumps([d["area"], d["levels"], d["ref_time"], d["extra"]], sort_keys=True))
+
+            if gkey not in groups:
+                groups[gkey] = HarpQuery.from_dict(d)
+                groups[gkey].variables = []
+                groups[gkey].timesteps = []
+
+            merged: HarpQuery = groups[gkey]
+            merged.variables += [v for v in hqs.variables if v not in merged.variables]
+            merged.timesteps  = sorted(set(merged.timesteps) | set(hqs.timesteps))
+
+        queries = {}
+        for (key, _), hqs in groups.items():
+            if key not in queries: queries[key] = []
+            queries[key].append(hqs)
+
+        return queries
+
+
+    def _get_provider(self, path: str, init: dict):
+        """
+        Returns the (cached) provider instance corresponding to the class import path
+        """
+
+        key = path + json.dumps(init, sort_keys=True)
+
+        with self._lock:
+            if key in self._providers:
+                return key, self._providers[key]
+
+            module, name = path.rsplit(".", 1)
+            if not module.startswith("harp."):
+                log.error(f"harp daemon: refusing to load provider {path}", e=ValueError)
+
+            cls = getattr(importlib.import_module(module), name)
+            if not (isinstance(cls, type) and issubclass(cls, BaseDatasetProvider)):
+                log.error(f"harp daemon: {path} is not a dataset provider", e=ValueError)
+
+            self._providers[key] = cls(variables={}, config=self.config, **_decode(init))
+
+            return key, self._providers[key]
+
+
+    def _get_variable_paths(self, provider: BaseDatasetProvider, hqs: HarpQuery, variable: str) -> list[tuple[datetime, str]]:
+        """
+        Returns the (timestep, atomic slice path) of the storage units of a variable of the subquery
+        """
+
+        hqv = HarpQuery.from_dict(hqs.to_dict())
+        hqv.variables = [variable]
+
+        return [(u.time, str(provider._get_target_file_path(u))) for u in provider._get_storage_units(hqv)]
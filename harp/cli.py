@@ -1,9 +1,4 @@
 from core import log
-from harp._code_sample import code_sample
-from harp._search import search_cfg
-from harp._search.search import search
-    
-from harp import _backend
 
 import argparse
 from sys import exit
@@ -21,6 +16,11 @@ def entry(args=None):
     cmd.add_argument("--dataset", nargs=1, help="Dataset name to query")
     cmd.add_argument("--param", nargs=1, help="Parameter name to query")
     
+    # > serve command
+    cmd = subs.add_parser(help="Run the harp daemon, owning the downloads of a cache directory", name="serve")
+    cmd.add_argument("--socket", action="store", help="Unix socket path (defaults to <HARP_CACHE_DIR>/harp.sock)", default=None)
+    cmd.add_argument("--window", action="store", type=float, help="Batching window in seconds", default=2.0)
+    
     # > search command
     cmd = subs.add_parser(help="search variables in the datasets interfaced by HARP", name="search")
     cmd.add_argument(
@@ -39,6 +39,15 @@ def entry(args=None):
         default=None, nargs="+", metavar="source"
     )
     
+    # facets, applied before scoring
+    facets = cmd.add_argument_group("facets", "filter the variables before searching (several values: any of them)")
+    facets.add_argument("--collection", nargs="+", default=None, metavar="name", help="Collection (ERA5, CAMS, MERRA2..)")
+    facets.add_argument("--institution", nargs="+", default=None, metavar="name", help="Institution (ECMWF, NASA..)")
+    facets.add_argument("--steps", nargs="+", default=None, choices=["hourly", "tri-hourly", "daily"], help="Time resolution")
+    facets.add_argument("--dims", nargs="+", default=None, metavar="dims", help="2D, 3D (vertical levels) or raw dims (xy, xyt, xyzt)")
+    facets.add_argument("--res", nargs="+", default=None, type=float, metavar="degrees", help="Spatial resolution in degrees (ex: 0.25)")
+    facets.add_argument("--time", nargs="+", default=None, metavar="date", help="Date covered by the dataset (YYYY, YYYY-MM or YYYY-MM-DD)")
+    
     # Create a mutually exclusive group
     mode_group = cmd.add_mutually_exclusive_group()
     mode_group.add_argument("--exact", "-e",        action="store_true", help="Exact matching")
@@ -63,14 +72,24 @@ def entry(args=None):
     args = parser.parse_args()
     
     # detect if command is search or code-sample
+    # (commands modules are imported here, to keep `harp --help` fast)
     if args.command == "code-sample":
+        from harp._code_sample import code_sample
+        
         dataset = args.dataset[0] if args.dataset else None
         param = args.param[0] if args.param else None
         
         code_sample(dataset, param)
         
+    elif args.command == "serve":
+        serve(args.socket, args.window)
+        
     elif args.command == "search":
         
+        from harp import _backend
+        from harp._search import search_cfg
+        from harp._search.search import search
+        
         if args.minimum is not None: 
             minimum = str(args.minimum).replace("%", " ")
             minimum = int(minimum)
@@ -110,11 +129,43 @@ def entry(args=None):
             
         apply_user_search_config()
         
-        search(args.keywords, sources=sources)
+        facets = dict(
+            collection  = args.collection,
+            institution = args.institution,
+            steps       = args.steps,
+            dims        = args.dims,
+            res         = args.res,
+            time        = args.time,
+        )
+        
+        search(args.keywords, sources=sources, facets=facets)
+
+
+def serve(socket_path: str, window: float):
+    
+    from pathlib import Path
+    from harp import config
+    from harp._serve import client
+    from harp._serve.daemon import HarpDaemon
+    
+    storage = config.default_config.get("dir_storage")
+    if storage is None:
+        log.error("HARP_CACHE_DIR, nor DIR_ANCILLARY env variables are set, cannot determine the cache directory to serve", e=RuntimeError)
+    
+    socket_path = socket_path or config.default_config.get("serve_socket") or Path(storage) / client.socket_name
+    
+    daemon = HarpDaemon(socket_path, config=dict(dir_storage=Path(storage), offline=False), window=window)
+    
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        daemon.shutdown()
 
 
 def apply_user_search_config():
     
+    from harp._search import search_cfg
+    
     buf_word_threshold = search_cfg.word_threshold
     buf_match_threshold = search_cfg.match_threshold
     
@@ -7,7 +7,6 @@ from core import log
 from core import env
 
 import harp
-import toml
 
 default_config = Config({}) # just the 'general' subsection
 
@@ -35,6 +34,10 @@ default_config_dict = dict(
     offline = False,
     lock_timeout = -1, # in seconds
     lock_lifetime = timedelta(days=1),
+    serve_socket = env.getvar("HARP_SERVE_SOCKET", default=None), # harp daemon socket, defaults to <dir_storage>/harp.sock
+    tile_size = None, # degrees, global slices are stored in tiles (internal chunks) and regional queries read their tiles
+    slice_cache_size = 256 * 2**20, # bytes, in-memory LRU cache of the decoded slices (0 to disable)
+    write_behind = False, # return downloaded data at once, the slices are stored (and the query unlocked) in the background
 )
 
 default_config.ingest(default_config_dict)
@@ -0,0 +1 @@
+from ._hourly import GlobalForecast, GlobalForecastVolumetric
@@ -0,0 +1 @@
+from .aifs_global_forecast import GlobalForecast, GlobalForecastVolumetric
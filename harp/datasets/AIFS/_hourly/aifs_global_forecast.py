@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import xarray as xr
+
+from harp._backend.baseprovider import BaseDatasetProvider
+from harp._backend.timerange import Timerange
+from harp._backend import opendata
+
+
+class GlobalForecast(opendata.OpenDataDatasetProvider):
+
+    keywords = ["ECMWF", "AIFS", "open data"]
+    collection = "AIFS"
+
+    name = "aifs-single"
+    levtype = "sfc"
+
+    timerange_str = "T-4days ‥ T+15days"
+    timerange = Timerange(start=datetime.now() - timedelta(days=4), end=datetime.now() + timedelta(days=15))
+
+
+    def __init__(self, variables: dict[str: str], config: dict={}):
+
+        folder = Path(__file__).parent / "tables"
+        files = [
+            folder / "aifs_single_level.csv",
+        ]
+
+        super().__init__(csv_files=files, variables=variables, config=config)
+
+
+    # overload baseprovider definition to add parameters
+    def get(self,
+            time: datetime, # type dictates if dt or range
+            area: list = None, # [N, W, S, E]
+            ref_time: datetime = None,
+            **kwargs,  # catch-all for additional keyword arguments
+            ) -> xr.Dataset:
+        """
+        Get a dataset from the provider, with the specified parameters
+        Args:
+            time (datetime): single datetime of query
+            area (list, optional): [N, W, S, E] bounding box of query. Defaults to None (global).
+            ref_time (datetime, optional): forecast run to use. Defaults to None (latest run available for time).
+            **kwargs: additional keyword arguments to pass to the provider (not used currently)
+        """
+
+        return BaseDatasetProvider.get(self, time=time, area=area, ref_time=ref_time, **kwargs)
+
+
+class GlobalForecastVolumetric(opendata.OpenDataDatasetProvider):
+
+    keywords = ["ECMWF", "AIFS", "open data"]
+    collection = "AIFS"
+
+    name = "aifs-single"
+    levtype = "pl"
+
+    timerange_str = "T-4days ‥ T+15days"
+    timerange = Timerange(start=datetime.now() - timedelta(days=4), end=datetime.now() + timedelta(days=15))
+
+    pressure_levels = [ # all pressure levels
+        50, 100, 150, 200, 250, 300, 400, 500, 600, 700, 850, 925, 1000
+    ]
+
+
+    def __init__(self, variables: dict[str: str], config: dict={}):
+
+        folder = Path(__file__).parent / "tables"
+        files = [
+            folder / "aifs_pressure_levels.csv",
+        ]
+
+        super().__init__(csv_files=files, variables=variables, config=config)
+
+
+    # overload baseprovider definition to add parameters
+    def get(self,
+            time: datetime, # type dictates if dt or range
+            levels: list[int] = pressure_levels,
+            area: list = None, # [N, W, S, E]
+            ref_time: datetime = None,
+            **kwargs,  # catch-all for additional keyword arguments
+            ) -> xr.Dataset:
+        """
+        Get a dataset from the provider, with the specified parameters
+        Args:
+            time (datetime): single datetime of query
+            levels (list[int], optional): list of pressure levels to query. Defaults to all available levels.
+            area (list, optional): [N, W, S, E] bounding box of query. Defaults to None (global).
+            ref_time (datetime, optional): forecast run to use. Defaults to None (latest run available for time).
+            **kwargs: additional keyword arguments to pass to the provider (not used currently)
+        """
+
+        return BaseDatasetProvider.get(self, time=time, levels=levels, area=area, ref_time=ref_time, **kwargs)
@@ -1,12 +1,12 @@
-from datetime import date, datetime, timedelta
+from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Literal
 
 import xarray as xr
 
 from core import log
 from core.static import interface
 
-from harp._backend._utils.HarpErrors import InvalidQueryError
 from harp._backend.harp_query import HarpQuery
 from harp._backend.baseprovider import BaseDatasetProvider
 from harp._backend.timerange import Timerange
@@ -14,7 +14,7 @@ from harp._backend.timespec import RegularTimespec
 from harp._backend import cds
 
 
-class GlobalForecast(cds.CdsDatasetProvider): 
+class GlobalForecast(cds.CdsForecastDatasetProvider): 
     
     url = "https://ads.atmosphere.copernicus.eu/api"
     keywords = ["ECMWF", "Copernicus", "atmosphere"]
@@ -33,9 +33,15 @@ class GlobalForecast(cds.CdsDatasetProvider):
     timerange = Timerange(start=datetime(1940, 1, 1), end=datetime.now() + timedelta(days=5))
 
     
-    def __init__(self, variables: dict[str: str], config: dict={}, *, allow_extended_forecast: bool = False):
+    def __init__(self, variables: dict[str: str], config: dict={}, 
+        *, 
+        allow_extended_forecast: bool = False,
+        prefer: Literal["latest", "cached", "max_age"] = "latest",
+        max_age: timedelta = None,
+    ):
         
         self.allow_extended_forecast = allow_extended_forecast
+        self._set_forecast_policy(prefer, max_age)
         
         
         folder = Path(__file__).parent / "tables" / "GlobalForecast"
@@ -59,11 +65,15 @@ class GlobalForecast(cds.CdsDatasetProvider):
         
         
         
+    def _get_init_kwargs(self) -> dict:
+        return dict(allow_extended_forecast=self.allow_extended_forecast, prefer=self.prefer, max_age=self.max_age)
+    
+    
     # overload baseprovider definition to add parameters
     def get(self,
             time: datetime, # type dictates if dt or range
             area: list = None, # [N, W, S, E]
-            # TODO: add ref time support
+            ref_time: datetime = None,
             **kwargs,  # catch-all for additional keyword arguments
             ) -> xr.Dataset:
             
@@ -72,10 +82,11 @@ class GlobalForecast(cds.CdsDatasetProvider):
         Args:
             time (datetime): single datetime of query
             area (list, optional): [N, W, S, E] bounding box of query. Defaults to None (global).
+            ref_time (datetime, optional): forecast run to use. Defaults to None (latest run available for time).
             **kwargs: additional keyword arguments to pass to the provider (not used currently)
         """
         
-        return BaseDatasetProvider.get(self, time=time, area=area, **kwargs)
+        return BaseDatasetProvider.get(self, time=time, area=area, ref_time=ref_time, **kwargs)
     
     # @interface
     def _execute_cds_request(self, target_filepath: Path, hq: HarpQuery):
@@ -101,79 +112,6 @@ class GlobalForecast(cds.CdsDatasetProvider):
         if hq.area is not None: 
             request['area'] = hq.area
             
-        client = cds.auth.get_client(self.url)
-        client.retrieve(dataset, request, target_filepath)
+        self._retrieve(dataset, request, target_filepath, hq)
         
         return
-        
-        
-    def _standardize_time(self, ds: xr.Dataset):
-        """
-        from time dims = (forecast_reference_time, forecast_perdiod) to (time)
-        """
-        ds = ds.isel(forecast_reference_time=0)  # Remove the singleton dimension
-        ds = ds.assign_coords(forecast_period=ds.time.values)
-        ds = ds.drop_vars(["time"])
-        ds = ds.rename({'forecast_period': 'time'})
-        
-        return ds
-    
-    
-    def _decompose_into_subqueries(self, hq: HarpQuery) -> list[HarpQuery]:
-        """
-        Decompose the query as a (series of) CDS query for the missing data,
-        One query per day,
-        Split the times by their ref times (00:00 or 12:00 per days)
-        Rationnale:
-            We need to make one query per reference timestamp, instead of per day
-        
-        """
-        
-        timesteps = self.timespecs.get_encompassing_timesteps(hq.time)
-        latest_pub_ref = self.timespecs_ref.get_encompassing_timesteps(datetime.now() - self.latency_ref)[0]
-        ref_times = {}
-        
-        for timestep in timesteps:
-            res = self.timespecs_ref.get_encompassing_timesteps(timestep)
-            lower_ref = res[0]
-            
-            ref = lower_ref
-            
-
-            if lower_ref < latest_pub_ref: # No NRT forecast (in between actualizations)
-                ref = lower_ref
-                 
-            elif lower_ref > latest_pub_ref and not self.allow_extended_forecast:
-                raise InvalidQueryError("Querying outside of restricted forecast (>11h leadtime) without setting allow_extended_forecast param. \nTry setting allow_extended_forecast=True in the provider constructor")
-                
-            else:
-                ref = latest_pub_ref
-            
-            req_lead = timestep - ref
-            max_lead = timedelta(hours=self.max_leadtime)
-            
-            if req_lead > max_lead: # means ref == latest
-                raise InvalidQueryError("Querying outside of Forecast range "
-                    + f"\n\tavailable: {latest_pub_ref} + {self.max_leadtime}h max"
-                    + f"\n\trequested: {latest_pub_ref} + {int(req_lead.total_seconds() / 3600)}h"
-            )
-            
-            if not ref in ref_times: ref_times[ref] = []
-            ref_times[ref] += [timestep]
-        
-        queries = []
-        for rt, timesteps in ref_times.items(): # format one query per ref time
-            
-            hqs = HarpQuery(
-                variables   = hq.variables, 
-                timesteps   = timesteps, 
-                area        = hq.area, 
-                levels      = hq.levels, 
-                offline     = hq.offline,
-                ref_time    = rt,
-            )
-            hqs.extra["day"] = date(rt.year, rt.month, rt.day)
-            
-            queries.append(hqs)
-            
-        return queries
\ No newline at end of file
@@ -1,21 +1,22 @@
-from datetime import date, datetime, timedelta
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Literal
 
+import numpy as np
 import xarray as xr
 
 from core import log
 from core.static import interface
 
-from harp._backend._utils.HarpErrors import InvalidQueryError
 from harp._backend.harp_query import HarpQuery
 from harp._backend.baseprovider import BaseDatasetProvider
 from harp._backend.timerange import Timerange
 from harp._backend.timespec import RegularTimespec
 from harp._backend import cds
+from harp._backend import vertical
 
 
-class GlobalForecastVolumetric(cds.CdsDatasetProvider): 
+class GlobalForecastVolumetric(cds.CdsForecastDatasetProvider): 
     
     url = "https://ads.atmosphere.copernicus.eu/api"
     keywords = ["ECMWF", "Copernicus", "atmosphere"]
@@ -43,16 +44,20 @@ class GlobalForecastVolumetric(cds.CdsDatasetProvider):
     ]
     
     model_levels = [i for i in range(1, 61)] # 60 model levels starting at 1
+    model_levels_table = Path(__file__).parent / "tables" / "GlobalForecast" / "cams_model_levels_l60.csv" # hybrid coefficients
     
     
     def __init__(self, variables: dict[str: str], config: dict={}, 
         *, 
         allow_extended_forecast: bool = False,
-        mode: Literal["pressure", "model"] = "pressure"
+        mode: Literal["pressure", "model"] = "pressure",
+        prefer: Literal["latest", "cached", "max_age"] = "latest",
+        max_age: timedelta = None,
     ):
         
         self.allow_extended_forecast = allow_extended_forecast
         self.mode = mode
+        self._set_forecast_policy(prefer, max_age)
         
         assert mode in ["pressure", "model"]
         
@@ -76,25 +81,109 @@ class GlobalForecastVolumetric(cds.CdsDatasetProvider):
         
         
         
+    def _get_init_kwargs(self) -> dict:
+        return dict(allow_extended_forecast=self.allow_extended_forecast, mode=self.mode, prefer=self.prefer, max_age=self.max_age)
+    
+    
     # overload baseprovider definition to add parameters
     def get(self,
             time: datetime, # type dictates if dt or range
-            levels: list[int] = pressure_levels,
+            levels: list[int] = None,
             area: list = None, # [N, W, S, E]
+            ref_time: datetime = None,
             **kwargs,  # catch-all for additional keyword arguments
             ) -> xr.Dataset:
         """
         Get a dataset from the provider, with the specified parameters
         Args:
             time (datetime): single datetime of query
-            levels (list[int], optional): list of pressure levels to query. Defaults to all available levels.
+            levels (list[int], optional): list of pressure levels (hPa) to query, interpolated in log-pressure if not available. 
+                Defaults to all available pressure levels (pressure mode), or to the native model levels (model mode).
             area (list, optional): [N, W, S, E] bounding box of query. Defaults to None (global).
+            ref_time (datetime, optional): forecast run to use. Defaults to None (latest run available for time).
             **kwargs: additional keyword arguments to pass to the provider (not used currently)
+        
+        In model mode, the pressure levels are interpolated from all the model levels, their pressure is computed per column
+        from the surface pressure (lnsp) and the hybrid coefficients of the model levels (see vertical.hybrid_pressure)
         """
         
-        levels = [str(i) for i in levels]
+        query_levels = [str(i) for i in self._get_query_levels(levels)]
             
-        return BaseDatasetProvider.get(self, time=time, levels=levels, area=area,**kwargs)
+        ds = BaseDatasetProvider.get(self, time=time, levels=query_levels, area=area, ref_time=ref_time, **kwargs)
+        
+        if self.mode == "pressure":
+            return vertical.select_pressure_levels(ds, levels or self.pressure_levels)
+        
+        if levels is None:
+            return ds
+        
+        lnsp = BaseDatasetProvider.get(self._get_lnsp_provider(), time=time, levels=["1"], area=area, ref_time=ref_time, **kwargs)
+        
+        return self._to_pressure_levels(ds, lnsp, levels)
+    
+    
+    def get_forecast(self,
+            ref_time: datetime,
+            leadtimes: list[int] = None,
+            area: list = None, # [N, W, S, E]
+            levels: list[int] = None,
+            **kwargs,
+            ) -> xr.Dataset:
+        """
+        Get a whole forecast run, see CdsForecastDatasetProvider.get_forecast
+        Args:
+            levels (list[int], optional): list of pressure levels (hPa) to query, interpolated in log-pressure if not available (see get). 
+                Defaults to all available pressure levels (pressure mode), or to the native model levels (model mode).
+        """
+        
+        query_levels = [str(i) for i in self._get_query_levels(levels)]
+        
+        ds = cds.CdsForecastDatasetProvider.get_forecast(self, ref_time, leadtimes, area=area, levels=query_levels, **kwargs)
+        
+        if self.mode == "pressure":
+            return vertical.select_pressure_levels(ds, levels or self.pressure_levels)
+        
+        if levels is None:
+            return ds
+        
+        lnsp = cds.CdsForecastDatasetProvider.get_forecast(self._get_lnsp_provider(), ref_time, leadtimes, area=area, levels=["1"], **kwargs)
+        
+        return self._to_pressure_levels(ds, lnsp, levels)
+    
+    
+    def _get_query_levels(self, levels: list) -> list:
+        """
+        Pressure levels which are not available are interpolated from the bracketing available levels
+        In model mode, all the model levels are queried (the pressure of a model level varies per column)
+        """
+        
+        if self.mode == "model":
+            return self.model_levels
+        
+        return vertical.get_query_levels(levels or self.pressure_levels, self.pressure_levels)
+    
+    
+    def _get_lnsp_provider(self) -> "GlobalForecastVolumetric":
+        """
+        Provider of the logarithm of surface pressure, only available at model level 1, queried apart from the other variables
+        """
+        return type(self)(variables=dict(lnsp="lnsp"), config=self.get_config(), **self._get_init_kwargs())
+    
+    
+    def _to_pressure_levels(self, ds: xr.Dataset, lnsp: xr.Dataset, levels: list[float]) -> xr.Dataset:
+        """
+        Interpolates ds from the model levels to the pressure levels (hPa)
+        """
+        
+        a, b = vertical.read_hybrid_coefficients(self.model_levels_table)
+        
+        index = ds[vertical.model_level_name].values.astype(int) - 1 # model levels start at 1
+        surface_pressure = np.exp(lnsp["lnsp"].isel({vertical.model_level_name: 0}, drop=True))
+        
+        pressure = vertical.hybrid_pressure(a[index], b[index], surface_pressure)
+        
+        return vertical.to_pressure_levels(ds, levels, pressure=pressure)
+    
     
     # @interface
     def _execute_cds_request(self, target_filepath: Path, hq: HarpQuery):
@@ -124,76 +213,6 @@ class GlobalForecastVolumetric(cds.CdsDatasetProvider):
         if hq.area is not None: 
             request['area'] = hq.area
             
-        client = cds.auth.get_client(self.url)
-        client.retrieve(dataset, request, target_filepath)
+        self._retrieve(dataset, request, target_filepath, hq)
         
         return
-        
-        
-    def _standardize_time(self, ds: xr.Dataset):
-        """
-        from time dims = (forecast_reference_time, forecast_perdiod) to (time)
-        """
-        ds = ds.isel(forecast_reference_time=0)  # Remove the singleton dimension
-        ds = ds.assign_coords(forecast_period=ds.time.values)
-        ds = ds.drop(["time"])
-        ds = ds.rename({'forecast_period': 'time'})
-        
-        return ds
-    
-    
-    def _decompose_into_subqueries(self, hq: HarpQuery) -> list[HarpQuery]:
-        """
-        Decompose the query as a (series of) CDS query for the missing data,
-        One query per day,
-        Split the times by their ref times (00:00 or 12:00 per days)
-        Rationnale:
-            We need to make one query per reference timestamp, instead of per day
-        
-        """
-        
-        timesteps = self.timespecs.get_encompassing_timesteps(hq.time)
-        latest_pub_ref = self.timespecs_ref.get_encompassing_timesteps(datetime.now() - self.latency_ref)[0]
-        
-        ref_times = {}
-        
-        for timestep in timesteps:
-            res = self.timespecs_ref.get_encompassing_timesteps(timestep)
-            lower_ref = res[0]
-            
-            ref = lower_ref
-            
-            # Timerange error management  
-            if lower_ref > latest_pub_ref and not self.allow_extended_forecast:
-                    raise InvalidQueryError("Querying outside of restricted forecast (>11h leadtime) without setting allow_extended_forecast param. \nTry setting allow_extended_forecast=True in the provider constructor")
-            else:
-                ref = latest_pub_ref
-            
-            req_lead = timestep - ref
-            max_lead = timedelta(hours=self.max_leadtime)
-            
-            if req_lead > max_lead: # means ref == latest
-                raise InvalidQueryError("Querying outside of Forecast range "
-                    + f"\n\tavailable: {latest_pub_ref} + {self.max_leadtime}h max"
-                    + f"\n\trequested: {latest_pub_ref} + {int(req_lead.total_seconds() / 3600)}h"
-            )
-            
-            if not ref in ref_times: ref_times[ref] = []
-            ref_times[ref] += [timestep]
-        
-        queries = []
-        for rt, timesteps in ref_times.items(): # format one query per ref time
-            
-            hqs = HarpQuery(
-                variables   = hq.variables, 
-                timesteps   = timesteps, 
-                area        = hq.area, 
-                levels      = hq.levels, 
-                offline     = hq.offline,
-                ref_time    = rt,
-            )
-            hqs.extra["day"] = date(rt.year, rt.month, rt.day)
-            
-            queries.append(hqs)
-            
-        return queries
\ No newline at end of file
@@ -52,13 +52,13 @@ class GlobalReanalysis(cds.CdsDatasetProvider):
     # @interface
     def _execute_cds_request(self, target_filepath: Path, hq: HarpQuery):
         
-        times = [t.strftime("%H:%M") for t in hq.timesteps]
-        d = hq.extra["day"]
+        times = sorted({t.strftime("%H:%M") for t in hq.timesteps}) # same times each day
+        days = self._get_request_days(hq)
         
         dataset = self.name
         request = {
                 "variable":     hq.variables,
-                'date':         [d.strftime("%Y-%m-%d")],       # "date": ["2023-12-01/2023-12-01"],
+                'date':         [d.strftime("%Y-%m-%d") for d in days],       # "date": ["2023-12-01/2023-12-01"],
                 "time":         times,
                 "data_format":      "netcdf",
                 "download_format":  "unarchived"
@@ -68,8 +68,7 @@ class GlobalReanalysis(cds.CdsDatasetProvider):
         if hq.area is not None: 
             request['area'] = hq.area
             
-        client = cds.auth.get_client(self.url)
-        client.retrieve(dataset, request, target_filepath)
+        self._retrieve(dataset, request, target_filepath, hq)
         
         return
    
\ No newline at end of file
@@ -9,6 +9,7 @@ from harp._backend.baseprovider import BaseDatasetProvider
 from harp._backend.timerange import Timerange
 from harp._backend.timespec import RegularTimespec
 from harp._backend import cds
+from harp._backend import vertical
 
 import xarray as xr
 
@@ -35,6 +36,9 @@ class GlobalReanalysisVolumetric(cds.CdsDatasetProvider):
     
     
     def __init__(self, variables: dict[str: str], config: dict={}, allow_slow_access=False):
+        
+        self.allow_slow_access = allow_slow_access
+        
         folder = Path(__file__).parent / "tables" / "GlobalReanalysis"
         files = [
             # folder / "cams_ra_table1.csv",            # single level
@@ -56,8 +60,13 @@ class GlobalReanalysisVolumetric(cds.CdsDatasetProvider):
             files += slow_access_files
         
         super().__init__(csv_files=files, variables=variables, config=config)
-
-        # overload baseprovider definition to add parameters
+    
+    
+    def _get_init_kwargs(self) -> dict:
+        return dict(allow_slow_access=self.allow_slow_access)
+    
+    
+    # overload baseprovider definition to add parameters
     def get(self,
             time: datetime, # type dictates if dt or range
             area: list = None, # [N, W, S, E]
@@ -68,26 +77,29 @@ class GlobalReanalysisVolumetric(cds.CdsDatasetProvider):
         Get a dataset from the provider, with the specified parameters
         Args:
             time (datetime): single datetime of query
-            levels (list[int], optional): list of pressure levels to query. Defaults to all available levels.
+            levels (list[int], optional): list of pressure levels to query, interpolated in log-pressure if not available. Defaults to all available levels.
             area (list, optional): [N, W, S, E] bounding box of query. Defaults to None (global).
             **kwargs: additional keyword arguments to pass to the provider (not used currently)
         """
         
-        levels = [str(i) for i in levels]
+        query_levels = vertical.get_query_levels(levels, self.pressure_levels)
+        query_levels = [str(i) for i in query_levels]
             
-        return BaseDatasetProvider.get(self, time=time, levels=levels, area=area, **kwargs)
+        ds = BaseDatasetProvider.get(self, time=time, levels=query_levels, area=area, **kwargs)
+        
+        return vertical.select_pressure_levels(ds, levels)
 
     
     # @interface
     def _execute_cds_request(self, target_filepath: Path, hq: HarpQuery):
         
-        times = [t.strftime("%H:%M") for t in hq.timesteps]
-        d = hq.extra["day"]
+        times = sorted({t.strftime("%H:%M") for t in hq.timesteps}) # same times each day
+        days = self._get_request_days(hq)
         
         dataset = self.name
         request = {
                 "variable":     hq.variables,
-                'date':         [d.strftime("%Y-%m-%d")],       # "date": ["2023-12-01/2023-12-01"],
+                'date':         [d.strftime("%Y-%m-%d") for d in days],       # "date": ["2023-12-01/2023-12-01"],
                 "time":         times,
                 
                 "pressure_level": hq.levels,
@@ -99,8 +111,7 @@ class GlobalReanalysisVolumetric(cds.CdsDatasetProvider):
         if hq.area is not None: 
             request['area'] = hq.area
             
-        client = cds.auth.get_client(self.url)
-        client.retrieve(dataset, request, target_filepath)
+        self._retrieve(dataset, request, target_filepath, hq)
         
         return
    
\ No newline at end of file
@@ -45,7 +45,7 @@ class GlobalReanalysis(cds.CdsDatasetProvider):
     def _execute_cds_request(self, target_filepath: Path, hq: HarpQuery):
         
         # TODO area
-        times = [t.strftime("%H:%M") for t in hq.timesteps]
+        times = sorted({t.strftime("%H:%M") for t in hq.timesteps}) # same times each day
         
         dataset = self.name
         request = {
@@ -54,7 +54,7 @@ class GlobalReanalysis(cds.CdsDatasetProvider):
                 "variable":     hq.variables,
                 "year":         hq.extra["day"].year,
                 "month":        hq.extra["day"].month,
-                "day":          hq.extra["day"].day,
+                "day":          [d.day for d in self._get_request_days(hq)], # days of the same month
                 "time":         times,
                 
                 "data_format":      "netcdf",
@@ -67,7 +67,6 @@ class GlobalReanalysis(cds.CdsDatasetProvider):
         
         # if area is not None: 
             # request['area'] = area
-        client = cds.auth.get_client(self.url)
-        client.retrieve(dataset, request, target_filepath)
+        self._retrieve(dataset, request, target_filepath, hq)
         
         return
@@ -9,6 +9,7 @@ from harp._backend.baseprovider import BaseDatasetProvider
 from harp._backend.timerange import Timerange
 from harp._backend.timespec import RegularTimespec
 from harp._backend import cds
+from harp._backend import vertical
 
 import xarray as xr
 
@@ -53,19 +54,22 @@ class GlobalReanalysisVolumetric(cds.CdsDatasetProvider):
         Get a dataset from the provider, with the specified parameters
         Args:
             time (datetime): single datetime of query
-            levels (list[int], optional): list of pressure levels to query. Defaults to all available levels.
+            levels (list[int], optional): list of pressure levels to query, interpolated in log-pressure if not available. Defaults to all available levels.
             area (list, optional): [N, W, S, E] bounding box of query. Defaults to None (global).
             **kwargs: additional keyword arguments to pass to the provider (not used currently)
         """
-        levels = [str(i) for i in levels]
+        query_levels = vertical.get_query_levels(levels, self.pressure_levels)
+        query_levels = [str(i) for i in query_levels]
             
-        return BaseDatasetProvider.get(self, time=time, levels=levels, area=area, **kwargs)
+        ds = BaseDatasetProvider.get(self, time=time, levels=query_levels, area=area, **kwargs)
+        
+        return vertical.select_pressure_levels(ds, levels)
         
     
     # @interface
     def _execute_cds_request(self, target_filepath: Path, hq: HarpQuery):
         
-        times = [t.strftime("%H:%M") for t in hq.timesteps]
+        times = sorted({t.strftime("%H:%M") for t in hq.timesteps}) # same times each day
         
         dataset = self.name
         request = {
@@ -74,7 +78,7 @@ class GlobalReanalysisVolumetric(cds.CdsDatasetProvider):
                 "variable":     hq.variables,
                 "year":         hq.extra["day"].year,
                 "month":        hq.extra["day"].month,
-                "day":          hq.extra["day"].day,
+                "day":          [d.day for d in self._get_request_days(hq)], # days of the same month
                 "time":         times,
                 "pressure_level": hq.levels,
                 
@@ -86,8 +90,7 @@ class GlobalReanalysisVolumetric(cds.CdsDatasetProvider):
         if hq.area is not None: 
             request['area'] = hq.area
             
-        client = cds.auth.get_client(self.url)
-        client.retrieve(dataset, request, target_filepath)
+        self._retrieve(dataset, request, target_filepath, hq)
         
         return
    
\ No newline at end of file
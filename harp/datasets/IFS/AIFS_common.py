@@ -1,12 +1,12 @@
 from datetime import datetime, timedelta
 from pathlib import Path
-import requests
 
 from core.static import abstract, interface
 from core import log, rgb
 import xarray as xr
 
-from harp.datasets.HarpDataset import HarpDataset
+import harp.config
+from harp.datasets.IFS import opendata_availability
 
 
 
@@ -22,61 +22,26 @@ class AIFS_common:
         if leadtime > 360: return False # goes up ‥ T+360h
         return (leadtime % 6) == 0      # AIFS leadtimes are 6h based
     
-    def _time_is_available(time: datetime) -> bool:
+    def _time_is_available(time: datetime, dir_storage: Path = None) -> bool:
         """
         Check if datetime is available for IFS opendata download
         This is common to all IFS datasets
         """        
         
-        now = datetime.now()
-        delta = now - time 
+        if dir_storage is None:
+            dir_storage = harp.config.default_config.get("dir_storage")
         
-        if delta.days > 3: return False             # too old
-        if delta.total_seconds() < 0: return False  # is in the future
-        if delta.total_seconds() < 3600 * 12:       # doubt, checking
-            times = AIFS_common.parse_available_times(only_today=True)
-            return time in times
-        return True
+        return opendata_availability.get_catalog(dir_storage).is_available(time)
     
-    def _parse_available_times(only_today=False):
+    def _parse_available_times(dir_storage: Path = None) -> list[datetime]:
         """
-        Parses available times with requests calls and html parsing
+        Returns the available times from the (cached) open data availability catalog
         """
-        url = "https://data.ecmwf.int/forecasts/"
-        
-        days = []
-        if not only_today:
-            req = requests.get(url)
-            # TODO check the request status
-            
-            # parse HTML
-            days = req.text.split("\n")
-            days = [l for l in days if "forecasts/20" in l]
-            days = [l.split("/\">")[1].split("/</a>")[0] for l in days]
-            
-        elif only_today: # avoid parsing unambigous days
-            days = [datetime.now().strftime("%Y%m%d")]
-        
-        times = []
-        for day in days: 
-            req = requests.get(url + day)
-            # TODO check the request status
-            
-            # parse html 
-            hours = req.text.split("\n")
-            hours = [l for l in hours if "z/" in l]
-            hours = [l.split("z/\">")[1].split("z/</a>")[0] for l in hours]
-            
-            time = datetime.strptime(day, "%Y%m%d")
-            for h in hours:
-                ntime = datetime(time.year, time.month, time.day, int(h))
-                times.append(ntime)
-            
-        return times
+        return opendata_availability.get_catalog(dir_storage).get_available_times()
     
-    def _validate_request(time: datetime, leadtime: int):
+    def _validate_request(time: datetime, leadtime: int, dir_storage: Path = None):
         
-        ta = AIFS_common._time_is_available(time)
+        ta = AIFS_common._time_is_available(time, dir_storage)
         if not ta:
             message = f"Requested reference time {time} is not available in AIFS."
             log.error(message)
@@ -0,0 +1,189 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import hashlib
+import json
+import os
+import re
+
+import requests
+
+from core import log
+
+from harp._backend._utils import ComputeLock
+
+
+class OpenDataAvailability:
+    """
+    Catalog of the forecast runs published on ECMWF open data (data.ecmwf.int/forecasts)
+
+    Kept in memory and on disk (under dir_storage) to be shared between processes, refreshed once expired (ttl):
+        - days which are not listed anymore are dropped
+        - only the new days and the days with missing runs are parsed again
+    After a failed refresh, the cached catalog (possibly empty) is used as is until retry_ttl has passed
+    """
+
+    url = "https://data.ecmwf.int/forecasts/"
+    filename = "opendata_availability.json"
+    runs_per_day = 4 # 00z, 06z, 12z, 18z
+
+    def __init__(self, dir_storage: Path = None, ttl: timedelta = timedelta(minutes=30), url: str = None,
+                 retry_ttl: timedelta = timedelta(minutes=1)):
+        """
+        Args:
+            dir_storage (Path, optional): harp cache directory. Defaults to None (in memory only).
+            ttl (timedelta, optional): time after which the catalog is refreshed. Defaults to 30 minutes.
+            url (str, optional): root of the forecasts listing. Defaults to data.ecmwf.int (class attribute).
+            retry_ttl (timedelta, optional): time before retrying a failed refresh. Defaults to 1 minute.
+        """
+
+        self.url      = url or self.url
+        self.filepath = None if dir_storage is None else Path(dir_storage) / "IFS" / self.filename
+        self.ttl      = ttl
+        self.retry_ttl = retry_ttl
+        
+        if self.url != OpenDataAvailability.url and self.filepath is not None: # mirror, distinct catalog file
+            h = hashlib.blake2b(self.url.encode("utf-8"), digest_size=8).hexdigest()
+            self.filepath = self.filepath.with_name(f"{self.filepath.stem}_{h}.json")
+
+        self._days    = {}   # "%Y%m%d" -> list of run hours
+        self._updated = None # datetime of the last refresh
+        self._failed_at = None # datetime of the last failed refresh
+
+
+    def is_available(self, time: datetime) -> bool:
+        """
+        True if the forecast run starting at time is published
+        """
+
+        self._refresh_if_expired()
+
+        if time.minute != 0 or time.second != 0: return False
+
+        return time.hour in self._days.get(time.strftime("%Y%m%d"), [])
+
+
+    def get_available_times(self) -> list[datetime]:
+
+        self._refresh_if_expired()
+
+        times = []
+        for day, hours in self._days.items():
+            d = datetime.strptime(day, "%Y%m%d")
+            times += [d + timedelta(hours=h) for h in hours]
+
+        return sorted(times)
+
+
+    def _is_fresh(self) -> bool:
+        return self._updated is not None and datetime.now() - self._updated < self.ttl
+
+
+    def _is_failing(self) -> bool:
+        return self._failed_at is not None and datetime.now() - self._failed_at < self.retry_ttl
+
+
+    def _refresh_if_expired(self):
+
+        if self._is_fresh(): return
+
+        self._load() # refreshed by another process
+        if self._is_fresh() or self._is_failing(): return
+
+        if self.filepath is None:
+            self._refresh()
+            return
+
+        lock = ComputeLock(self.filepath.with_suffix(".lock"), lifetime=timedelta(minutes=5))
+
+        with lock.locked():
+            self._load() # refreshed while waiting for the lock
+            if self._is_fresh() or self._is_failing(): return
+
+            self._refresh()
+            self._save()
+
+
+    def _refresh(self):
+
+        log.debug(f"Refreshing ECMWF open data availability from {self.url}")
+
+        try:
+            listed = self._parse_links(self._fetch(self.url), r"\d{8}")
+            days = {}
+
+            for day in listed:
+                hours = self._days.get(day, [])
+
+                if len(hours) < self.runs_per_day: # new day or runs still being published
+                    runs  = self._parse_links(self._fetch(self.url + day + "/"), r"\d{2}z")
+                    hours = sorted(int(r.removesuffix("z")) for r in runs)
+
+                days[day] = hours
+
+        except requests.RequestException as e:
+            log.warning(f"Could not refresh ECMWF open data availability ({e}), using cached catalog")
+            self._failed_at = datetime.now()
+            return
+
+        self._days    = days
+        self._updated = datetime.now()
+        self._failed_at = None
+
+
+    def _fetch(self, url: str) -> str:
+
+        req = requests.get(url, timeout=30)
+        req.raise_for_status()
+
+        return req.text
+
+
+    def _parse_links(self, html: str, pattern: str) -> list[str]:
+        """
+        Returns the directory listing entries matching pattern (ex: 20250101 or 00z)
+        """
+
+        names = [href.rstrip("/").split("/")[-1] for href in re.findall(r'href="([^"]+/)"', html)]
+
+        return [n for n in names if re.fullmatch(pattern, n)]
+
+
+    def _load(self):
+
+        if self.filepath is None or not self.filepath.is_file(): return
+
+        try:
+            data = json.loads(self.filepath.read_text())
+        except json.JSONDecodeError:
+            return
+
+        updated = datetime.fromisoformat(data["updated"])
+        if self._updated is None or updated > self._updated:
+            self._days    = data["days"]
+            self._updated = updated
+
+
+    def _save(self):
+
+        if self._updated is None: return # refresh failed
+
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp = self.filepath.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(dict(updated=self._updated.isoformat(), days=self._days)))
+        os.replace(tmp, self.filepath) # atomic, readers never see a partial file
+
+
+_catalogs = {}
+
+def get_catalog(dir_storage: Path = None, url: str = None) -> OpenDataAvailability:
+    """
+    Returns the catalog shared by the current process for this cache directory
+    """
+
+    key = (None if dir_storage is None else str(dir_storage), url)
+
+    if key not in _catalogs:
+        _catalogs[key] = OpenDataAvailability(dir_storage, url=url)
+
+    return _catalogs[key]
@@ -0,0 +1,20 @@
+"""
+Dataset collections, imported on first access (ex: harp.datasets.ERA5)
+"""
+
+import importlib
+
+
+_collections = ["AIFS", "CAMS", "ERA5", "IFS", "MERRA2"]
+
+
+def __getattr__(name):
+
+    if name in _collections:
+        return importlib.import_module(f"{__name__}.{name}")
+
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+def __dir__():
+    return sorted(list(globals()) + _collections)
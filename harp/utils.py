@@ -1,2 +1,3 @@
 from harp._backend.computable import Computable
 from harp._backend.timerange import Timerange
+from harp._backend.vertical import to_pressure_levels, to_altitudes, hybrid_pressure
@@ -0,0 +1,106 @@
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from tempfile import TemporaryDirectory
+from functools import partial
+from pathlib import Path
+import threading
+import json
+
+import pytest
+import numpy as np
+
+from harp.datasets import AIFS
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Minimal static server supporting single range requests (as data.ecmwf.int)
+    """
+    
+    ranges = []
+    
+    def send_head(self):
+        
+        path = Path(self.translate_path(self.path))
+        if "Range" not in self.headers or not path.is_file():
+            return super().send_head()
+        
+        start, end = [int(b) for b in self.headers["Range"].removeprefix("bytes=").split("-")]
+        self.ranges.append((path.name, start, end))
+        data = path.read_bytes()[start:end+1]
+        
+        self.send_response(206)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def log_message(self, *args):
+        pass
+
+
+def write_grib_and_index(filepath: Path, leadtime: int):
+    """
+    Writes an open data like GRIB2 file (2t, 10u, msl, t on 2 levels) and its .index sidecar
+    """
+    
+    import eccodes
+    
+    messages = [
+        ("regular_ll_sfc_grib2", "2t",  "sfc", None),
+        ("regular_ll_sfc_grib2", "10u", "sfc", None),
+        ("regular_ll_sfc_grib2", "msl", "sfc", None),
+        ("regular_ll_pl_grib2",  "t",   "pl",  500),
+        ("regular_ll_pl_grib2",  "t",   "pl",  850),
+    ]
+    
+    offset, data, index = 0, b"", []
+    for i, (sample, param, levtype, level) in enumerate(messages):
+        h = eccodes.codes_grib_new_from_samples(sample)
+        eccodes.codes_set(h, "shortName", param)
+        eccodes.codes_set(h, "dataDate", 20250101)
+        eccodes.codes_set(h, "forecastTime", leadtime)
+        if level is not None: eccodes.codes_set(h, "level", level)
+        eccodes.codes_set(h, "Ni", 180) # global in longitude (2°), as the open data grids
+        eccodes.codes_set(h, "longitudeOfLastGridPointInDegrees", 358)
+        eccodes.codes_set_values(h, np.full(180*31, 10.0 * i + leadtime))
+        message = eccodes.codes_get_message(h)
+        eccodes.codes_release(h)
+        
+        entry = dict(date="20250101", time="0000", step=str(leadtime), param=param, levtype=levtype, _offset=offset, _length=len(message))
+        if level is not None: entry["levelist"] = str(level)
+        index.append(json.dumps(entry))
+        
+        data += message
+        offset += len(message)
+    
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    filepath.write_bytes(data)
+    filepath.with_suffix(".index").write_text("\n".join(index))
+
+
+@pytest.fixture
+def opendata_server(monkeypatch):
+    """
+    Serves AIFS open data like forecasts (leadtimes 0, 6 and 12h of 2025-01-01 00z), 
+    yields the list of the range requests received
+    """
+    
+    pytest.importorskip("eccodes")
+    pytest.importorskip("cfgrib")
+    
+    with TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        
+        for leadtime in [0, 6, 12]:
+            write_grib_and_index(root / "forecasts/20250101/00z/aifs-single/0p25/oper" / f"20250101000000-{leadtime}h-oper-fc.grib2", leadtime)
+        
+        RangeRequestHandler.ranges = []
+        server = ThreadingHTTPServer(("127.0.0.1", 0), partial(RangeRequestHandler, directory=str(root)))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        
+        url = f"http://127.0.0.1:{server.server_address[1]}/forecasts/"
+        monkeypatch.setattr(AIFS.GlobalForecast, "url", url)
+        monkeypatch.setattr(AIFS.GlobalForecastVolumetric, "url", url)
+        
+        yield RangeRequestHandler.ranges
+        
+        server.shutdown()
@@ -0,0 +1,97 @@
+from tempfile import TemporaryDirectory
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+import numpy as np
+
+from harp.datasets import AIFS
+from harp._backend.opendata.opendata_dataset_provider import merge_ranges
+
+pytest.importorskip("eccodes")
+pytest.importorskip("cfgrib")
+
+
+def test_merge_ranges():
+    assert merge_ranges([(10, 20), (0, 10), (30, 40), (35, 50)]) == [(0, 20), (30, 50)]
+
+
+def test_partial_download(opendata_server):
+    
+    with TemporaryDirectory() as tmpdir:
+        config = dict(dir_storage = Path(tmpdir))
+        
+        aifs = AIFS.GlobalForecast(variables=dict(temperature_2m="t2m", wind_10u="u10"), config=config)
+        ds = aifs.get(time=datetime(2025, 1, 1, 9))
+        
+        assert list(ds.time.values.astype("datetime64[h]").astype(int) % 24) == [6, 12]
+        np.testing.assert_allclose(ds["temperature_2m"].isel(time=0), 6)
+        np.testing.assert_allclose(ds["wind_10u"].isel(time=1), 22)
+        
+        # only the 2 adjacent messages are downloaded, in a single range request per leadtime
+        assert len(opendata_server) == 2
+        assert all(start == 0 for _, start, _ in opendata_server)
+        
+        # served from the cache
+        aifs.get(time=datetime(2025, 1, 1, 9))
+        assert len(opendata_server) == 2
+
+
+def test_partial_download_levels(opendata_server):
+    
+    with TemporaryDirectory() as tmpdir:
+        config = dict(dir_storage = Path(tmpdir))
+        
+        aifs = AIFS.GlobalForecastVolumetric(variables=dict(temperature="t"), config=config)
+        ds = aifs.get(time=datetime(2025, 1, 1, 6), levels=[850])
+        
+        assert list(ds.pressure_level.values) == [850]
+        np.testing.assert_allclose(ds["temperature"], 46)
+        assert len(opendata_server) == 1
+
+
+def test_units_resolved_at_download(opendata_server, monkeypatch):
+    
+    from harp._backend.opendata import opendata_dataset_provider
+    
+    class NewRunCatalog: # a run published after the download, not available on the server
+        def get_available_times(self):
+            return [datetime(2025, 1, 1, 0), datetime(2025, 1, 1, 6)]
+    
+    download = AIFS.GlobalForecast._download_subqueries
+    
+    def _download_then_publish(self, subqueries):
+        download(self, subqueries)
+        monkeypatch.setattr(opendata_dataset_provider.opendata_availability, "get_catalog", lambda *a, **k: NewRunCatalog())
+    
+    monkeypatch.setattr(AIFS.GlobalForecast, "_download_subqueries", _download_then_publish)
+    
+    with TemporaryDirectory() as tmpdir:
+        aifs = AIFS.GlobalForecast(variables=dict(temperature_2m="t2m"), config=dict(dir_storage = Path(tmpdir)))
+        ds = aifs.get(time=datetime(2025, 1, 1, 9))
+        
+        np.testing.assert_allclose(ds["temperature_2m"].isel(time=0), 6)
+
+
+def test_server_ignoring_ranges(opendata_server, monkeypatch):
+    
+    import requests
+    
+    calls = []
+    get = requests.Session.get
+    
+    def _get(self, url, headers=None, **kwargs):
+        calls.append(url)
+        return get(self, url, **kwargs) # Range header dropped: the whole file is returned (200)
+    
+    monkeypatch.setattr(requests.Session, "get", _get)
+    
+    with TemporaryDirectory() as tmpdir:
+        aifs = AIFS.GlobalForecast(variables=dict(temperature_2m="t2m", msl="msl"), config=dict(dir_storage = Path(tmpdir)))
+        ds = aifs.get(time=datetime(2025, 1, 1, 6))
+        
+        np.testing.assert_allclose(ds["temperature_2m"], 6)
+        np.testing.assert_allclose(ds["msl"], 26)
+        
+        # 2t and msl are not adjacent (2 ranges): the GRIB file is downloaded once
+        assert len([c for c in calls if c.endswith(".grib2")]) == 1
@@ -1,5 +1,7 @@
 from tempfile import TemporaryDirectory
 import pytest
+import numpy as np
+import xarray as xr
 from harp.datasets import CAMS
 from tests.GenericDatasetTester import GenericDatasetTester
 
@@ -7,6 +9,7 @@ from datetime import datetime, timedelta
 from pathlib import Path
 
 from harp._backend._utils.HarpErrors import *
+from harp._backend.harp_query import HarpQuery
 
 
 def test_metatest():
@@ -67,3 +70,96 @@ def test_ok_forecast_within_range():
         ds = cams.get(time = ext)
         
         
+
+
+def test_get_forecast_single_request():
+    
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        config = dict(dir_storage = tmpdir)
+    
+        cams = CAMS.GlobalForecast(
+            config = config,
+            variables = {"water_vapor" : "tcwv"},
+        )
+        
+        ref_time = cams._get_latest_published_ref() - timedelta(days=1)
+        ds = cams.get_forecast(ref_time, leadtimes=range(0, 25, 6), area=[10, -10, -10, 10])
+        
+        assert ds.time.size == 5
+        
+        # served from the ref_time cache
+        ds = cams.get(time=ref_time + timedelta(hours=13, minutes=30), ref_time=ref_time, area=[10, -10, -10, 10], offline=True)
+        assert "water_vapor" in ds
+
+
+def test_get_forecast_decomposition():
+    
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        config = dict(dir_storage = tmpdir)
+    
+        cams = CAMS.GlobalForecast(config=config, variables={"water_vapor" : "tcwv"})
+        ref_time = cams._get_latest_published_ref()
+        
+        hq = HarpQuery(variables=["tcwv"], timesteps=[ref_time + timedelta(hours=h) for h in range(0, 121)], ref_time=ref_time)
+        assert len(cams._decompose_into_subqueries(hq)) == 1
+        
+        hq.extra["block_size"] = 48
+        assert [len(q.timesteps) for q in cams._decompose_into_subqueries(hq)] == [48, 48, 25]
+        
+        # not published yet
+        with pytest.raises(InvalidQueryError):
+            hq = HarpQuery(variables=["tcwv"], timesteps=[ref_time + timedelta(hours=12)], ref_time=ref_time + timedelta(hours=12))
+            cams._decompose_into_subqueries(hq)
+        
+        # outside of the run
+        with pytest.raises(InvalidQueryError):
+            hq = HarpQuery(variables=["tcwv"], timesteps=[ref_time + timedelta(hours=121)], ref_time=ref_time)
+            cams._decompose_into_subqueries(hq)
+
+
+def test_forecast_policy_serves_cached_run(monkeypatch):
+    
+    requests = []
+    
+    def fake_download_subqueries(self, subqueries):
+        # replaces the CDS requests: records them and writes the expected atomic slices
+        for hqs in subqueries:
+            requests.append(hqs)
+            ds = xr.Dataset(
+                {self.nomenclature.untranslate_query_name(v): (("time", "latitude", "longitude"), np.zeros((len(hqs.timesteps), 2, 2))) for v in hqs.variables},
+                coords = dict(time=hqs.timesteps, latitude=[1., 0.], longitude=[0., 1.]),
+            )
+            self._split_and_store_atomic(ds, hqs)
+    
+    monkeypatch.setattr(CAMS.GlobalForecast, "_download_subqueries", fake_download_subqueries)
+    
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        config = dict(dir_storage = tmpdir)
+        
+        latest = CAMS.GlobalForecast(config=config, variables={"water_vapor" : "tcwv"})
+        older_ref = latest._get_latest_published_ref() - timedelta(days=1)
+        latest.get_forecast(older_ref, leadtimes=range(0, 61))
+        assert len(requests) == 1
+        
+        time = older_ref + timedelta(days=1, hours=12, minutes=30) # covered by newer runs
+        
+        for prefer, max_age, nrequests in [
+            ("cached",  None,                 1), # served from the older run
+            ("max_age", timedelta(hours=24),  1),
+            ("max_age", timedelta(hours=12),  2), # older run is too old
+            ("latest",  None,                 2), # latest run fetched by the previous get
+        ]:
+            cams = CAMS.GlobalForecast(config=config, variables={"water_vapor" : "tcwv"}, allow_extended_forecast=True, prefer=prefer, max_age=max_age)
+            cams.get(time=time)
+            assert len(requests) == nrequests, prefer
+
+
+def test_cached_ref_time_without_variables(tmp_path):
+    
+    cams = CAMS.GlobalForecast(config=dict(dir_storage=tmp_path), variables={"water_vapor" : "tcwv"}, prefer="cached")
+    hq = HarpQuery(variables=[], time=datetime(2024, 1, 1, 12))
+    
+    assert cams._get_cached_ref_time(hq, datetime(2024, 1, 1, 12), datetime(2024, 1, 1)) is None
@@ -1,6 +1,10 @@
 from tempfile import TemporaryDirectory
+import numpy as np
 import pytest
+import xarray as xr
 from harp.datasets import CAMS
+from harp._backend import vertical
+from harp._backend.baseprovider import BaseDatasetProvider
 from tests.GenericDatasetTester import GenericDatasetTester
 
 from datetime import datetime, timedelta
@@ -71,3 +75,38 @@ def test_ok_forecast_within_range():
         ds = cams.get(time = ext)
         
         
+
+
+def test_model_levels_to_pressure_levels(monkeypatch, tmp_path):
+    
+    a, b = vertical.read_hybrid_coefficients(CAMS.GlobalForecastVolumetric.model_levels_table)
+    sp = np.array([[1e5, 8e4]]) # Pa, per column
+    queried = []
+    
+    def fake_get(self, time, levels, area=None, ref_time=None, **kwargs):
+        queried.append((list(self.variables), levels))
+        model_level = [int(lv) for lv in levels]
+        coords = dict(time=[time], model_level=model_level, latitude=[0.], longitude=[0., 1.])
+        
+        if "lnsp" in self.variables:
+            values = np.log(sp)[None, None]
+        else: # log of the pressure of the model levels
+            index = np.array(model_level) - 1
+            values = np.log(a[index, None, None] + b[index, None, None] * sp[None] )[None] - np.log(100)
+        
+        return xr.Dataset(dict({list(self.variables)[0]: (("time", "model_level", "latitude", "longitude"), values)}), coords=coords)
+    
+    monkeypatch.setattr(BaseDatasetProvider, "get", fake_get)
+    
+    cams = CAMS.GlobalForecastVolumetric(variables=dict(temperature="t"), config=dict(dir_storage=tmp_path), mode="model")
+    time = datetime(2024, 1, 1)
+    
+    # native model levels by default
+    assert cams.get(time=time).model_level.size == 60
+    assert queried[-1] == (["temperature"], [str(lv) for lv in cams.model_levels])
+    
+    ds = cams.get(time=time, levels=[700, 300])
+    
+    assert ds.temperature.dims == ("time", "pressure_level", "latitude", "longitude")
+    assert queried[-1] == (["lnsp"], ["1"])
+    np.testing.assert_allclose(ds.temperature.isel(time=0, latitude=0), np.log([[700, 700], [300, 300]]), rtol=1e-10)
@@ -7,4 +7,105 @@ from tests.GenericDatasetTester import GenericDatasetTester
 def test_metatest():
     
     variables = dict(wind_10u = "u10", wind_10v = "v10")
-    GenericDatasetTester.test_basic_get(ERA5.GlobalReanalysis, variables=variables)
\ No newline at end of file
+    GenericDatasetTester.test_basic_get(ERA5.GlobalReanalysis, variables=variables)
+
+def test_staged_payload_resumed(monkeypatch, tmp_path):
+    """
+    A payload whose slices could not all be stored is ingested by the next call, without downloading it again
+    """
+    
+    import numpy as np
+    import xarray as xr
+    from datetime import datetime
+    from harp._backend.baseprovider import BaseDatasetProvider
+    
+    provider = ERA5.GlobalReanalysis(variables=dict(wind_10u="u10", wind_10v="v10"), config=dict(dir_storage=tmp_path))
+    
+    requests = []
+    def _execute_cds_request(target_filepath, hq):
+        requests.append(hq.variables)
+        ds = xr.Dataset(
+            {provider.nomenclature.untranslate_query_name(v): (("valid_time", "latitude", "longitude"), np.full((len(hq.timesteps), 3, 4), float(i)))
+                for i, v in enumerate(hq.variables)},
+            coords = dict(valid_time=np.array(hq.timesteps, dtype="datetime64[ns]"), latitude=[50., 49., 48.], longitude=[0., 1., 2., 3.]),
+        )
+        ds.to_netcdf(target_filepath)
+    monkeypatch.setattr(provider, "_execute_cds_request", _execute_cds_request)
+    
+    store = BaseDatasetProvider._store_atomic_slices
+    def _killed(self, slices, tiled):
+        store(self, slices[:1], tiled)
+        raise KeyboardInterrupt # process killed while storing
+    
+    time = datetime(2020, 1, 1, 12)
+    with monkeypatch.context() as m:
+        m.setattr(BaseDatasetProvider, "_store_atomic_slices", _killed)
+        with pytest.raises(KeyboardInterrupt):
+            provider.get(time=time)
+    
+    assert len(requests) == 1
+    assert len(list((tmp_path / "staging").glob("*.nc"))) == 1
+    assert not list(tmp_path.rglob("*.tmp"))
+    
+    ds = provider.get(time=time)
+    
+    assert len(requests) == 1 # resumed from the staged payload
+    assert not list((tmp_path / "staging").glob("*.nc"))
+    assert set(ds.data_vars) == {"wind_10u", "wind_10v"}
+
+
+def test_staged_payload_kept_on_store_error(monkeypatch, tmp_path):
+    """
+    Errors while storing the slices of a staged payload are raised, the payload is kept
+    """
+    
+    import json
+    import numpy as np
+    import xarray as xr
+    from datetime import datetime
+    from harp._backend.baseprovider import BaseDatasetProvider
+    from harp._backend.harp_query import HarpQuery
+    
+    provider = ERA5.GlobalReanalysis(variables=dict(wind_10u="u10"), config=dict(dir_storage=tmp_path))
+    
+    def _execute_cds_request(target_filepath, hq):
+        if hq.timesteps[0].day == 2:
+            raise RuntimeError("request failed")
+        ds = xr.Dataset(
+            {"u10": (("valid_time", "latitude", "longitude"), np.zeros((len(hq.timesteps), 2, 2)))},
+            coords = dict(valid_time=np.array(hq.timesteps, dtype="datetime64[ns]"), latitude=[1., 0.], longitude=[0., 1.]),
+        )
+        ds.to_netcdf(target_filepath)
+    monkeypatch.setattr(provider, "_execute_cds_request", _execute_cds_request)
+    
+    def _no_space(self, slices, tiled):
+        raise OSError(28, "No space left on device")
+    
+    time = datetime(2020, 1, 1, 12)
+    staging = tmp_path / "staging"
+    
+    with monkeypatch.context() as m:
+        m.setattr(BaseDatasetProvider, "_store_atomic_slices", _no_space)
+        with pytest.raises(OSError):
+            provider.get(time=time)
+        with pytest.raises(OSError): # resumed, fails again
+            provider.get(time=time)
+    
+    assert len(list(staging.glob("*.nc"))) == 1
+    provider.get(time=time)
+    assert not list(staging.iterdir())
+    
+    # failed requests and interrupted downloads leave nothing behind
+    failing = datetime(2020, 1, 2, 12)
+    hq = HarpQuery(variables=[provider.nomenclature.translate_to_query_name("u10")], timesteps=[failing])
+    hq.extra["day"] = failing.date()
+    with pytest.raises(RuntimeError):
+        provider._download_subqueries([hq])
+    assert not list(staging.iterdir())
+    
+    hq.timesteps = [datetime(2020, 1, 3, 12)]
+    payload = provider._get_staged_payload_path(hq)
+    payload.with_suffix(".json").write_text(json.dumps(hq.to_dict()))
+    payload.with_name(payload.name + ".part").write_bytes(b"partial")
+    provider._resume_staged_payloads()
+    assert not list(staging.iterdir())
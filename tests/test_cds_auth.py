@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import pytest
+
+from harp._backend.cds import auth
+
+pytest.importorskip("cdsapi")
+
+
+@pytest.fixture
+def dotrc(monkeypatch, tmp_path):
+    path = tmp_path / ".cdsapirc"
+    path.write_text("url: https://cds.climate.copernicus.eu/api\nkey: 12345:fake-key\n")
+    monkeypatch.setenv("CDSAPI_RC", str(path))
+    monkeypatch.setattr(auth, "_clients", {})
+    monkeypatch.setattr(auth, "_configs", {})
+    return path
+
+
+def test_client_reused(dotrc, monkeypatch):
+    
+    calls = []
+    read_config = auth._read_config
+    monkeypatch.setattr(auth, "_read_config", lambda path: calls.append(path) or read_config(path))
+    
+    url = "https://cds.climate.copernicus.eu/api"
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        clients = list(pool.map(lambda _: auth.get_client(url), range(32)))
+    
+    assert all(c is clients[0] for c in clients)
+    assert len(calls) == 1 # credentials parsed once
+    
+    ads = auth.get_client("https://ads.atmosphere.copernicus.eu/api")
+    assert ads is not clients[0]
+    assert ads.session is not clients[0].session # the legacy client sets its credentials on its session
+
+
+def test_client_credentials_modified(dotrc):
+    
+    url = "https://cds.climate.copernicus.eu/api"
+    client = auth.get_client(url)
+    
+    dotrc.write_text("url: https://cds.climate.copernicus.eu/api\nkey: 12345:new-key\n")
+    os.utime(dotrc, ns=(0, dotrc.stat().st_mtime_ns + 10**9))
+    
+    assert auth.get_client(url) is not client
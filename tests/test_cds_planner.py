@@ -0,0 +1,145 @@
+from datetime import date, datetime
+
+import numpy as np
+import xarray as xr
+
+from harp.datasets import ERA5
+from harp._backend import cds
+from harp._backend.cds import cds_planner
+from harp._backend.harp_query import HarpQuery
+
+
+def day_query(variables, day: date, hours, levels=None) -> HarpQuery:
+    hq = HarpQuery(
+        variables = variables,
+        timesteps = [datetime(day.year, day.month, day.day, h) for h in hours],
+        levels    = levels,
+    )
+    hq.extra["day"] = day
+    return hq
+
+
+class FakeClient:
+    """
+    Legacy cdsapi like client, charging each request with the cost of its shape
+    """
+
+    def __init__(self, cost: cds_planner.CostModel, rename=lambda v: v):
+        self.cost = cost
+        self.rename = rename # query names -> names in the downloaded files
+        self.requests = []
+        self.total = 0
+
+    def retrieve(self, dataset, request, target):
+
+        days  = [date(request["year"], request["month"], d) for d in request["day"]]
+        times = [datetime.combine(d, datetime.strptime(t, "%H:%M").time()) for d in days for t in request["time"]]
+
+        fields = len(request["variable"]) * len(times)
+        assert fields <= self.cost.max_fields, "request rejected by the server"
+
+        self.requests.append(request)
+        self.total += self.cost.request_cost + self.cost.field_cost * fields
+
+        ds = xr.Dataset(
+            {self.rename(v): (("valid_time", "latitude", "longitude"), np.zeros((len(times), 2, 2))) for v in request["variable"]},
+            coords = dict(valid_time=np.array(times, dtype="datetime64[ns]"), latitude=[1., 0.], longitude=[0., 1.]),
+        )
+        ds.to_netcdf(target)
+
+
+def test_merge_days_of_a_month():
+
+    cost = cds_planner.CostModel(max_fields=1000, request_cost=60, field_cost=0.05)
+    subqueries = [day_query(["u10"], date(2020, 1, d), [0, 12]) for d in [1, 2, 3]]
+
+    requests = cds_planner.plan(subqueries, cost)
+
+    assert len(requests) == 1
+    assert requests[0].extra["days"] == [date(2020, 1, 1), date(2020, 1, 2), date(2020, 1, 3)]
+    assert len(requests[0].timesteps) == 6
+
+
+def test_no_merge_across_months():
+
+    cost = cds_planner.CostModel(max_fields=1000, request_cost=60, field_cost=0.05)
+    subqueries = [day_query(["u10"], date(2020, 1, 31), [23]), day_query(["u10"], date(2020, 2, 1), [0])]
+
+    assert len(cds_planner.plan(subqueries, cost)) == 2
+
+
+def test_no_merge_when_more_expensive():
+
+    # merging would download the product of the variables and times (4 x 24 fields instead of 2 x 24)
+    cost = cds_planner.CostModel(max_fields=10_000, request_cost=1, field_cost=1)
+    subqueries = [
+        day_query(["u10", "v10"], date(2020, 1, 1), range(12)),
+        day_query(["t2m", "msl"], date(2020, 1, 2), range(12, 24)),
+    ]
+
+    assert len(cds_planner.plan(subqueries, cost)) == 2
+
+
+def test_split_oversized():
+
+    cost = cds_planner.CostModel(max_fields=100, request_cost=60, field_cost=0.05)
+    subqueries = [day_query(["u", "v", "t"], date(2020, 1, 1), range(24), levels=[500, 850])]
+
+    requests = cds_planner.plan(subqueries, cost)
+
+    assert all(cost.get_fields(r) <= cost.max_fields for r in requests)
+    assert {(v, t) for r in requests for v in r.variables for t in r.timesteps} == \
+           {(v, t) for v in ["u", "v", "t"] for t in subqueries[0].timesteps}
+
+
+def test_forecasts_not_merged():
+
+    cost = cds_planner.CostModel()
+    subqueries = [day_query(["u10"], date(2020, 1, d), [0]) for d in [1, 2]]
+    for hq in subqueries:
+        hq.ref_time = datetime.combine(hq.extra["day"], datetime.min.time())
+
+    assert len(cds_planner.plan(subqueries, cost)) == 2
+
+
+def test_provider_requests_cost(monkeypatch, tmp_path):
+    """
+    The requests of the missing days are merged, and cost less than one request per day
+    """
+
+    cost = cds_planner.CostModel(max_fields=30, request_cost=60, field_cost=0.05)
+
+    provider = ERA5.GlobalReanalysis(variables=dict(wind_10u="u10", wind_10v="v10"), config=dict(dir_storage=tmp_path))
+    monkeypatch.setattr(provider, "cost_model", cost)
+
+    client = FakeClient(cost, rename=provider.nomenclature.untranslate_query_name)
+    monkeypatch.setattr(cds.auth, "get_client", lambda url: client)
+
+    variables = [provider.nomenclature.translate_to_query_name(v) for v in ["u10", "v10"]]
+    subqueries = [day_query(variables, date(2020, 1, d), range(0, 24, 6)) for d in range(1, 6)]
+    naive = sum(cost(q) for q in subqueries)
+
+    provider._download_subqueries(subqueries)
+
+    assert 1 < len(client.requests) < len(subqueries) # merged, under the fields limit
+    assert client.total < naive
+    assert len(list(tmp_path.rglob("*_v04.nc"))) == 2 * 5 * 4
+
+
+def test_merged_requests_share_day_locks(tmp_path):
+    """
+    Requests merged differently lock the per day parts they share
+    """
+
+    provider = ERA5.GlobalReanalysis(variables=dict(wind_10u="u10"), config=dict(dir_storage=tmp_path))
+    cost = cds_planner.CostModel(max_fields=1000, request_cost=60, field_cost=0.05)
+
+    variables = [provider.nomenclature.translate_to_query_name("u10")]
+    merged = cds_planner.plan([day_query(variables, date(2020, 1, d), [0, 12]) for d in [1, 2, 3]], cost)[0]
+    single = cds_planner.plan([day_query(variables, date(2020, 1, 2), [0, 12])], cost)[0]
+
+    paths = lambda hq: {lock.filepath for lock in provider._get_day_locks(hq)}
+
+    assert len(paths(merged)) == 3
+    assert paths(single) < paths(merged)
+    assert provider._get_hashed_query_lockfile_path(single) != provider._get_hashed_query_lockfile_path(merged)
@@ -0,0 +1,139 @@
+from tempfile import TemporaryDirectory
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+import numpy as np
+import xarray as xr
+
+from harp.datasets import AIFS
+from harp.utils import Computable
+
+
+def wind_product(ds):
+    return ds["t2m"] * ds["u10"]
+
+def test_persisted_computable(opendata_server):
+    
+    with TemporaryDirectory() as tmpdir:
+        config = dict(dir_storage = Path(tmpdir))
+        comp = Computable(func=wind_product, operands=["t2m", "u10"], persist=True, version="1")
+        
+        aifs = AIFS.GlobalForecast(variables=dict(product=comp), config=config)
+        ds = aifs.get(time=datetime(2025, 1, 1, 6))
+        
+        np.testing.assert_allclose(ds["product"], 6 * 16)
+        assert list(ds.data_vars) == ["product"]
+        
+        stored = list(Path(tmpdir).rglob(f"*{comp.get_storage_name()}*.nc"))
+        assert len(stored) == 1
+        
+        # operands are not needed anymore
+        for f in Path(tmpdir).rglob("*_v04.nc"):
+            if f not in stored: f.unlink()
+        
+        ds = aifs.get(time=datetime(2025, 1, 1, 6), offline=True)
+        np.testing.assert_allclose(ds["product"], 6 * 16)
+        assert len(opendata_server) == 1
+        
+        # another version is computed again
+        aifs = AIFS.GlobalForecast(variables=dict(product=Computable(func=wind_product, operands=["t2m", "u10"], persist=True, version="2")), config=config)
+        with pytest.raises(FileNotFoundError):
+            aifs.get(time=datetime(2025, 1, 1, 6), offline=True)
+    
+    with pytest.raises(ValueError):
+        Computable(func=lambda ds: ds["t2m"], operands=["t2m"], persist=True)
+
+def test_computable_graph(opendata_server):
+    
+    calls = []
+    
+    def doubled(ds):
+        calls.append("doubled")
+        return ds["t2m"] * 2
+    
+    def total(ds):
+        return ds["doubled"] + ds["u10"]
+    
+    def ratio(ds):
+        return ds["total"] / ds["doubled"]
+    
+    shared = Computable(func=doubled, operands=["t2m"])
+    
+    with TemporaryDirectory() as tmpdir:
+        aifs = AIFS.GlobalForecast(config=dict(dir_storage = Path(tmpdir)), variables=dict(
+            ratio = Computable(func=ratio, operands=["total", shared]), # depends on another computable
+            total = Computable(func=total, operands=[shared, "u10"]),
+        ))
+        ds = aifs.get(time=datetime(2025, 1, 1, 6))
+        
+        assert calls == ["doubled"] # shared intermediate evaluated once
+        assert sorted(ds.data_vars) == ["ratio", "total"] # intermediates and operands are dropped
+        assert ds["ratio"].chunks is not None # lazy
+        
+        np.testing.assert_allclose(ds["total"], 2 * 6 + 16)
+        np.testing.assert_allclose(ds["ratio"], (2 * 6 + 16) / 12)
+    
+    with TemporaryDirectory() as tmpdir:
+        aifs = AIFS.GlobalForecast(config=dict(dir_storage = Path(tmpdir)), variables=dict(
+            a = Computable(func=total, operands=["b"]),
+            b = Computable(func=total, operands=["a"]),
+        ))
+        with pytest.raises(ValueError):
+            aifs.get(time=datetime(2025, 1, 1, 6))
+
+
+def test_persisted_computable_interrupted(opendata_server, monkeypatch):
+    
+    from harp._backend import baseprovider
+    
+    comp = Computable(func=wind_product, operands=["t2m", "u10"], persist=True, version="1")
+    write = baseprovider.to_netcdf
+    
+    def _killed(ds, filename, **kwargs):
+        if comp.get_storage_name() in ds.data_vars:
+            Path(filename).write_bytes(b"truncated")
+            raise KeyboardInterrupt
+        return write(ds, filename, **kwargs)
+    
+    with TemporaryDirectory() as tmpdir:
+        aifs = AIFS.GlobalForecast(variables=dict(product=comp), config=dict(dir_storage = Path(tmpdir)))
+        
+        with monkeypatch.context() as m:
+            m.setattr(baseprovider, "to_netcdf", _killed)
+            with pytest.raises(KeyboardInterrupt):
+                aifs.get(time=datetime(2025, 1, 1, 6))
+        
+        # no truncated slice in place: computed and stored again
+        assert not list(Path(tmpdir).rglob(f"*{comp.get_storage_name()}*_v04.nc"))
+        np.testing.assert_allclose(aifs.get(time=datetime(2025, 1, 1, 6))["product"], 6 * 16)
+        assert len(list(Path(tmpdir).rglob(f"*{comp.get_storage_name()}*_v04.nc"))) == 1
+
+
+def test_persisted_computable_named_operand(opendata_server):
+    
+    def doubled(ds):
+        return ds["t2m"] * 2
+    
+    def product(ds):
+        return ds["doubled"] * ds["u10"]
+    
+    def variables(version):
+        return dict(
+            doubled = Computable(func=doubled, operands=["t2m"], version=version),
+            product = Computable(func=product, operands=["doubled", "u10"], persist=True, version="1"),
+        )
+    
+    with TemporaryDirectory() as tmpdir:
+        config = dict(dir_storage = Path(tmpdir))
+        
+        aifs = AIFS.GlobalForecast(variables=variables("1"), config=config)
+        np.testing.assert_allclose(aifs.get(time=datetime(2025, 1, 1, 6))["product"], 2 * 6 * 16)
+        aifs.get(time=datetime(2025, 1, 1, 6), offline=True)
+        
+        # the computable operand changed: product is computed and stored again, under another name
+        aifs2 = AIFS.GlobalForecast(variables=variables("2"), config=config)
+        assert aifs2._get_storage_name(aifs2.variables["product"]) != aifs._get_storage_name(aifs.variables["product"])
+        
+        aifs2.get(time=datetime(2025, 1, 1, 6), offline=True)
+        assert len(list(Path(tmpdir).rglob("*computed-product-*_v04.nc"))) == 2
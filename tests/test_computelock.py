@@ -0,0 +1,59 @@
+from tempfile import TemporaryDirectory
+from pathlib import Path
+import subprocess
+import socket
+import sys
+import os
+
+from harp._backend._utils import ComputeLock
+
+
+def test_lock_release():
+
+    with TemporaryDirectory() as tmpdir:
+        lock = ComputeLock(Path(tmpdir) / "test.lock")
+
+        with lock.locked():
+            assert lock.is_locked()
+
+        assert lock.is_free()
+
+
+def test_lock_from_dead_process_is_stale():
+
+    with TemporaryDirectory() as tmpdir:
+        lockfile = Path(tmpdir) / "test.lock"
+
+        # pid of a process which has terminated
+        proc = subprocess.Popen([sys.executable, "-c", "pass"])
+        proc.wait()
+
+        lockfile.write_text(f"{socket.gethostname()}:{proc.pid}")
+
+        lock = ComputeLock(lockfile, timeout=2)
+        assert not lock.is_locked()
+        assert not lockfile.exists()
+
+
+def test_lock_from_alive_process_is_kept():
+
+    with TemporaryDirectory() as tmpdir:
+        lockfile = Path(tmpdir) / "test.lock"
+        lockfile.write_text(f"{socket.gethostname()}:{os.getpid()}")
+
+        lock = ComputeLock(lockfile, timeout=2)
+        assert lock.is_locked()
+
+
+def test_try_acquire_is_exclusive():
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with TemporaryDirectory() as tmpdir:
+        lockfile = Path(tmpdir) / "test.lock"
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            acquired = list(pool.map(lambda _: ComputeLock(lockfile).try_acquire(), range(32)))
+
+        assert acquired.count(True) == 1
+        assert lockfile.read_text() == f"{socket.gethostname()}:{os.getpid()}"
@@ -0,0 +1,41 @@
+from tempfile import TemporaryDirectory
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+import numpy as np
+import xarray as xr
+
+from harp.datasets import AIFS
+from harp._backend import harp_open
+
+
+def test_get_array(opendata_server, monkeypatch):
+    
+    with TemporaryDirectory() as tmpdir:
+        config = dict(dir_storage = Path(tmpdir))
+        
+        aifs = AIFS.GlobalForecast(variables=dict(temperature_2m="t2m"), config=config)
+        ref = aifs.get(time=datetime(2025, 1, 1, 6))["temperature_2m"].isel(time=0)
+        
+        values, lat, lon = aifs.get_array("temperature_2m", datetime(2025, 1, 1, 6))
+        
+        np.testing.assert_array_equal(values, ref.values)
+        np.testing.assert_array_equal(lat, ref.latitude)
+        np.testing.assert_array_equal(lon, ref.longitude)
+        assert not values.flags.writeable
+        
+        # repeated calls are served from memory
+        with monkeypatch.context() as m:
+            m.setattr(AIFS.GlobalForecast, "_download", lambda *a, **k: pytest.fail("storage unit resolved again"))
+            m.setattr(harp_open.netCDF4, "Dataset", lambda *a, **k: pytest.fail("slice read from disk"))
+            for _ in range(10):
+                assert np.shares_memory(aifs.get_array("temperature_2m", datetime(2025, 1, 1, 6))[0], values)
+        
+        # raw names, areas
+        values, lat, lon = aifs.get_array("t2m", datetime(2025, 1, 1, 12), area=[40, 10, 20, 30])
+        assert values.shape == (lat.size, lon.size) == (11, 11)
+        np.testing.assert_allclose(values, 12)
+        
+        with pytest.raises(ValueError): # between 2 timesteps
+            aifs.get_array("temperature_2m", datetime(2025, 1, 1, 9))
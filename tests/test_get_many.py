@@ -0,0 +1,51 @@
+from tempfile import TemporaryDirectory
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+import numpy as np
+
+import harp
+from harp.datasets import ERA5, CAMS
+
+
+def test_get_many_matches_get():
+
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        config = dict(dir_storage = tmpdir)
+
+        era5 = ERA5.GlobalReanalysis(config=config, variables=dict(wind_10u = "u10"))
+        time = era5.timerange.end - timedelta(days=500) # inside CAMS reanalysis timerange
+        area = [10, -10, -10, 10] # [N, W, S, E]
+
+        dss = harp.get_many([
+                (era5, None),
+                (CAMS.GlobalReanalysis, dict(wind_10v = "v10")),
+            ],
+            time=time,
+            area=area,
+            config=config,
+        )
+
+        assert list(dss.keys()) == ["ERA5.GlobalReanalysis", "CAMS.GlobalReanalysis"]
+        assert "wind_10u" in dss["ERA5.GlobalReanalysis"].data_vars
+        assert "wind_10v" in dss["CAMS.GlobalReanalysis"].data_vars
+
+        # results are the same as individual get calls (now cached -> offline)
+        ds = era5.get(time=time, area=area, offline=True)
+        np.testing.assert_allclose(ds["wind_10u"], dss["ERA5.GlobalReanalysis"]["wind_10u"])
+
+
+def test_get_many_duplicate_keys():
+
+    with TemporaryDirectory() as tmpdir:
+        config = dict(dir_storage = Path(tmpdir))
+
+        with pytest.raises(KeyError):
+            harp.get_many([
+                    (ERA5.GlobalReanalysis, ["u10"]),
+                    (ERA5.GlobalReanalysis, ["v10"]),
+                ],
+                time=None, config=config,
+            )
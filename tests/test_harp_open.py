@@ -0,0 +1,191 @@
+from datetime import datetime, timedelta
+from tempfile import TemporaryDirectory
+from pathlib import Path
+import os
+
+import numpy as np
+import xarray as xr
+import pytest
+
+from harp._backend import harp_open
+from harp._backend.harp_query import HarpAtomicStorageUnit
+
+
+def write_slices(folder: Path, variables: list[str], times: list[datetime], levels: list[int] = None):
+    
+    units, files = [], []
+    for v in variables:
+        for t in times:
+            dims   = ["time", "latitude", "longitude"]
+            coords = dict(time=[t], latitude=[10.0, 0.0, -10.0], longitude=[-20.0, 0.0, 20.0, 40.0])
+            if levels is not None:
+                dims.insert(1, "pressure_level")
+                coords["pressure_level"] = levels
+            
+            data = np.random.rand(*[len(coords[d]) for d in dims]).astype("float32")
+            data[..., 0, 0] = np.nan
+            
+            ds = xr.Dataset({v: (dims, data, dict(units="K"))}, coords=coords)
+            
+            unit = HarpAtomicStorageUnit(variable=v, time=t, levels=levels)
+            path = folder / unit.get_subpath("TEST")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            ds.to_netcdf(path, engine="netcdf4")
+            
+            units.append(unit)
+            files.append(path)
+    
+    return units, files
+
+
+def test_template_follows_file(monkeypatch):
+    
+    times = [datetime(2020, 1, 1), datetime(2020, 1, 2)]
+    monkeypatch.setattr(harp_open, "_templates", type(harp_open._templates)())
+    
+    with TemporaryDirectory() as tmpdir:
+        units, files = write_slices(Path(tmpdir), ["t2m"], times)
+        
+        template = harp_open.get_template(files[0], "t2m")
+        assert harp_open.get_template(files[1], "t2m") is template
+        
+        # the source of the template is stored again (ex: by another process)
+        os.utime(files[0], ns=(0, 0))
+        assert harp_open.get_template(files[1], "t2m") is not template
+        
+        # bounded, least recently used first
+        monkeypatch.setattr(harp_open, "max_templates", 2)
+        for levels in [[500], [850], [1000]]:
+            harp_open.get_template(files[0], "t2m", levels=levels)
+        assert len(harp_open._templates) == 2
+        
+        harp_open.drop_templates(files[0], ["t2m"])
+        assert len(harp_open._templates) == 0
+
+
+@pytest.mark.parametrize("levels", [None, [500, 850]])
+def test_open_atomic_slices_matches_open_mfdataset(levels):
+    
+    times = [datetime(2020, 1, 1) + timedelta(hours=h) for h in range(0, 48, 6)]
+    
+    with TemporaryDirectory() as tmpdir:
+        units, files = write_slices(Path(tmpdir), ["t2m", "sp"], times, levels=levels)
+        
+        ref = xr.open_mfdataset(files, engine="netcdf4").load()
+        
+        # units order should not matter
+        ds = harp_open.open_atomic_slices(units[::-1], files[::-1])
+        assert ds["t2m"].chunks is not None # lazy
+        
+        xr.testing.assert_identical(ds.load(), ref)
+
+
+def test_template_is_reused():
+    
+    times = [datetime(2020, 1, 1), datetime(2020, 1, 2)]
+    
+    with TemporaryDirectory() as tmpdir:
+        units, files = write_slices(Path(tmpdir), ["t2m"], times)
+        
+        harp_open.open_atomic_slices(units, files)
+        ntemplates = len(harp_open._templates)
+        
+        more_units, more_files = write_slices(Path(tmpdir), ["t2m"], [datetime(2020, 1, 3)])
+        ds = harp_open.open_atomic_slices(units + more_units, files + more_files)
+        
+        assert len(harp_open._templates) == ntemplates
+        assert ds.time.size == 3
+
+
+@pytest.mark.parametrize("levels", [None, [500, 850]])
+def test_open_area_window(levels):
+    
+    times = [datetime(2020, 1, 1), datetime(2020, 1, 2)]
+    
+    with TemporaryDirectory() as tmpdir:
+        units, files = write_slices(Path(tmpdir), ["t2m"], times, levels=levels)
+        
+        ref = xr.open_mfdataset(files, engine="netcdf4").load()
+        
+        ds = harp_open.open_atomic_slices(units, files, area=[10, -5, -10, 25])
+        xr.testing.assert_identical(ds.load(), ref.sel(longitude=slice(-5, 25)))
+        
+        with pytest.raises(ValueError):
+            harp_open.open_atomic_slices(units, files, area=[50, -5, 30, 25])
+
+
+def test_slice_cache(monkeypatch):
+    
+    times = [datetime(2020, 1, 1) + timedelta(hours=h) for h in range(4)]
+    
+    with TemporaryDirectory() as tmpdir:
+        units, files = write_slices(Path(tmpdir), ["t2m"], times)
+        
+        cache = harp_open.SliceCache(max_bytes=10**6)
+        monkeypatch.setattr(harp_open, "slice_cache", cache)
+        
+        ref = harp_open.open_atomic_slices(units, files).load()
+        assert all(cache.has_slice(f) for f in files)
+        
+        # neighboring times are read from memory
+        monkeypatch.setattr(harp_open.netCDF4, "Dataset", lambda *a, **k: pytest.fail("slice read from disk"))
+        ds = harp_open.open_atomic_slices(units[1:3], files[1:3]).load()
+        xr.testing.assert_identical(ds, ref.isel(time=[1, 2]))
+        
+        # cached values are not modified through the returned arrays
+        ds["t2m"].values[:] = 0
+        xr.testing.assert_identical(harp_open.open_atomic_slices(units[1:3], files[1:3]).load(), ref.isel(time=[1, 2]))
+
+
+def test_slice_cache_eviction(tmp_path):
+    
+    cache = harp_open.SliceCache(max_bytes=250)
+    window = (slice(None),)
+    
+    for name in ["0", "1", "2", "3", "big"]:
+        (tmp_path / f"{name}.nc").touch()
+    
+    for i in range(3):
+        cache.put(tmp_path / f"{i}.nc", window, np.zeros(10)) # 80 bytes each
+    
+    cache.get(tmp_path / "0.nc", window) # 0 is the most recently used
+    cache.put(tmp_path / "3.nc", window, np.zeros(10))
+    
+    assert [cache.has_slice(tmp_path / f"{i}.nc") for i in range(4)] == [True, False, True, True]
+    assert cache.nbytes == 240
+    
+    cache.put(tmp_path / "big.nc", window, np.zeros(100)) # larger than the cache
+    assert not cache.has_slice(tmp_path / "big.nc")
+    
+    cache.resize(0)
+    assert cache.nbytes == 0 and not cache.has_slice(tmp_path / "0.nc")
+
+
+def test_slice_cache_file_identity(monkeypatch):
+    
+    times = [datetime(2020, 1, 1) + timedelta(hours=h) for h in range(2)]
+    
+    with TemporaryDirectory() as tmpdir:
+        units, files = write_slices(Path(tmpdir), ["t2m"], times)
+        
+        cache = harp_open.SliceCache(max_bytes=10**6)
+        monkeypatch.setattr(harp_open, "slice_cache", cache)
+        
+        # a window of a slice does not stand for the whole slice
+        harp_open.open_atomic_slices(units, files, area=[10, -5, -10, 25]).load()
+        assert not any(cache.has_slice(f) for f in files)
+        
+        ref = harp_open.open_atomic_slices(units, files).load()
+        assert all(cache.has_slice(f) for f in files)
+        
+        # a slice stored again is read again from the disk
+        with xr.open_dataset(files[0]) as ds:
+            ds = ds.load()
+        ds["t2m"].values[:] = ds["t2m"].values + 1
+        ds.to_netcdf(f"{files[0]}.tmp")
+        os.utime(f"{files[0]}.tmp", ns=(0, 0)) # distinct mtime, whatever the file system resolution
+        os.replace(f"{files[0]}.tmp", files[0]) # as the providers store the slices
+        
+        assert not cache.has_slice(files[0])
+        ds = harp_open.open_atomic_slices(units, files).load()
+        xr.testing.assert_identical(ds.isel(time=0), ref.isel(time=0) + 1)
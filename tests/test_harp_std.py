@@ -0,0 +1,42 @@
+import numpy as np
+import xarray as xr
+import pytest
+
+from harp._backend import harp_std
+from harp._backend.harp_query import HarpQuery
+
+
+@pytest.mark.parametrize("area,expected", [
+    ([60, -10, 40, 30],   [[60, -10, 40, 30]]),
+    ([65, 160, 50, -150], [[65, 160, 50, 180], [65, -180, 50, -150]]),
+    ([65, 160, 50, 210],  [[65, 160, 50, 180], [65, -180, 50, -150]]),
+    ([65, 190, 50, 210],  [[65, -170, 50, -150]]),
+    ([65, -10, 50, -20],  [[65, -10, 50, 180], [65, -180, 50, -20]]),
+])
+def test_split_area(area, expected):
+    assert harp_std.split_area(area) == expected
+
+
+def test_stitch_longitudes():
+    
+    lat = [60., 55., 50.]
+    grid = np.arange(-180, 180, 2.5)
+    ds = xr.Dataset(dict(t2m=(("latitude", "longitude"), np.tile(grid, (3, 1)))), coords=dict(latitude=lat, longitude=grid))
+    
+    area = [60, 160, 50, -150]
+    west, east = harp_std.split_area(area)
+    
+    # regional parts, as returned by the providers (the eastern bound 180 is centered to -180)
+    parts = [ds.isel(longitude=(grid >= a[1]) & (grid <= a[3]) | (a[3] == 180) & (grid == -180)) for a in [west, east]]
+    res = harp_std.stitch_longitudes(*parts, area=area)
+    
+    np.testing.assert_array_equal(res.longitude, np.arange(160, 210.1, 2.5))
+    np.testing.assert_array_equal(res.t2m.isel(latitude=0), (res.longitude + 180) % 360 - 180)
+
+
+def test_query_area_crossing_antimeridian():
+    
+    HarpQuery(variables=["t2m"], area=[65, 160, 50, -150])
+    
+    with pytest.raises(AssertionError):
+        HarpQuery(variables=["t2m"], area=[50, 160, 65, -150])
@@ -0,0 +1,77 @@
+from tempfile import TemporaryDirectory
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from harp.datasets.IFS.opendata_availability import OpenDataAvailability
+
+
+listing = {
+    "https://data.ecmwf.int/forecasts/": 
+        '<a href="/forecasts/20250101/">20250101/</a>\n<a href="/forecasts/20250102/">20250102/</a>',
+    "https://data.ecmwf.int/forecasts/20250101/": 
+        '<a href="/forecasts/20250101/00z/">00z/</a>\n<a href="/forecasts/20250101/06z/">06z/</a>'
+        '<a href="/forecasts/20250101/12z/">12z/</a>\n<a href="/forecasts/20250101/18z/">18z/</a>',
+    "https://data.ecmwf.int/forecasts/20250102/": 
+        '<a href="/forecasts/20250102/00z/">00z/</a>',
+}
+
+
+def test_catalog_lookup_and_incremental_refresh(monkeypatch):
+    
+    fetched = []
+    
+    def fake_fetch(self, url):
+        fetched.append(url)
+        return listing[url]
+    
+    monkeypatch.setattr(OpenDataAvailability, "_fetch", fake_fetch)
+    
+    with TemporaryDirectory() as tmpdir:
+        
+        catalog = OpenDataAvailability(Path(tmpdir))
+        assert catalog.is_available(datetime(2025, 1, 1, 18))
+        assert catalog.is_available(datetime(2025, 1, 2, 0))
+        assert not catalog.is_available(datetime(2025, 1, 2, 6))
+        assert len(fetched) == 3
+        
+        # lookups are served from memory
+        catalog.is_available(datetime(2025, 1, 1, 6))
+        assert len(fetched) == 3
+        
+        # shared with other processes through the cache directory
+        other = OpenDataAvailability(Path(tmpdir))
+        assert other.is_available(datetime(2025, 1, 1, 12))
+        assert len(fetched) == 3
+        
+        # once expired, complete days are not parsed again
+        catalog._updated = datetime(2000, 1, 1)
+        (Path(tmpdir) / "IFS" / OpenDataAvailability.filename).unlink()
+        catalog.is_available(datetime(2025, 1, 1, 6))
+        assert fetched[3:] == [OpenDataAvailability.url, OpenDataAvailability.url + "20250102/"]
+
+
+def test_failed_refresh_backoff(monkeypatch):
+    
+    fetched = []
+    
+    def failing_fetch(self, url):
+        fetched.append(url)
+        raise requests.ConnectionError("unreachable")
+    
+    monkeypatch.setattr(OpenDataAvailability, "_fetch", failing_fetch)
+    
+    with TemporaryDirectory() as tmpdir:
+        
+        catalog = OpenDataAvailability(Path(tmpdir))
+        assert not catalog.is_available(datetime(2025, 1, 1, 0))
+        assert len(fetched) == 1
+        
+        # no crawl until the retry time
+        assert not catalog.is_available(datetime(2025, 1, 1, 6))
+        assert len(fetched) == 1
+        
+        monkeypatch.setattr(OpenDataAvailability, "_fetch", lambda self, url: listing[url])
+        catalog._failed_at = datetime(2000, 1, 1)
+        assert catalog.is_available(datetime(2025, 1, 1, 6))
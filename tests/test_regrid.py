@@ -0,0 +1,123 @@
+from datetime import datetime
+from tempfile import TemporaryDirectory
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+import pytest
+
+from harp._backend import regrid
+from harp.datasets import AIFS
+
+
+def make_dataset(res: float = 1.0, nan: bool = False) -> xr.Dataset:
+    
+    lat = np.arange(90, -90 - res / 2, -res)
+    lon = np.arange(-180, 180, res)
+    
+    la, lo = np.meshgrid(lat, lon, indexing="ij")
+    data = np.stack([la + 2 * lo, 300 + np.cos(np.deg2rad(la)) * np.sin(np.deg2rad(lo))]).astype("float32")
+    if nan:
+        data[:, 10:20, 30:50] = np.nan
+    
+    ds = xr.Dataset(
+        dict(t2m=(("time", "latitude", "longitude"), data, dict(units="K"))),
+        coords=dict(time=np.array(["2025-01-01", "2025-01-02"], dtype="datetime64[ns]"), latitude=lat, longitude=lon),
+    )
+    
+    return ds.chunk(time=1)
+
+
+def area_mean(da: xr.DataArray) -> xr.DataArray:
+    return da.weighted(np.cos(np.deg2rad(da.latitude))).mean(["latitude", "longitude"])
+
+
+def test_bilinear():
+    
+    ds = make_dataset()
+    target = dict(latitude=[45.5, 0.25, -30.75], longitude=[-179.5, 0.3, 120.9])
+    
+    res = regrid.regrid(ds, target, method="bilinear")
+    
+    assert res.t2m.dims == ("time", "latitude", "longitude")
+    assert res.t2m.shape == (2, 3, 3)
+    assert res.t2m.attrs["units"] == "K"
+    
+    la, lo = np.meshgrid(target["latitude"], target["longitude"], indexing="ij")
+    np.testing.assert_allclose(res.t2m[0], la + 2 * lo, rtol=1e-5) # exact on a linear field
+
+
+def test_bilinear_periodic():
+    
+    ds = make_dataset()
+    res = regrid.regrid(ds, dict(latitude=[0.], longitude=[179.5]), method="bilinear")
+    
+    # interpolated between 179 and -180 (= 180)
+    np.testing.assert_allclose(res.t2m[1], 300 + 0.5 * (np.sin(np.deg2rad(179)) + np.sin(np.deg2rad(180))), rtol=1e-6)
+
+
+def test_conservative():
+    
+    ds = make_dataset()
+    res = regrid.regrid(ds, 3., method="conservative")
+    
+    assert res.latitude.values[0] > res.latitude.values[-1] # orientation of the source
+    assert res.t2m.shape == (2, 61, 120)
+    
+    np.testing.assert_allclose(area_mean(res.t2m), area_mean(ds.t2m), rtol=1e-6)
+
+
+@pytest.mark.parametrize("method", regrid.methods)
+def test_nan(method):
+    
+    ds = make_dataset(nan=True)
+    res = regrid.regrid(ds, 2., method=method).compute()
+    
+    # missing values are not propagated to the neighbouring cells
+    assert 0 < int(res.t2m.isnull().sum()) <= int(ds.t2m.isnull().sum()) / 4
+    assert np.isfinite(res.t2m.values).any()
+
+
+def test_weights_cache():
+    
+    ds = make_dataset()
+    regrid._weights.clear()
+    
+    with TemporaryDirectory() as tmpdir:
+        res = regrid.regrid(ds, 2., method="conservative", cache_dir=Path(tmpdir))
+        
+        files = list(Path(tmpdir).glob("*.npz"))
+        assert len(files) == 1
+        
+        regrid._weights.clear()
+        mtime = files[0].stat().st_mtime_ns
+        
+        res2 = regrid.regrid(ds, 2., method="conservative", cache_dir=Path(tmpdir))
+        
+        assert files[0].stat().st_mtime_ns == mtime # read from the disk cache
+        xr.testing.assert_allclose(res, res2)
+
+
+def test_invalid():
+    
+    ds = make_dataset()
+    
+    with pytest.raises(ValueError):
+        regrid.regrid(ds, 2., method="nearest")
+    
+    with pytest.raises(TypeError):
+        regrid.regrid(ds, "2deg")
+
+
+def test_target_grid(opendata_server):
+    
+    with TemporaryDirectory() as tmpdir:
+        config = dict(dir_storage = Path(tmpdir))
+        
+        aifs = AIFS.GlobalForecast(variables=dict(temperature_2m="t2m"), config=config)
+        native = aifs.get(time=datetime(2025, 1, 1, 6))
+        ds = aifs.get(time=datetime(2025, 1, 1, 6), target_grid=1.0, regrid_method="conservative")
+        
+        assert ds.latitude.size > native.latitude.size
+        np.testing.assert_allclose(ds["temperature_2m"], 6, rtol=1e-6)
+        assert len(list(Path(tmpdir, "regrid").glob("*.npz"))) == 1
@@ -0,0 +1,116 @@
+import pandas as pd
+import numpy as np
+import pytest
+
+from harp._search import search_engine, search_cfg
+
+
+rows = [
+    "2 metre temperature   t2m",
+    "temperature   t",
+    "total column ozone   gtco3",
+    "surface pressure   sp",
+    "mean sea level pressure   msl",
+    "10 metre u wind component   u10",
+]
+
+@pytest.mark.parametrize("keywords", [
+    ["temperature"], 
+    ["temperatur", "2m"],
+    ["surface pressure"], # quote matching
+    ["pressure", "sea"],
+    ["u10", "wind"],
+    ["o3"],
+])
+@pytest.mark.parametrize("match", [None, "match_exact", "match_strict"])
+def test_search_matches_reference_scoring(keywords, match, monkeypatch):
+    
+    if match is not None: monkeypatch.setattr(search_cfg, match, True)
+    
+    df = pd.DataFrame(dict(search=rows))
+    res = search_engine.search(keywords, df, source_column="search")
+    
+    terms = [k.lower().strip() for k in keywords]
+    expected = [np.clip(search_engine._fuzzy_score(terms, r) / len(terms), 0, None) for r in rows]
+    
+    np.testing.assert_allclose(res["score"].values, expected)
+
+
+def test_search_cache(monkeypatch, tmp_path):
+    
+    from harp._search import search_cache, metadatastore
+    
+    monkeypatch.setenv("HARP_SEARCH_CACHE", str(tmp_path))
+    
+    table, attrs, index = search_cache.load()
+    assert len(attrs) == len(metadatastore._search_data_providers)
+    
+    built = search_engine.search(["temperature"], table, source_column="search", index=index)
+    
+    # served from the cache, without instantiating the providers
+    monkeypatch.setattr(metadatastore, "get_tables", lambda: pytest.fail("search cache not used"))
+    table, attrs, index = search_cache.load()
+    cached = search_engine.search(["temperature"], table, source_column="search", index=index)
+    
+    np.testing.assert_allclose(built["score"].values, cached["score"].values)
+
+
+def test_search_memoization_is_bounded(monkeypatch):
+    
+    monkeypatch.setattr(search_engine, "_indexes", type(search_engine._indexes)())
+    monkeypatch.setattr(search_engine, "max_indexes", 2)
+    monkeypatch.setattr(search_engine, "max_terms", 3)
+    
+    df = pd.DataFrame(dict(search=rows))
+    search_engine.search(["temperature"], df, source_column="search")
+    search_engine.search(["pressure"], df.copy(), source_column="search") # same strings, same index
+    assert len(search_engine._indexes) == 1
+    
+    for i in range(3):
+        search_engine.search(["wind"], pd.DataFrame(dict(search=rows[i:])), source_column="search")
+    assert len(search_engine._indexes) == 2
+    
+    index = search_engine.SearchIndex(rows)
+    for term in ["temperature", "pressure", "wind", "ozone", "sea"]:
+        index.score([term])
+    assert list(index._ratios) == [(t, search_cfg.word_threshold) for t in ["wind", "ozone", "sea"]]
+    
+    assert search_engine._similarity.cache_info().maxsize is not None
+
+
+def test_score_subset_matches_full_scoring():
+    
+    index = search_engine.SearchIndex(rows)
+    subset = np.array([1, 3, 4])
+    
+    np.testing.assert_allclose(index.score(["pressure"], rows=subset), index.score(["pressure"])[subset])
+
+
+def test_facets():
+    
+    from datetime import datetime
+    from harp._search import facets
+    
+    attrs = [
+        dict(dataset="GlobalReanalysis", collection="ERA5", institution="ECMWF", timerange="1940 ‥ T-5days", timeres=24),
+        dict(dataset="M2T1NXSLV", collection="MERRA2", institution="NASA", timerange="1980 ‥ T-45days", timeres=8),
+    ]
+    table = pd.DataFrame(dict(
+        table   = [0, 0, 1, 1],
+        dims    = ["xyt", "xyzt", "xyt", "xyzt"],
+        spatial = ["0.25 x 0.25", "0.25 x 0.25", "0.5 x 0.625", "0.5 x 0.625"],
+    ))
+    
+    select = lambda **f: list(facets.select(table, attrs, f))
+    
+    assert select() == [0, 1, 2, 3]
+    assert select(collection=["era5"]) == [0, 1]
+    assert select(institution=["NASA"], dims=["3D"]) == [3]
+    assert select(steps=["hourly"], dims=["2D"]) == [0]
+    assert select(res=[0.625]) == [2, 3]
+    assert select(sources=["merra2", "slv"], dims=["xyt"]) == [2]
+    assert select(time=["1950-06"]) == [0, 1]
+    assert select(time=[str(datetime.now().year + 1)]) == []
+    
+    with pytest.raises(ValueError):
+        select(spatial=["0.25"])
@@ -0,0 +1,128 @@
+from tempfile import TemporaryDirectory
+from datetime import datetime
+from pathlib import Path
+import threading
+import json
+import time
+
+from harp.datasets import ERA5
+from harp._backend.harp_query import HarpQuery
+from harp._serve.daemon import HarpDaemon, _Batch
+
+
+def test_daemon_merges_and_deduplicates(monkeypatch):
+
+    requests = []
+
+    def fake_download_subqueries(self, subqueries):
+        # replaces the CDS requests: records them and writes the expected atomic slices
+        for hqs in subqueries:
+            requests.append(hqs)
+            for u in self._get_storage_units(hqs):
+                path = self._get_target_file_path(u)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text("")
+
+    monkeypatch.setattr(ERA5.GlobalReanalysis, "_download_subqueries", fake_download_subqueries)
+
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        config = dict(dir_storage = tmpdir)
+
+        daemon = HarpDaemon(tmpdir / "harp.sock", config=config, window=0.5)
+        threading.Thread(target=daemon.serve_forever, daemon=True).start()
+
+        while not (tmpdir / "harp.sock").exists(): time.sleep(0.05)
+
+        def client(variable, time):
+            provider = ERA5.GlobalReanalysis(variables=[variable], config=config)
+            hq = HarpQuery(variables=[provider.nomenclature.translate_to_query_name(variable)], time=time)
+            files = provider.download(hq)
+            assert all(f.is_file() for f in files)
+
+        clients = [
+            threading.Thread(target=client, args=("u10", datetime(2020, 1, 1, 10, 30))),
+            threading.Thread(target=client, args=("v10", datetime(2020, 1, 1, 10, 30))),
+            threading.Thread(target=client, args=("u10", datetime(2020, 1, 1, 10, 30))), # duplicate
+            threading.Thread(target=client, args=("t2m", datetime(2020, 1, 1, 11, 30))),
+        ]
+
+        for c in clients: c.start()
+        for c in clients: c.join()
+
+        daemon.shutdown()
+
+        # all clients served by a single request for the same day
+        assert len(requests) == 1
+        assert len(requests[0].variables) == 3
+        assert len(requests[0].timesteps) == 3
+
+
+def test_daemon_errors_shared_by_waiters(monkeypatch):
+
+    def failing_download_subqueries(self, subqueries):
+        raise RuntimeError("CDS unavailable")
+
+    monkeypatch.setattr(ERA5.GlobalReanalysis, "_download_subqueries", failing_download_subqueries)
+
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        config = dict(dir_storage = tmpdir)
+        daemon = HarpDaemon(tmpdir / "harp.sock", config=config)
+
+        provider = ERA5.GlobalReanalysis(variables=["u10"], config=config)
+        cls = f"{ERA5.GlobalReanalysis.__module__}.{ERA5.GlobalReanalysis.__qualname__}"
+        hq = HarpQuery(variables=[provider.nomenclature.translate_to_query_name("u10")], time=datetime(2020, 1, 1, 10, 30))
+
+        # 2 provider instances (different keys) sharing the same slices
+        daemon._providers[cls + json.dumps({})] = provider
+        daemon._providers[cls + json.dumps({"alias": 1})] = provider
+
+        waits = [daemon._submit(dict(provider=cls, init=init, query=hq.to_dict())) for init in [{}, {"alias": 1}]]
+        assert len(daemon._batch.items) == 1 # deduplicated
+
+        daemon._execute(daemon._batch)
+
+        for w in waits:
+            assert any(p in batch.errors for batch, paths in w.items() for p in paths)
+
+
+def test_daemon_queues_only_slices_not_in_flight():
+
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        config = dict(dir_storage = tmpdir)
+        daemon = HarpDaemon(tmpdir / "harp.sock", config=config)
+
+        provider = ERA5.GlobalReanalysis(variables=["u10"], config=config)
+        cls = f"{ERA5.GlobalReanalysis.__module__}.{ERA5.GlobalReanalysis.__qualname__}"
+        daemon._providers[cls + json.dumps({})] = provider
+        variable = provider.nomenclature.translate_to_query_name("u10")
+
+        first = daemon._submit(dict(provider=cls, init={}, query=HarpQuery(variables=[variable], time=datetime(2020, 1, 1, 10, 30)).to_dict()))
+        batch, daemon._batch = daemon._batch, _Batch() # batching window elapsed, being downloaded
+
+        second = daemon._submit(dict(provider=cls, init={}, query=HarpQuery(variables=[variable], time=datetime(2020, 1, 1, 11, 30)).to_dict()))
+
+        # 11:00 is waited for in the first batch, only 12:00 is queued
+        assert [hqs.timesteps for _, hqs, _ in daemon._batch.items] == [[datetime(2020, 1, 1, 12)]]
+        assert len(second[batch]) == 1 and second[batch] < first[batch]
+        assert all(daemon._inflight[p] is batch for p in first[batch])
+
+
+def test_download_falls_back_when_daemon_did_not_store(monkeypatch):
+
+    from harp._serve import client as serve_client
+
+    downloaded = []
+    monkeypatch.setattr(ERA5.GlobalReanalysis, "_download_subqueries", lambda self, subqueries: downloaded.extend(subqueries))
+    monkeypatch.setattr(serve_client, "get_socket_path", lambda config: Path("harp.sock"))
+    monkeypatch.setattr(serve_client, "submit", lambda provider, hq, socket_path: None) # "ok", nothing stored
+
+    with TemporaryDirectory() as tmpdir:
+        provider = ERA5.GlobalReanalysis(variables=["u10"], config=dict(dir_storage = Path(tmpdir)))
+        hq = HarpQuery(variables=[provider.nomenclature.translate_to_query_name("u10")], time=datetime(2020, 1, 1, 10, 30))
+
+        provider._download(hq)
+
+        assert len(downloaded) == 1
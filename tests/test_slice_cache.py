@@ -0,0 +1,25 @@
+from tempfile import TemporaryDirectory
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+import numpy as np
+import xarray as xr
+
+from harp.datasets import AIFS
+
+
+def test_slice_cache(opendata_server, monkeypatch):
+    
+    with TemporaryDirectory() as tmpdir:
+        config = dict(dir_storage = Path(tmpdir))
+        
+        aifs = AIFS.GlobalForecast(variables=dict(temperature_2m="t2m"), config=config)
+        ref = aifs.get(time=datetime(2025, 1, 1, 7)).load()
+        
+        # the next times of the same interval are served from memory, without scanning the disk cache
+        monkeypatch.setattr(AIFS.GlobalForecast, "_download", lambda *a, **k: pytest.fail("cache scanned"))
+        
+        for hour in [8, 9, 10]:
+            ds = aifs.get(time=datetime(2025, 1, 1, hour)).load()
+            xr.testing.assert_identical(ds, ref)
@@ -0,0 +1,53 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+
+heavy_modules = ["xarray", "pandas", "cdsapi", "pydap", "cfgrib"]
+
+startup_budget = 1.0 # seconds, generous: mostly guards against heavy imports sneaking back
+
+
+def _run(code: str) -> tuple[set, float]:
+    """
+    Runs code in a fresh interpreter, returns the heavy modules it loaded and its duration
+    """
+    
+    probe = (
+        "import json, sys, time\n"
+        "t0 = time.perf_counter()\n"
+        f"{code}\n"
+        "dt = time.perf_counter() - t0\n"
+        f"print(json.dumps([[m for m in {heavy_modules!r} if m in sys.modules], dt]))\n"
+    )
+    
+    res = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True)
+    loaded, dt = json.loads(res.stdout.strip().splitlines()[-1])
+    
+    return set(loaded), dt
+
+
+@pytest.mark.parametrize("code", [
+    "import harp",
+    "import harp.cli",
+    "import harp.datasets",
+    "import harp.config",
+    "import sys; sys.argv = ['harp', '--help']\nimport harp.cli\ntry: harp.cli.entry()\nexcept SystemExit: pass",
+])
+def test_startup_does_not_load_heavy_modules(code):
+    
+    loaded, dt = _run(code)
+    
+    assert not loaded, f"{code!r} imported {loaded}"
+    assert dt < startup_budget, f"{code!r} took {dt:.3f}s"
+
+
+def test_dataset_collection_is_imported_on_access():
+    
+    loaded, _ = _run("import harp.datasets, sys\nassert 'harp.datasets.ERA5' not in sys.modules")
+    assert not loaded
+    
+    # the collection is imported by its first access
+    _run("import harp.datasets, sys\nharp.datasets.ERA5\nassert 'harp.datasets.ERA5' in sys.modules")
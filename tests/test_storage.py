@@ -0,0 +1,73 @@
+from tempfile import TemporaryDirectory
+from datetime import datetime
+from pathlib import Path
+
+import netCDF4
+import pytest
+import numpy as np
+import xarray as xr
+
+from harp.datasets import AIFS
+
+
+def test_slices_stored_standardized(opendata_server, monkeypatch):
+    
+    with TemporaryDirectory() as tmpdir:
+        config = dict(dir_storage = Path(tmpdir))
+        
+        aifs = AIFS.GlobalForecast(variables=dict(temperature_2m="t2m"), config=config)
+        aifs.get(time=datetime(2025, 1, 1, 6))
+        
+        files = list(Path(tmpdir).rglob("*_v04.nc"))
+        assert len(files) == 1
+        
+        stored = xr.open_dataset(files[0])
+        assert stored.attrs["harp_storage_version"] == "v04"
+        assert (stored.longitude >= -180).all() and (stored.longitude < 180).all()
+        assert (np.diff(stored.longitude) > 0).all()
+        
+        # reads are not standardized again
+        monkeypatch.setattr(AIFS.GlobalForecast, "_standardize", lambda *a, **k: pytest.fail("standardized on read"))
+        ds = aifs.get(time=datetime(2025, 1, 1, 6))
+        
+        xr.testing.assert_equal(ds["temperature_2m"], stored["t2m"].rename("temperature_2m"))
+
+def test_tiled_storage(opendata_server):
+    
+    with TemporaryDirectory() as tmpdir:
+        config = dict(dir_storage = Path(tmpdir), tile_size = 10)
+        
+        aifs = AIFS.GlobalForecast(variables=dict(temperature_2m="t2m"), config=config)
+        glob = aifs.get(time=datetime(2025, 1, 1, 6))
+        
+        files = list(Path(tmpdir).rglob("*_v04.nc"))
+        assert len(files) == 1
+        
+        with netCDF4.Dataset(files[0]) as nc:
+            chunks = nc.variables["t2m"].chunking()
+            step = abs(float(glob.latitude[1] - glob.latitude[0]))
+            assert chunks[1] == min(glob.latitude.size, round(10 / step))
+        
+        # regional queries are read from the stored global slices
+        area = [float(glob.latitude[2]), float(glob.longitude[3]), float(glob.latitude[6]), float(glob.longitude[9])]
+        ds = aifs.get(time=datetime(2025, 1, 1, 6), area=area)
+        
+        assert ds.latitude.size == 5 and ds.longitude.size == 7
+        xr.testing.assert_equal(ds, glob.isel(latitude=slice(2, 7), longitude=slice(3, 10)))
+        assert len(opendata_server) == 1
+        assert len(list(Path(tmpdir).rglob("*_v04.nc"))) == 1
+
+def test_area_crossing_antimeridian(opendata_server):
+    
+    with TemporaryDirectory() as tmpdir:
+        config = dict(dir_storage = Path(tmpdir))
+        
+        aifs = AIFS.GlobalForecast(variables=dict(temperature_2m="t2m"), config=config)
+        ds = aifs.get(time=datetime(2025, 1, 1, 6), area=[60, 170, 30, -170])
+        
+        np.testing.assert_allclose(ds.longitude, np.arange(170, 190.1, 2))
+        np.testing.assert_allclose(ds["temperature_2m"], 6)
+        
+        # one query and cached slice per side
+        assert len(list(Path(tmpdir).rglob("*_v04.nc"))) == 2
+        assert len(opendata_server) == 2
@@ -0,0 +1,90 @@
+import numpy as np
+import xarray as xr
+import pytest
+
+from harp._backend import vertical
+
+
+pressure_levels = [1000, 850, 700, 500, 300, 200, 100]
+
+
+def make_dataset() -> xr.Dataset:
+    
+    p = np.array(pressure_levels, dtype="float64")
+    shape = (2, len(p), 3, 4)
+    
+    t = (10 * np.log(p))[None, :, None, None] * np.ones(shape)   # linear in log-pressure
+    z = (-7000 * np.log(p / 1000) * vertical.g)[None, :, None, None] * np.ones(shape)
+    
+    ds = xr.Dataset(
+        dict(
+            t = (("time", "pressure_level", "latitude", "longitude"), t.astype("float32"), dict(units="K")),
+            z = (("time", "pressure_level", "latitude", "longitude"), z),
+            sp = (("time", "latitude", "longitude"), np.full((2, 3, 4), 1e5)),
+        ),
+        coords = dict(time=[0, 1], pressure_level=p, latitude=[10., 0., -10.], longitude=[0., 1., 2., 3.]),
+    )
+    
+    return ds.chunk(time=1)
+
+
+def test_get_query_levels():
+    
+    assert vertical.get_query_levels([850, 500], pressure_levels) == [500, 850]
+    assert vertical.get_query_levels([925, 600], pressure_levels) == [500, 700, 850, 1000]
+    
+    with pytest.raises(ValueError):
+        vertical.get_query_levels([1050], pressure_levels)
+
+
+def test_pressure_levels():
+    
+    ds = make_dataset()
+    res = vertical.to_pressure_levels(ds, [925, 600, 250])
+    
+    assert res.t.dims == ds.t.dims
+    assert list(res.pressure_level.values) == pytest.approx([925, 600, 250])
+    assert res.t.attrs["units"] == "K"
+    assert res.sp.dims == ("time", "latitude", "longitude")
+    
+    expected = 10 * np.log([925, 600, 250])
+    np.testing.assert_allclose(res.t.isel(time=0, latitude=0, longitude=0), expected, rtol=1e-6)
+    
+    # available levels are selected, not interpolated
+    xr.testing.assert_identical(vertical.select_pressure_levels(ds, pressure_levels), ds)
+    np.testing.assert_array_equal(vertical.to_pressure_levels(ds, [850]).t, ds.t.sel(pressure_level=[850]))
+
+
+def test_altitudes():
+    
+    ds = make_dataset()
+    res = vertical.to_altitudes(ds, [500, 1000, 100000], geopotential=ds.z)
+    
+    assert res.t.dims == ("time", "altitude", "latitude", "longitude")
+    
+    # z = -H log(p / 1000) so t = 10 log(1000) - 10 z / H
+    expected = 10 * np.log(1000) - 10 * np.array([500, 1000]) / 7000
+    np.testing.assert_allclose(res.t.isel(time=0, latitude=0, longitude=0)[:2], expected, rtol=1e-6)
+    assert res.t.isel(altitude=2).isnull().all() # above the highest level
+
+
+def test_model_levels():
+    
+    a = [0., 5000., 10000.]
+    b = [1., 0.5, 0.]
+    sp = xr.DataArray([[1e5, 8e4]], dims=("latitude", "longitude"))
+    
+    pressure = vertical.hybrid_pressure(a, b, sp)
+    
+    ds = xr.Dataset(
+        dict(q=(("model_level", "latitude", "longitude"), np.log(pressure.values))),
+        coords = dict(model_level=[1, 2, 3]),
+    )
+    
+    res = vertical.to_pressure_levels(ds, [700, 300], pressure=pressure)
+    
+    # the pressure of the levels differs per column
+    np.testing.assert_allclose(res.q.isel(latitude=0), np.log([[700, 700], [300, 300]]), rtol=1e-12)
+    
+    with pytest.raises(ValueError):
+        vertical.to_pressure_levels(ds, [700])
@@ -0,0 +1,76 @@
+from tempfile import TemporaryDirectory
+from datetime import datetime
+from pathlib import Path
+import threading
+
+import pytest
+import numpy as np
+import xarray as xr
+
+from harp.datasets import AIFS
+from harp._backend import write_behind
+
+
+def test_write_behind(opendata_server, monkeypatch):
+    
+    stored = threading.Event()
+    store = AIFS.GlobalForecast._store_atomic_slices
+    
+    def _store_later(self, *args, **kwargs):
+        assert stored.wait(timeout=30)
+        store(self, *args, **kwargs)
+    
+    monkeypatch.setattr(AIFS.GlobalForecast, "_store_atomic_slices", _store_later)
+    
+    with TemporaryDirectory() as tmpdir:
+        config = dict(dir_storage = Path(tmpdir), write_behind = True)
+        
+        aifs = AIFS.GlobalForecast(variables=dict(temperature_2m="t2m", wind_10u="u10"), config=config)
+        ds = aifs.get(time=datetime(2025, 1, 1, 9)).load()
+        
+        # data is returned before the slices are stored, the query stays locked
+        np.testing.assert_allclose(ds["wind_10u"].isel(time=1), 22)
+        assert len(list(Path(tmpdir).rglob("*_v04.nc"))) == 0
+        assert len(list((Path(tmpdir) / "locks").rglob("*.lock*"))) > 0
+        
+        # pending slices are not downloaded again
+        aifs.get(time=datetime(2025, 1, 1, 6)).load()
+        assert len(opendata_server) == 2
+        
+        stored.set()
+        write_behind.flush()
+        
+        assert len(list(Path(tmpdir).rglob("*_v04.nc"))) == 4
+        assert len(list((Path(tmpdir) / "locks").rglob("*.lock*"))) == 0
+        assert not write_behind._pending
+        
+        xr.testing.assert_identical(aifs.get(time=datetime(2025, 1, 1, 9), offline=True).load(), ds)
+
+
+def test_write_behind_error(opendata_server, monkeypatch):
+    
+    release = threading.Event()
+    
+    def _fail(self, *args, **kwargs):
+        assert release.wait(timeout=30)
+        raise OSError("No space left on device")
+    
+    monkeypatch.setattr(AIFS.GlobalForecast, "_store_atomic_slices", _fail)
+    
+    with TemporaryDirectory() as tmpdir:
+        config = dict(dir_storage = Path(tmpdir), write_behind = True)
+        
+        aifs = AIFS.GlobalForecast(variables=dict(temperature_2m="t2m"), config=config)
+        aifs.get(time=datetime(2025, 1, 1, 6)).load()
+        release.set()
+        
+        # the failed write is raised once, by the next flush or get
+        with pytest.raises(RuntimeError, match="No space left"):
+            write_behind.flush()
+        write_behind.flush()
+        
+        future = write_behind.submit(lambda: _fail(None), files=[])
+        future.exception()
+        
+        with pytest.raises(RuntimeError, match="No space left"):
+            aifs.get(time=datetime(2025, 1, 1, 6))